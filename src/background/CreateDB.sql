@@ -53,8 +53,18 @@ CREATE TABLE Company
     -- we regrab it
     TimeAdded timestamp default current_timestamp not null,
     GlassdoorUrl VARCHAR(2083),
+    -- UpdatedAt columns let /databases/sync_user_data send only what changed since a clients last sync
+    -- existing dbs: ALTER TABLE Company ADD COLUMN UpdatedAt TIMESTAMP(3) DEFAULT CURRENT_TIMESTAMP(3) ON UPDATE CURRENT_TIMESTAMP(3) NOT NULL;
+    UpdatedAt TIMESTAMP(3) DEFAULT CURRENT_TIMESTAMP(3) ON UPDATE CURRENT_TIMESTAMP(3) NOT NULL,
 CONSTRAINT Company_PK PRIMARY KEY (CompanyName)
 );
+CREATE TABLE JobDescription
+(
+    -- sha256 of the normalized description, reposts of the same posting under new job ids share one row
+    DescriptionHash CHAR(64) NOT NULL,
+    Description LONGBLOB NOT NULL,
+CONSTRAINT JobDescription_PK PRIMARY KEY (DescriptionHash)
+);
 CREATE TABLE Job
 (
     JobId VARCHAR(128) NOT NULL,
@@ -62,7 +72,11 @@ CREATE TABLE Job
     CareerStage VARCHAR(20),
     Job VARCHAR(255),
     Company VARCHAR(255) NOT NULL,
+    -- only jobs from before JobDescription still have Description, python job_description_table.py migrate moves them
     Description LONGBLOB,
+    -- existing dbs: create JobDescription, then
+    -- ALTER TABLE Job ADD COLUMN DescriptionHash CHAR(64), ADD CONSTRAINT Job_foreign_key_description FOREIGN KEY (DescriptionHash) REFERENCES JobDescription(DescriptionHash);
+    DescriptionHash CHAR(64),
     -- uuid to keywords, one to many
     PaymentBase DECIMAL(9, 2),
     PaymentFreq VARCHAR(8),
@@ -71,8 +85,11 @@ CREATE TABLE Job
     Mode VARCHAR(15),
     JobPostedAt TIMESTAMP(3),
     TimeAdded TIMESTAMP(3) DEFAULT CURRENT_TIMESTAMP(3) NOT NULL,
+    -- existing dbs: ALTER TABLE Job ADD COLUMN UpdatedAt TIMESTAMP(3) DEFAULT CURRENT_TIMESTAMP(3) ON UPDATE CURRENT_TIMESTAMP(3) NOT NULL;
+    UpdatedAt TIMESTAMP(3) DEFAULT CURRENT_TIMESTAMP(3) ON UPDATE CURRENT_TIMESTAMP(3) NOT NULL,
 CONSTRAINT Job_PK PRIMARY KEY (JobId),
-CONSTRAINT Job_foreign_key_company FOREIGN KEY (Company) REFERENCES Company(CompanyName) ON DELETE CASCADE
+CONSTRAINT Job_foreign_key_company FOREIGN KEY (Company) REFERENCES Company(CompanyName) ON DELETE CASCADE,
+CONSTRAINT Job_foreign_key_description FOREIGN KEY (DescriptionHash) REFERENCES JobDescription(DescriptionHash)
 );
 CREATE TABLE UserJob
 (
@@ -83,9 +100,25 @@ CREATE TABLE UserJob
     IsFavorite BOOLEAN NOT NULL DEFAULT FALSE,
     HasApplied BOOLEAN NOT NULL DEFAULT FALSE,
     TimeSelected TIMESTAMP(3) DEFAULT CURRENT_TIMESTAMP(3) NOT NULL,
+    -- existing dbs: ALTER TABLE UserJob ADD COLUMN UpdatedAt TIMESTAMP(3) DEFAULT CURRENT_TIMESTAMP(3) ON UPDATE CURRENT_TIMESTAMP(3) NOT NULL, ADD INDEX UserJob_UserId_UpdatedAt (UserId, UpdatedAt);
+    UpdatedAt TIMESTAMP(3) DEFAULT CURRENT_TIMESTAMP(3) ON UPDATE CURRENT_TIMESTAMP(3) NOT NULL,
 CONSTRAINT UserJob_PK PRIMARY KEY (UserJobId),
 CONSTRAINT UserJob_FK1 FOREIGN KEY (JobId) REFERENCES Job(JobId) ON DELETE CASCADE,
-CONSTRAINT UserJob_FK2 FOREIGN KEY (UserId) REFERENCES User(UserId) ON DELETE CASCADE
+CONSTRAINT UserJob_FK2 FOREIGN KEY (UserId) REFERENCES User(UserId) ON DELETE CASCADE,
+INDEX UserJob_UserId_UpdatedAt (UserId, UpdatedAt)
+);
+CREATE TABLE JobMatchScore
+(
+    -- best matchScore of any resume comparison (mongo) for this user and job, no FK on JobId since
+    -- resumes can be compared against jobs that were never saved
+    UserId VARCHAR(36) NOT NULL,
+    JobId VARCHAR(128) NOT NULL,
+    BestMatchScore INT NOT NULL,
+    UpdatedAt TIMESTAMP(3) DEFAULT CURRENT_TIMESTAMP(3) ON UPDATE CURRENT_TIMESTAMP(3) NOT NULL,
+CONSTRAINT JobMatchScore_PK PRIMARY KEY (UserId, JobId),
+CONSTRAINT JobMatchScore_FK FOREIGN KEY (UserId) REFERENCES User(UserId) ON DELETE CASCADE,
+-- existing dbs: ALTER TABLE JobMatchScore ADD INDEX JobMatchScore_UserId_UpdatedAt (UserId, UpdatedAt);
+INDEX JobMatchScore_UserId_UpdatedAt (UserId, UpdatedAt)
 );
 CREATE TABLE JobLocation
 (
@@ -120,12 +153,45 @@ CREATE TABLE Resumes
     UserId VARCHAR(36) NOT NULL,
     FileName VARCHAR(255) NOT NULL,
     FileType VARCHAR(50) NOT NULL,
-    FileContent LONGBLOB NOT NULL,
+    -- only rows from before the BlobStore still have FileContent, resume_blob_migration.py moves them
+    FileContent LONGBLOB,
     FileText LONGBLOB NOT NULL,
     UploadDate TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     IsDefault BOOLEAN NOT NULL,
+    -- sha256 of the uploaded file, identical uploads reuse FileText instead of extracting it again
+    -- existing dbs: ALTER TABLE Resumes ADD COLUMN ContentHash CHAR(64), ADD INDEX Resumes_ContentHash (ContentHash);
+    ContentHash CHAR(64),
+    -- sha256 of the stored (pdf) file, its key in the BlobStore
+    -- existing dbs: ALTER TABLE Resumes MODIFY FileContent LONGBLOB NULL, ADD COLUMN FileHash CHAR(64), ADD INDEX Resumes_FileHash (FileHash);
+    FileHash CHAR(64),
+    -- existing dbs: ALTER TABLE Resumes ADD COLUMN UpdatedAt TIMESTAMP(3) DEFAULT CURRENT_TIMESTAMP(3) ON UPDATE CURRENT_TIMESTAMP(3) NOT NULL, ADD INDEX Resumes_UserId_UpdatedAt (UserId, UpdatedAt);
+    UpdatedAt TIMESTAMP(3) DEFAULT CURRENT_TIMESTAMP(3) ON UPDATE CURRENT_TIMESTAMP(3) NOT NULL,
 CONSTRAINT Resumes_PK PRIMARY KEY (id),
-CONSTRAINT Resumes_FK FOREIGN KEY (UserId) REFERENCES User(UserId) ON DELETE CASCADE
+CONSTRAINT Resumes_FK FOREIGN KEY (UserId) REFERENCES User(UserId) ON DELETE CASCADE,
+INDEX Resumes_ContentHash (ContentHash),
+INDEX Resumes_FileHash (FileHash),
+INDEX Resumes_UserId_UpdatedAt (UserId, UpdatedAt)
+);
+CREATE TABLE SyncTombstone
+(
+    -- what was deleted from a users jobs, resumes and scores, so clients syncing with a cursor can drop them
+    -- EntityType is job, resume or score, EntityId the JobId or resume Id. Pruned by python sync_tombstone_table.py
+    UserId VARCHAR(36) NOT NULL,
+    EntityType VARCHAR(20) NOT NULL,
+    EntityId VARCHAR(128) NOT NULL,
+    DeletedAt TIMESTAMP(3) DEFAULT CURRENT_TIMESTAMP(3) NOT NULL,
+CONSTRAINT SyncTombstone_PK PRIMARY KEY (UserId, EntityType, EntityId),
+CONSTRAINT SyncTombstone_FK FOREIGN KEY (UserId) REFERENCES User(UserId) ON DELETE CASCADE,
+INDEX SyncTombstone_UserId_DeletedAt (UserId, DeletedAt),
+INDEX SyncTombstone_DeletedAt (DeletedAt)
+);
+CREATE TABLE UserDataVersion
+(
+    -- bumped by every write to a users jobs, resumes, scores or profile, the ETag of /databases/get_user_data
+    UserId VARCHAR(36) NOT NULL,
+    Version BIGINT NOT NULL DEFAULT 1,
+CONSTRAINT UserDataVersion_PK PRIMARY KEY (UserId),
+CONSTRAINT UserDataVersion_FK FOREIGN KEY (UserId) REFERENCES User(UserId) ON DELETE CASCADE
 );
 CREATE TABLE UserPreferences
 (
@@ -7,8 +7,9 @@ import json
 import jwt
 from functools import wraps
 from typing import Callable, Tuple, Dict
-from user import User
+from user import User, AuthUser
 from user_table import UserTable
+from user_cache import UserCache
 import logging
 
 SECRET_KEY: str = os.environ["secret_key"]
@@ -41,7 +42,7 @@ def token_required(f: Callable) -> Callable:
             return jsonify({'message': 'Token is missing!'}), 401
 
         try:
-            user : User | None = decode_user_from_token(token)
+            user : AuthUser | None = decode_user_from_token(token)
             logging.debug("Loaded user of ")
             logging.debug(user)
             if user is None:
@@ -63,12 +64,16 @@ decode_user_from_token
 
 retrieves the user from the token and returns it
 
+loads the lean AuthUser (single indexed read of the User table), the full profile only loads if the
+route touches it. the user is memoized for the rest of the request and briefly cached per worker
+(see UserCache), so token_required, the payment decorators and the route body only hit the db once between them
+
 args:
     token: str jwt token
 returns:
     user from token or none if token is invalid
 '''
-def decode_user_from_token(token : str) -> User | None:
+def decode_user_from_token(token : str) -> AuthUser | None:
     logging.debug("DECODING TOKEN OF: ")
     logging.debug(token)
     try:
@@ -78,7 +83,7 @@ def decode_user_from_token(token : str) -> User | None:
         # Extract user information
         user_email : str = payload.get("email")
         
-        return UserTable.read_user_by_email(user_email)
+        return UserCache.get_or_load(token, user_email, payload.get("exp"), lambda: UserTable.read_auth_user_by_email(user_email))
     #CONVERSATION:
     #Do higher level functions need to know why token is bad? seems that no matter what the reason is you're going to
     #reauth anyways. I'm not aware of any errors that would cause us not to send response to client to clear auth cache and
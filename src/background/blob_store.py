@@ -0,0 +1,184 @@
+#(c) 2024 Daniel DeMoney. All rights reserved.
+from typing import BinaryIO, Iterator
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import logging
+
+class LocalBlobBackend:
+    '''
+    LocalBlobBackend
+
+    blobs as files in a directory, fanned out by the first bytes of the hash so no directory gets huge.
+    open hands back a real file so send_file streams it in blocks instead of reading it into memory
+
+    args:
+        root: directory to keep blobs in
+    '''
+    def __init__(self, root: str) -> None:
+        self.root: str = root
+        os.makedirs(root, exist_ok=True)
+    def path(self, blob_hash: str) -> str:
+        return os.path.join(self.root, blob_hash[:2], blob_hash[2:4], blob_hash)
+    def exists(self, blob_hash: str) -> bool:
+        return os.path.exists(self.path(blob_hash))
+    def put(self, blob_hash: str, data: bytes) -> None:
+        path: str = self.path(blob_hash)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        #write then rename so a reader never sees half a file, even with another worker writing the same blob
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp_")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+    def get(self, blob_hash: str) -> bytes:
+        with open(self.path(blob_hash), "rb") as f:
+            return f.read()
+    def open(self, blob_hash: str) -> BinaryIO:
+        return open(self.path(blob_hash), "rb")
+    def touch(self, blob_hash: str) -> None:
+        os.utime(self.path(blob_hash))
+    def delete(self, blob_hash: str) -> None:
+        if self.exists(blob_hash):
+            os.remove(self.path(blob_hash))
+    def list_blobs(self) -> Iterator[tuple[str, float]]:
+        for directory, _, file_names in os.walk(self.root):
+            for file_name in file_names:
+                if not file_name.startswith(".tmp_"):
+                    yield file_name, os.path.getmtime(os.path.join(directory, file_name))
+
+class S3BlobBackend:
+    '''
+    S3BlobBackend
+
+    blobs as objects in an s3 bucket under a prefix
+
+    args:
+        bucket: name of the bucket
+        prefix: key prefix for every blob
+    '''
+    def __init__(self, bucket: str, prefix: str) -> None:
+        #only deployments using s3 pay for importing boto3
+        import boto3
+        from botocore.exceptions import ClientError
+        self.bucket: str = bucket
+        self.prefix: str = prefix
+        self.__client = boto3.client("s3")
+        self.__client_error = ClientError
+    def key(self, blob_hash: str) -> str:
+        return f"{self.prefix}{blob_hash}"
+    def exists(self, blob_hash: str) -> bool:
+        try:
+            self.__client.head_object(Bucket=self.bucket, Key=self.key(blob_hash))
+            return True
+        except self.__client_error as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+    def put(self, blob_hash: str, data: bytes) -> None:
+        self.__client.put_object(Bucket=self.bucket, Key=self.key(blob_hash), Body=data)
+    def get(self, blob_hash: str) -> bytes:
+        return self.__client.get_object(Bucket=self.bucket, Key=self.key(blob_hash))["Body"].read()
+    def open(self, blob_hash: str) -> BinaryIO:
+        return io.BytesIO(self.get(blob_hash))
+    def touch(self, blob_hash: str) -> None:
+        #copying an object onto itself is the only way to bump LastModified
+        self.__client.copy_object(Bucket=self.bucket, Key=self.key(blob_hash), CopySource={"Bucket": self.bucket, "Key": self.key(blob_hash)}, MetadataDirective="REPLACE")
+    def delete(self, blob_hash: str) -> None:
+        self.__client.delete_object(Bucket=self.bucket, Key=self.key(blob_hash))
+    def list_blobs(self) -> Iterator[tuple[str, float]]:
+        paginator = self.__client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for obj in page.get("Contents", []):
+                yield obj["Key"][len(self.prefix):], obj["LastModified"].timestamp()
+
+class BlobStore:
+    '''
+    BlobStore
+
+    Content addressed storage for resume files. A blob's key is the sha256 of its bytes, so putting the same file
+    twice stores it once and a stored blob never changes.
+
+    RESUME_BLOB_STORE picks the backend:
+        local (default): files under RESUME_BLOB_DIR
+        s3: objects in RESUME_BLOB_BUCKET under RESUME_BLOB_PREFIX
+    The backend is created on first use in each process, boto3 clients can't be shared across gunicorns fork.
+
+    Blobs are shared between resumes so deleting a resume leaves its blob, resume_blob_migration.py gc clears out
+    blobs nothing points to.
+    '''
+    BACKEND_NAME: str = os.environ.get("RESUME_BLOB_STORE", "local")
+    LOCAL_DIR: str = os.environ.get("RESUME_BLOB_DIR", os.path.join(os.getcwd(), "blobs", "resumes"))
+    S3_BUCKET: str | None = os.environ.get("RESUME_BLOB_BUCKET")
+    S3_PREFIX: str = os.environ.get("RESUME_BLOB_PREFIX", "resumes/")
+    __backend: LocalBlobBackend | S3BlobBackend | None = None
+    __backend_pid: int | None = None
+    __lock: threading.Lock = threading.Lock()
+    def backend() -> LocalBlobBackend | S3BlobBackend:
+        if BlobStore.__backend is None or BlobStore.__backend_pid != os.getpid():
+            with BlobStore.__lock:
+                if BlobStore.__backend is None or BlobStore.__backend_pid != os.getpid():
+                    logging.info(f"CREATING {BlobStore.BACKEND_NAME.upper()} BLOB STORE")
+                    if BlobStore.BACKEND_NAME == "s3":
+                        BlobStore.__backend = S3BlobBackend(BlobStore.S3_BUCKET, BlobStore.S3_PREFIX)
+                    else:
+                        BlobStore.__backend = LocalBlobBackend(BlobStore.LOCAL_DIR)
+                    BlobStore.__backend_pid = os.getpid()
+        return BlobStore.__backend
+    '''
+    hash_bytes
+
+    returns:
+        the key a blob with these bytes is stored under
+    '''
+    def hash_bytes(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+    '''
+    put
+
+    stores bytes unless a blob with the same hash is already there
+
+    args:
+        data: bytes to store
+    returns:
+        hash the blob is stored under
+    '''
+    def put(data: bytes) -> str:
+        blob_hash: str = BlobStore.hash_bytes(data)
+        backend = BlobStore.backend()
+        if backend.exists(blob_hash):
+            logging.info("BLOB ALREADY STORED")
+            #gc only deletes blobs that haven't been stored in a while, this counts as storing it
+            backend.touch(blob_hash)
+        else:
+            backend.put(blob_hash, data)
+        return blob_hash
+    def get(blob_hash: str) -> bytes:
+        return BlobStore.backend().get(blob_hash)
+    '''
+    open
+
+    returns:
+        readable file for the blob, a real file for the local backend so it can be sent without copying it
+        through python
+    '''
+    def open(blob_hash: str) -> BinaryIO:
+        return BlobStore.backend().open(blob_hash)
+    def exists(blob_hash: str) -> bool:
+        return BlobStore.backend().exists(blob_hash)
+    def delete(blob_hash: str) -> None:
+        BlobStore.backend().delete(blob_hash)
+    '''
+    list_blobs
+
+    returns:
+        (hash, unix time it was stored) for every blob
+    '''
+    def list_blobs() -> Iterator[tuple[str, float]]:
+        return BlobStore.backend().list_blobs()
@@ -2,7 +2,10 @@
 from mysql.connector.types import RowType, RowItemType
 from typing import Dict
 from decimal import Decimal
+from operator import itemgetter
 from typing import Optional
+from sql_columns import SqlColumns
+from json_writer import JsonWriter
 import logging
 
 class CompanyInvalidData(Exception):
@@ -28,6 +31,13 @@ class Company:
     returns
         initialized company object
     '''
+    #in the order __init__ takes them
+    SQL_COLUMNS: tuple[str, ...] = ("CompanyName", "BusinessOutlookRating", "CareerOpportunitiesRating", "CeoRating", "CompensationAndBenefitsRating",
+                                    "CultureAndValuesRating", "DiversityAndInclusionRating", "SeniorManagementRating", "WorkLifeBalanceRating",
+                                    "OverallRating", "GlassdoorUrl")
+    __slots__ = ("company_name", "business_outlook_rating", "career_opportunities_rating", "ceo_rating", "compensation_and_benefits_rating",
+                 "culture_and_values_rating", "diversity_and_inclusion_rating", "senior_management_rating", "work_life_balance_rating",
+                 "overall_rating", "glassdoor_url")
     def __init__(self, company_name : str, business_outlook_rating : Decimal, career_opportunities_rating : Decimal, ceo_rating : Decimal, 
                  compensation_and_benefits_rating : Decimal, culture_and_values_rating : Decimal, diversity_and_inclusion_rating : Decimal, senior_management_rating : Decimal, 
                  work_life_balance_rating : Decimal, overall_rating : Decimal, glassdoor_url : str) -> None:
@@ -54,34 +64,26 @@ class Company:
     '''
     @classmethod
     def create_with_sql_row(cls, sql_query_row: (Dict[str, RowItemType])) -> 'Company':
-        company_name : str
-        business_outlook_rating : Decimal 
-        career_opportunities_rating : Decimal
-        ceo_rating : Decimal
-        compensation_and_benefits_rating : Decimal
-        culture_and_values_rating : Decimal
-        diversity_and_inclusion_rating : Decimal
-        senior_management_rating : Decimal
-        work_life_balance_rating : Decimal
-        overall_rating : Decimal
-        glassdoor_url : str
+        return cls.create_many_with_sql_rows(*SqlColumns.from_dict_row(sql_query_row))[0]
+    '''
+    create_many_with_sql_rows
+
+    creates a company from every row of a result set read with a plain cursor, see SqlColumns
+
+    args:
+        sql_query_rows: rows from fetchall
+        columns: column name to position in the rows
+    returns:
+        list of Company objects
+    '''
+    @classmethod
+    def create_many_with_sql_rows(cls, sql_query_rows: list[tuple], columns: Dict[str, int]) -> list['Company']:
         try:
-            company_name = sql_query_row["CompanyName"]
-            business_outlook_rating = sql_query_row["BusinessOutlookRating"]
-            career_opportunities_rating = sql_query_row["CareerOpportunitiesRating"]
-            ceo_rating = sql_query_row["CeoRating"]
-            compensation_and_benefits_rating = sql_query_row["CompensationAndBenefitsRating"]
-            culture_and_values_rating = sql_query_row["CultureAndValuesRating"]
-            diversity_and_inclusion_rating = sql_query_row["DiversityAndInclusionRating"]
-            senior_management_rating = sql_query_row["SeniorManagementRating"]
-            work_life_balance_rating = sql_query_row["WorkLifeBalanceRating"]
-            overall_rating = sql_query_row["OverallRating"]
-            glassdoor_url = sql_query_row["GlassdoorUrl"]
-            return cls(company_name, business_outlook_rating, career_opportunities_rating, ceo_rating, compensation_and_benefits_rating , culture_and_values_rating, diversity_and_inclusion_rating,
-                       senior_management_rating, work_life_balance_rating, overall_rating, glassdoor_url)
+            get_values: itemgetter = itemgetter(*[columns[column] for column in cls.SQL_COLUMNS])
         except KeyError as e:
             logging.error(f"FAILED TO CREATE COMPANY RECIEVED KEYERROR OF {e}")
-            raise CompanyInvalidData(sql_query_row)
+            raise CompanyInvalidData(list(columns))
+        return [cls(*get_values(row)) for row in sql_query_rows]
     '''
     try_create_with_sql_row
 
@@ -228,6 +230,27 @@ class Company:
             "glassdoorUrl" : self.glassdoor_url if self.glassdoor_url else None
         }
     '''
+    write_json
+
+    appends the same JSON as JsonWriter.dumps(company.to_json()), written straight from the fields
+
+    args:
+        out: pieces of JSON, see JsonWriter.write
+    '''
+    def write_json(self, out: list[str]) -> None:
+        number = JsonWriter.number
+        out.append(f'{{"companyName": {JsonWriter.value(self.company_name)}, '
+                   f'"businessOutlookRating": {number(self.business_outlook_rating) if self.business_outlook_rating else "null"}, '
+                   f'"careerOpportunitiesRating": {number(self.career_opportunities_rating) if self.career_opportunities_rating else "null"}, '
+                   f'"ceoRating": {number(self.ceo_rating) if self.ceo_rating else "null"}, '
+                   f'"compensationAndBenefitsRating": {number(self.compensation_and_benefits_rating) if self.compensation_and_benefits_rating else "null"}, '
+                   f'"cultureAndValuesRating": {number(self.culture_and_values_rating) if self.culture_and_values_rating else "null"}, '
+                   f'"diversityAndInclusionRating": {number(self.diversity_and_inclusion_rating) if self.culture_and_values_rating else "null"}, '
+                   f'"seniorManagementRating": {number(self.senior_management_rating) if self.senior_management_rating else "null"}, '
+                   f'"workLifeBalanceRating": {number(self.work_life_balance_rating) if self.work_life_balance_rating else "null"}, '
+                   f'"overallRating": {number(self.overall_rating) if self.overall_rating else "null"}, '
+                   f'"glassdoorUrl": {JsonWriter.value(self.glassdoor_url) if self.glassdoor_url else "null"}}}')
+    '''
     isEmpty
 
     returns whether or not a company object is empty
@@ -7,6 +7,9 @@ from company import Company
 from mysql.connector.cursor import MySQLCursor
 from mysql.connector.connection_cext import CMySQLConnection
 from mysql.connector.types import RowType, RowItemType
+from user_data_version_table import UserDataVersionTable
+from sync_tombstone_table import SyncTombstoneTable
+import datetime
 import logging
 
 
@@ -71,6 +74,8 @@ class CompanyTable:
             FROM Company
             WHERE CompanyName = %s;
         """
+    def __get_read_company_version_query() -> str:
+        return 'SELECT UpdatedAt FROM Company WHERE CompanyName = %s'
     '''
     add_company
 
@@ -82,7 +87,7 @@ class CompanyTable:
         0 if no errors occured
     '''
     def add_company(company : Company) -> int:
-        with get_connection() as conn:
+        with get_connection(request_scoped=True) as conn:
             with conn.cursor(dictionary=True) as cursor:
                 company_json : Dict = company.to_json()
                 company_add_str : str = CompanyTable.__get_company_add_query(company_json)
@@ -105,7 +110,7 @@ class CompanyTable:
     def read_company_by_id(company_name : str) -> Company | None:
         #put in try except, return custom error if doesn't work
         logging.info(f"Reading db to for company: {company_name}")
-        with get_connection() as conn:
+        with get_connection(request_scoped=True) as conn:
             with conn.cursor(dictionary=True) as cursor:
                 query : str = CompanyTable.__get_read_company_by_name_query()
                 cursor.execute(query, (company_name,))
@@ -117,6 +122,20 @@ class CompanyTable:
         logging.info(f"Successfully read for {company_name}")
         return Company.create_with_sql_row(result)
     '''
+    read_company_version
+
+    args:
+        company_name: str company name
+    returns:
+        when the company was last written, None if it isn't in the db
+    '''
+    def read_company_version(company_name : str) -> datetime.datetime | None:
+        with get_connection(request_scoped=True) as conn:
+            with conn.cursor(dictionary=True) as cursor:
+                cursor.execute(CompanyTable.__get_read_company_version_query(), (company_name,))
+                result : Dict[str, RowItemType] | None = cursor.fetchone()
+        return result["UpdatedAt"] if result else None
+    '''
     update_company
 
     updates a company in our db, the company object passed has all values corresponding to its name overwritten
@@ -128,7 +147,7 @@ class CompanyTable:
         0 if no errors occurred
     '''
     def update_company(company : Company) -> int:
-        with get_connection() as conn:
+        with get_connection(request_scoped=True) as conn:
             with conn.cursor(dictionary=True) as cursor:
                 company_json : Dict = company.to_json()
                 logging.info("Updating company WITH ID " + company_json["companyName"])
@@ -144,6 +163,7 @@ class CompanyTable:
                 logging.debug(update)
                 logging.debug(params)
                 cursor.execute(update, params)
+                cursor.execute(UserDataVersionTable.get_bump_job_users_query("Job.Company = %s"), (company_json["companyName"],))
                 conn.commit()
         #return success
         return 0
@@ -158,9 +178,13 @@ class CompanyTable:
         0 if no errors occurred
     '''
     def delete_company_by_name(company_name : str) -> int:
-        with get_connection() as conn:
+        with get_connection(request_scoped=True) as conn:
             with conn.cursor(dictionary=True) as cursor:
                 query : str = CompanyTable.__get_delete_company_by_name_query()
+                #its jobs and their user jobs go with it through the cascade, tell their users
+                cursor.execute(SyncTombstoneTable.get_add_tombstones_query(SyncTombstoneTable.JOB, "UserJob JOIN Job ON Job.JobId = UserJob.JobId",
+                                                                           "UserJob.UserId", "UserJob.JobId", "Job.Company = %s"), (company_name,))
+                cursor.execute(UserDataVersionTable.get_bump_job_users_query("Job.Company = %s"), (company_name,))
                 #Run the sql to delete the job
                 cursor.execute(query, (company_name,))
                 conn.commit()
@@ -0,0 +1,159 @@
+#(c) 2024 Daniel DeMoney. All rights reserved.
+from typing import Dict
+import zstandard
+import glob
+import os
+import re
+import threading
+import zlib
+import logging
+
+class CompressionCodec:
+    '''
+    CompressionCodec
+
+    Compresses the text we keep in blob columns (Job.Description, Resumes.FileText).
+
+    Every value starts with a one byte header saying how the rest is encoded:
+        FORMAT_ZSTD: plain zstd
+        FORMAT_ZSTD_DICT: zstd with a trained dictionary, the zstd frame carries the id of the dictionary
+    Rows written before the codec are raw zlib, whose first byte is always 0x?8, so they can never be mistaken for
+    a header and are decoded as zlib.
+
+    Job descriptions share a lot of boilerplate (EEO statements, benefit lists) that zstd can't see compressing one
+    description at a time, a dictionary trained on our own descriptions gives it that context. Dictionaries live in
+    COMPRESSION_DICT_DIR as <name>.v<version>.dict. New values are written with the highest version of their
+    dictionary, every version stays loaded so old rows still decode. Without a dictionary file values are plain zstd.
+
+    compression_dictionary_trainer.py trains the next version from the db
+    '''
+    FORMAT_ZSTD: int = 0x01
+    FORMAT_ZSTD_DICT: int = 0x02
+    LEVEL: int = int(os.environ.get("COMPRESSION_LEVEL", 10))
+    DICT_DIR: str = os.environ.get("COMPRESSION_DICT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "compression_dicts"))
+    JOB_DESCRIPTION: str = "job_description"
+    RESUME_TEXT: str = "resume_text"
+    #dictionary name: the version new values are written with
+    __write_dicts: Dict[str, zstandard.ZstdCompressionDict] | None = None
+    #dictionary id: every version we can read
+    __read_dicts: Dict[int, zstandard.ZstdCompressionDict] | None = None
+    __load_lock: threading.Lock = threading.Lock()
+    #zstd compressors and decompressors can't be shared between threads
+    __local: threading.local = threading.local()
+    '''
+    compress_text
+
+    args:
+        text: text to compress
+        dictionary: name of the dictionary to use if one has been trained
+    returns:
+        header byte and the compressed text
+    '''
+    def compress_text(text: str, dictionary: str) -> bytes:
+        return CompressionCodec.compress(text.encode("utf-8"), dictionary)
+    '''
+    decompress_text
+
+    args:
+        data: value written by compress_text, or legacy zlib
+    returns:
+        the text
+    '''
+    def decompress_text(data: bytes) -> str:
+        return CompressionCodec.decompress(data).decode("utf-8")
+    def compress(data: bytes, dictionary: str) -> bytes:
+        compression_dict: zstandard.ZstdCompressionDict | None = CompressionCodec.__get_write_dicts().get(dictionary)
+        if compression_dict is None:
+            return bytes([CompressionCodec.FORMAT_ZSTD]) + CompressionCodec.__compressor(None).compress(data)
+        return bytes([CompressionCodec.FORMAT_ZSTD_DICT]) + CompressionCodec.__compressor(compression_dict).compress(data)
+    def decompress(data: bytes) -> bytes:
+        header: int = data[0]
+        if header == CompressionCodec.FORMAT_ZSTD:
+            return CompressionCodec.__decompressor(None).decompress(data[1:])
+        if header == CompressionCodec.FORMAT_ZSTD_DICT:
+            dict_id: int = zstandard.get_frame_parameters(data[1:]).dict_id
+            compression_dict: zstandard.ZstdCompressionDict | None = CompressionCodec.__get_read_dicts().get(dict_id)
+            if compression_dict is None:
+                raise ValueError(f"No compression dictionary with id {dict_id} in {CompressionCodec.DICT_DIR}")
+            return CompressionCodec.__decompressor(compression_dict).decompress(data[1:])
+        return zlib.decompress(data)
+    '''
+    is_current
+
+    args:
+        data: a compressed value
+        dictionary: name of the dictionary it would be written with
+    returns:
+        True if compressing the value again would give the same format and dictionary, so it can be stored as is
+    '''
+    def is_current(data: bytes, dictionary: str) -> bool:
+        compression_dict: zstandard.ZstdCompressionDict | None = CompressionCodec.__get_write_dicts().get(dictionary)
+        if compression_dict is None:
+            return data[:1] == bytes([CompressionCodec.FORMAT_ZSTD])
+        return data[:1] == bytes([CompressionCodec.FORMAT_ZSTD_DICT]) and zstandard.get_frame_parameters(data[1:]).dict_id == compression_dict.dict_id()
+    '''
+    train
+
+    trains the next version of a dictionary and saves it to DICT_DIR. Workers pick it up when they restart
+
+    args:
+        dictionary: name of the dictionary
+        samples: texts to train on, a few thousand is plenty
+        dict_size: size of the dictionary in bytes
+    returns:
+        path of the new dictionary
+    '''
+    def train(dictionary: str, samples: list[str], dict_size: int) -> str:
+        compression_dict: zstandard.ZstdCompressionDict = zstandard.train_dictionary(dict_size, [sample.encode("utf-8") for sample in samples])
+        versions: list[int] = [version for version, _ in CompressionCodec.__dict_files(dictionary)]
+        os.makedirs(CompressionCodec.DICT_DIR, exist_ok=True)
+        path: str = os.path.join(CompressionCodec.DICT_DIR, f"{dictionary}.v{max(versions, default=0) + 1}.dict")
+        with open(path, "wb") as f:
+            f.write(compression_dict.as_bytes())
+        logging.info(f"TRAINED {dictionary.upper()} DICTIONARY {compression_dict.dict_id()} ON {len(samples)} SAMPLES")
+        return path
+    def __dict_files(dictionary: str) -> list[tuple[int, str]]:
+        files: list[tuple[int, str]] = []
+        for path in glob.glob(os.path.join(CompressionCodec.DICT_DIR, f"{dictionary}.v*.dict")):
+            match = re.fullmatch(rf"{re.escape(dictionary)}\.v(\d+)\.dict", os.path.basename(path))
+            if match:
+                files.append((int(match.group(1)), path))
+        return sorted(files)
+    def __load() -> None:
+        write_dicts: Dict[str, zstandard.ZstdCompressionDict] = {}
+        read_dicts: Dict[int, zstandard.ZstdCompressionDict] = {}
+        for dictionary in (CompressionCodec.JOB_DESCRIPTION, CompressionCodec.RESUME_TEXT):
+            for _, path in CompressionCodec.__dict_files(dictionary):
+                with open(path, "rb") as f:
+                    compression_dict = zstandard.ZstdCompressionDict(f.read())
+                read_dicts[compression_dict.dict_id()] = compression_dict
+                #files are sorted by version, the last one wins
+                write_dicts[dictionary] = compression_dict
+        logging.info(f"LOADED {len(read_dicts)} COMPRESSION DICTIONARIES")
+        CompressionCodec.__read_dicts = read_dicts
+        CompressionCodec.__write_dicts = write_dicts
+    def __get_write_dicts() -> Dict[str, zstandard.ZstdCompressionDict]:
+        if CompressionCodec.__write_dicts is None:
+            with CompressionCodec.__load_lock:
+                if CompressionCodec.__write_dicts is None:
+                    CompressionCodec.__load()
+        return CompressionCodec.__write_dicts
+    def __get_read_dicts() -> Dict[int, zstandard.ZstdCompressionDict]:
+        CompressionCodec.__get_write_dicts()
+        return CompressionCodec.__read_dicts
+    def __compressor(compression_dict: zstandard.ZstdCompressionDict | None) -> zstandard.ZstdCompressor:
+        if not hasattr(CompressionCodec.__local, "compressors"):
+            CompressionCodec.__local.compressors = {}
+        compressors: Dict[int, zstandard.ZstdCompressor] = CompressionCodec.__local.compressors
+        key: int = compression_dict.dict_id() if compression_dict is not None else 0
+        if key not in compressors:
+            compressors[key] = zstandard.ZstdCompressor(level=CompressionCodec.LEVEL, dict_data=compression_dict)
+        return compressors[key]
+    def __decompressor(compression_dict: zstandard.ZstdCompressionDict | None) -> zstandard.ZstdDecompressor:
+        if not hasattr(CompressionCodec.__local, "decompressors"):
+            CompressionCodec.__local.decompressors = {}
+        decompressors: Dict[int, zstandard.ZstdDecompressor] = CompressionCodec.__local.decompressors
+        key: int = compression_dict.dict_id() if compression_dict is not None else 0
+        if key not in decompressors:
+            decompressors[key] = zstandard.ZstdDecompressor(dict_data=compression_dict)
+        return decompressors[key]
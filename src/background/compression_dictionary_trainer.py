@@ -0,0 +1,40 @@
+#(c) 2024 Daniel DeMoney. All rights reserved.
+from compression_codec import CompressionCodec
+from database_functions import get_connection
+import sys
+import logging
+
+'''
+Trains the next version of a CompressionCodec dictionary from what's already in the db and saves it to
+COMPRESSION_DICT_DIR. Ship the new file with the app, workers start writing with it when they restart and every
+older version stays readable.
+
+python compression_dictionary_trainer.py <job_description|resume_text> [samples] [dictionary bytes]
+'''
+SAMPLE_QUERIES = {
+    CompressionCodec.JOB_DESCRIPTION: "SELECT Description AS Sample FROM JobDescription LIMIT %s",
+    CompressionCodec.RESUME_TEXT: "SELECT FileText AS Sample FROM Resumes WHERE FileText IS NOT NULL ORDER BY UploadDate DESC LIMIT %s"
+}
+'''
+read_samples
+
+args:
+    dictionary: name of the dictionary to read samples for
+    limit: max samples
+returns:
+    texts of that kind
+'''
+def read_samples(dictionary: str, limit: int) -> list[str]:
+    with get_connection() as conn:
+        with conn.cursor(dictionary=True) as cursor:
+            cursor.execute(SAMPLE_QUERIES[dictionary], (limit,))
+            return [CompressionCodec.decompress_text(row["Sample"]) for row in cursor.fetchall()]
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) < 2 or sys.argv[1] not in SAMPLE_QUERIES:
+        print("usage: python compression_dictionary_trainer.py <job_description|resume_text> [samples] [dictionary bytes]")
+        sys.exit(1)
+    samples: list[str] = read_samples(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 5000)
+    #112640 is zstd's default dictionary size
+    print("Saved " + CompressionCodec.train(sys.argv[1], samples, int(sys.argv[3]) if len(sys.argv) > 3 else 112640))
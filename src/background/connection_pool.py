@@ -0,0 +1,323 @@
+#(c) 2024 Daniel DeMoney. All rights reserved.
+from mysql.connector.errors import Error, InterfaceError, OperationalError, PoolError
+from mysql.connector.pooling import MySQLConnectionPool, PooledMySQLConnection, CONNECTION_POOL_LOCK
+from request_timing import RequestTiming
+from typing import Any, Dict
+import os
+import queue
+import threading
+import time
+import logging
+
+#server has gone away, lost connection during query, lost connection to server at reading initial packet
+RETRYABLE_ERRNOS: set[int] = {2006, 2013, 2055}
+
+class HealthCheckedConnectionPool(MySQLConnectionPool):
+    '''
+    HealthCheckedConnectionPool
+
+    MySQLConnectionPool that doesn't round trip to the server on every checkout
+
+    The stock pool calls is_connected (a ping) on every get_connection, and we used to run a SELECT 1 on top of that.
+    Instead:
+        checkout: only pings connections that have been idle longer than idle_ping_seconds
+        first use: a connection we didn't ping retries its first statement once after a reconnect if the server
+            went away (2006/2013/2055), nothing has run on it yet so the retry is safe
+        background: a daemon thread pings idle connections every recycle_interval_seconds and reconnects broken ones
+            so checkouts almost never have to
+    Checkouts block for up to checkout_timeout_seconds instead of failing as soon as the pool is empty.
+
+    args:
+        idle_ping_seconds: connections idle longer than this get pinged on checkout
+        checkout_timeout_seconds: max seconds to wait for a free connection
+        recycle_interval_seconds: seconds between background passes, 0 turns the thread off
+        **kwargs: passed to MySQLConnectionPool
+    '''
+    def __init__(self, idle_ping_seconds: float, checkout_timeout_seconds: float, recycle_interval_seconds: float, **kwargs) -> None:
+        self.idle_ping_seconds: float = idle_ping_seconds
+        self.checkout_timeout_seconds: float = checkout_timeout_seconds
+        self.recycle_interval_seconds: float = recycle_interval_seconds
+        self.__last_used: Dict[int, float] = {}
+        self.__stats: Dict[str, float] = {
+            "checkouts": 0,
+            "checkout_timeouts": 0,
+            "validation_pings": 0,
+            "background_pings": 0,
+            "reconnects": 0,
+            "first_use_retries": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0
+        }
+        self.__stats_lock: threading.Lock = threading.Lock()
+        self.__recycler_pid: int | None = None
+        super().__init__(**kwargs)
+    '''
+    get_connection
+
+    returns:
+        a pooled connection, pinged only if it sat idle too long
+    raises:
+        PoolError if no connection frees up within checkout_timeout_seconds
+    '''
+    def get_connection(self) -> 'HealthCheckedPooledConnection':
+        self.__ensure_recycler()
+        st: float = time.monotonic()
+        try:
+            #don't hold CONNECTION_POOL_LOCK while we block, returning a connection needs it
+            cnx = self._cnx_queue.get(block=True, timeout=self.checkout_timeout_seconds)
+        except queue.Empty as e:
+            self.__count("checkout_timeouts")
+            raise PoolError(f"Failed getting connection; pool exhausted for {self.checkout_timeout_seconds} seconds") from e
+        waited: float = time.monotonic() - st
+        with self.__stats_lock:
+            self.__stats["checkouts"] += 1
+            self.__stats["wait_seconds_total"] += waited
+            self.__stats["wait_seconds_max"] = max(self.__stats["wait_seconds_max"], waited)
+        validated: bool = False
+        try:
+            if self._config_version != getattr(cnx, "pool_config_version", None):
+                cnx.config(**self._cnx_config)
+                self.__reconnect(cnx)
+                cnx.pool_config_version = self._config_version
+                validated = True
+            elif self.__idle_for(cnx) > self.idle_ping_seconds:
+                self.__ping_or_reconnect(cnx, "validation_pings")
+                validated = True
+        except Error:
+            #give it back so the pool doesn't shrink, the next checkout will try again
+            self.__requeue(cnx)
+            raise
+        return HealthCheckedPooledConnection(self, cnx, retry_first_use=not validated)
+    '''
+    add_connection
+
+    called by the pool to fill itself and by PooledMySQLConnection.close when a connection comes back
+    '''
+    def add_connection(self, cnx=None) -> None:
+        if cnx is not None:
+            self.__last_used[id(cnx)] = time.monotonic()
+        super().add_connection(cnx)
+    '''
+    reconnect_for_retry
+
+    reconnects a connection whose first statement failed because the server went away
+
+    args:
+        cnx: the raw connection
+    '''
+    def reconnect_for_retry(self, cnx) -> None:
+        self.__count("first_use_retries")
+        self.__reconnect(cnx)
+    '''
+    stats
+
+    returns:
+        copy of the pools counters for this worker
+    '''
+    def stats(self) -> Dict[str, float]:
+        with self.__stats_lock:
+            stats: Dict[str, float] = dict(self.__stats)
+        stats["idle_connections"] = self._cnx_queue.qsize()
+        stats["pool_size"] = self.pool_size
+        return stats
+    def __count(self, stat: str) -> None:
+        with self.__stats_lock:
+            self.__stats[stat] += 1
+    def __idle_for(self, cnx) -> float:
+        #never seen it come back (fresh from the pool fill), treat it as idle forever so it gets checked
+        last_used: float | None = self.__last_used.get(id(cnx))
+        return float("inf") if last_used is None else time.monotonic() - last_used
+    def __reconnect(self, cnx) -> None:
+        self.__count("reconnects")
+        logging.warning("RECONNECTING POOLED MYSQL CONNECTION")
+        cnx.reconnect(attempts=3, delay=1)
+        self.__last_used[id(cnx)] = time.monotonic()
+    def __ping_or_reconnect(self, cnx, stat: str) -> None:
+        self.__count(stat)
+        try:
+            cnx.ping(reconnect=False)
+            self.__last_used[id(cnx)] = time.monotonic()
+        except (InterfaceError, OperationalError) as e:
+            logging.warning(f"POOLED MYSQL CONNECTION FAILED PING: {e}")
+            self.__reconnect(cnx)
+    def __requeue(self, cnx) -> None:
+        with CONNECTION_POOL_LOCK:
+            self._queue_connection(cnx)
+    '''
+    __ensure_recycler
+
+    starts the background thread once per process, gunicorn forks workers so a thread started before the
+    fork doesn't exist in the child
+    '''
+    def __ensure_recycler(self) -> None:
+        if not self.recycle_interval_seconds or self.__recycler_pid == os.getpid():
+            return
+        with self.__stats_lock:
+            if self.__recycler_pid == os.getpid():
+                return
+            self.__recycler_pid = os.getpid()
+        threading.Thread(target=self.__recycle_forever, name="mysql-pool-recycler", daemon=True).start()
+    def __recycle_forever(self) -> None:
+        while True:
+            time.sleep(self.recycle_interval_seconds)
+            try:
+                self.__recycle_idle_connections()
+            except Exception as e:
+                logging.error(f"MYSQL POOL RECYCLER FAILED: {e}")
+    '''
+    __recycle_idle_connections
+
+    pings every connection sitting idle past idle_ping_seconds, one at a time so the pool never loses more
+    than one connection to us
+    '''
+    def __recycle_idle_connections(self) -> None:
+        for _ in range(self._cnx_queue.qsize()):
+            try:
+                cnx = self._cnx_queue.get(block=False)
+            except queue.Empty:
+                return
+            try:
+                if self.__idle_for(cnx) > self.idle_ping_seconds:
+                    self.__ping_or_reconnect(cnx, "background_pings")
+            except Error as e:
+                logging.error(f"COULD NOT RECYCLE MYSQL CONNECTION: {e}")
+            finally:
+                self.__requeue(cnx)
+
+class HealthCheckedPooledConnection(PooledMySQLConnection):
+    '''
+    HealthCheckedPooledConnection
+
+    PooledMySQLConnection whose cursors retry the first statement once if the connection turned out to be dead
+
+    args:
+        pool: the HealthCheckedConnectionPool
+        cnx: raw connection
+        retry_first_use: False if the pool just pinged or reconnected it
+    '''
+    def __init__(self, pool: HealthCheckedConnectionPool, cnx, retry_first_use: bool) -> None:
+        super().__init__(pool, cnx)
+        self.retry_first_use: bool = retry_first_use
+    def cursor(self, *args, **kwargs) -> 'RetryingCursor':
+        return RetryingCursor(self, args, kwargs)
+    def commit(self) -> None:
+        with RequestTiming.span(RequestTiming.MYSQL):
+            self._cnx.commit()
+    '''
+    raw_cursor
+
+    returns:
+        a cursor straight from the underlying connection
+    '''
+    def raw_cursor(self, *args, **kwargs) -> Any:
+        return self._cnx.cursor(*args, **kwargs)
+    '''
+    reconnect_for_retry
+
+    reconnects the underlying connection after its first statement hit a dead server
+    '''
+    def reconnect_for_retry(self) -> None:
+        self._cnx_pool.reconnect_for_retry(self._cnx)
+
+class RetryingCursor:
+    '''
+    RetryingCursor
+
+    wraps a cursor so the first statement on an unvalidated connection is retried once on a fresh connection.
+    Only the first statement, after that there could be an open transaction and a retry would silently drop it.
+    Statements and fetches count towards the requests mysql span. Everything else is passed through to the real
+    cursor.
+
+    args:
+        conn: connection that made this cursor
+        cursor_args: args to recreate the cursor with
+        cursor_kwargs: kwargs to recreate the cursor with
+    '''
+    def __init__(self, conn: HealthCheckedPooledConnection, cursor_args: tuple, cursor_kwargs: dict) -> None:
+        self.__conn: HealthCheckedPooledConnection = conn
+        self.__cursor_args: tuple = cursor_args
+        self.__cursor_kwargs: dict = cursor_kwargs
+        self.__cursor = conn.raw_cursor(*cursor_args, **cursor_kwargs)
+    def execute(self, *args, **kwargs) -> Any:
+        return self.__run("execute", args, kwargs)
+    def executemany(self, *args, **kwargs) -> Any:
+        return self.__run("executemany", args, kwargs)
+    #unbuffered cursors read the rows off the socket here
+    def fetchone(self) -> Any:
+        with RequestTiming.span(RequestTiming.MYSQL):
+            return self.__cursor.fetchone()
+    def fetchmany(self, *args, **kwargs) -> Any:
+        with RequestTiming.span(RequestTiming.MYSQL):
+            return self.__cursor.fetchmany(*args, **kwargs)
+    def fetchall(self) -> Any:
+        with RequestTiming.span(RequestTiming.MYSQL):
+            return self.__cursor.fetchall()
+    def __run(self, method: str, args: tuple, kwargs: dict) -> Any:
+        with RequestTiming.span(RequestTiming.MYSQL):
+            return self.__run_with_retry(method, args, kwargs)
+    def __run_with_retry(self, method: str, args: tuple, kwargs: dict) -> Any:
+        if not self.__conn.retry_first_use:
+            return getattr(self.__cursor, method)(*args, **kwargs)
+        self.__conn.retry_first_use = False
+        try:
+            return getattr(self.__cursor, method)(*args, **kwargs)
+        except (InterfaceError, OperationalError) as e:
+            if e.errno not in RETRYABLE_ERRNOS:
+                raise
+            logging.warning(f"FIRST STATEMENT ON POOLED CONNECTION FAILED WITH {e.errno}, RETRYING")
+            self.__conn.reconnect_for_retry()
+            self.__cursor = self.__conn.raw_cursor(*self.__cursor_args, **self.__cursor_kwargs)
+            return getattr(self.__cursor, method)(*args, **kwargs)
+    def close(self) -> Any:
+        return self.__cursor.close()
+    def __iter__(self):
+        return iter(self.__cursor)
+    def __enter__(self) -> 'RetryingCursor':
+        return self
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.__cursor.close()
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_RetryingCursor__"):
+            raise AttributeError(name)
+        return getattr(self.__cursor, name)
+
+class RequestScopedConnection:
+    '''
+    RequestScopedConnection
+
+    pooled connection bound to a flask request, shared by every table call that opts in during that request.
+    close is a no-op since table code closes its connection when it's done, the request gives it back to the pool
+    on teardown with release. Everything else is passed through to the pooled connection.
+
+    args:
+        conn: pooled connection checked out for the request
+    '''
+    def __init__(self, conn: HealthCheckedPooledConnection) -> None:
+        self.__conn: HealthCheckedPooledConnection = conn
+        #how many get_connection blocks are currently using us
+        self.depth: int = 0
+    def close(self) -> None:
+        pass
+    '''
+    end_transaction
+
+    rolls back whatever the last block left open (usually just the read snapshot of a SELECT), so the next block
+    starts a fresh transaction like it would on its own connection. Free if the block committed.
+    '''
+    def end_transaction(self) -> None:
+        if self.__conn.in_transaction:
+            self.__conn.rollback()
+    '''
+    release
+
+    ends any open transaction and gives the connection back to the pool
+    '''
+    def release(self) -> None:
+        try:
+            self.end_transaction()
+        finally:
+            self.__conn.close()
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_RequestScopedConnection__"):
+            raise AttributeError(name)
+        return getattr(self.__conn, name)
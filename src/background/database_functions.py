@@ -39,13 +39,18 @@ make sure that when we check if the company exists all the values arent null
 from contextlib import contextmanager
 import mysql.connector
 from mysql.connector import pooling, Error
-from mysql.connector.connection_cext import CMySQLConnection
-from mysql.connector.cursor import MySQLCursor
+from connection_pool import HealthCheckedConnectionPool, HealthCheckedPooledConnection, RequestScopedConnection
+from request_timing import MongoCommandTiming
+from flask import g, has_request_context
 import json
 import os
 import uuid
 from decimal import Decimal
 import logging
+import atexit
+import threading
+from pymongo import MongoClient
+from pymongo.database import Database
 
 class DatabaseFunctions:
     IS_PRODUCTION = os.getenv("ENVIRONMENT") == "production"
@@ -69,7 +74,10 @@ class DatabaseFunctions:
         MONGODB_URL = "mongodb://localhost:27017"
     DATABASE = "JOBDB"
     MONGODB_DB_NAME = "Jobrater"
-    pool = mysql.connector.pooling.MySQLConnectionPool(
+    pool = HealthCheckedConnectionPool(
+        idle_ping_seconds=float(os.getenv("MYSQL_IDLE_PING_SECONDS", 60)),
+        checkout_timeout_seconds=float(os.getenv("MYSQL_CHECKOUT_TIMEOUT_SECONDS", 10)),
+        recycle_interval_seconds=float(os.getenv("MYSQL_RECYCLE_INTERVAL_SECONDS", 30)),
         pool_name="mypool",
         pool_size=10,  # Adjust pool size as needed
         host=HOST,
@@ -77,51 +85,143 @@ class DatabaseFunctions:
         password=MYSQLPASSWORD,
         database=DATABASE
     )
+    __mongo_client: MongoClient | None = None
+    __mongo_client_pid: int | None = None
+    __mongo_lock: threading.Lock = threading.Lock()
+    '''
+    get_connection
 
-    def get_connection() -> CMySQLConnection:
-        conn = None
+    checks a connection out of the pool. health checks live in HealthCheckedConnectionPool, a connection is only
+    pinged if it sat idle and a dead one gets its first statement retried, so this no longer costs a round trip
+
+    returns:
+        pooled connection, close it to give it back
+    '''
+    def get_connection() -> HealthCheckedPooledConnection:
         try:
-            conn = DatabaseFunctions.pool.get_connection()
-            # Check if the connection is still valid
-            if conn.is_connected():
-                try:
-                    cursor : MySQLCursor = conn.cursor()
-                    cursor.execute("SELECT 1")  # Simple query to validate the connection
-                    _ = cursor.fetchone()
-                    cursor.close()
-                except mysql.connector.Error as query_err:
-                    # If the query fails, close and try to reconnect
-                    logging.error(f"Error with validation query: {query_err}")
-                    conn.close()  # Close invalid connection
-                    conn = DatabaseFunctions.pool.get_connection()  # Get a new connection
-            else:
-                # If the connection isn't valid, close and reconnect
-                conn.close()
-                conn = DatabaseFunctions.pool.get_connection()
-                
-        except mysql.connector.errors.OperationalError as e:
-            logging.error("Got operational error getting connection of:")
-            logging.error(e)
-            # Handle case where reconnection is needed
-            if conn:
-                conn.reconnect(attempts=3, delay=5)  # Try to reconnect manually
-            else:
-                conn = DatabaseFunctions.pool.get_connection()  # If no conn, get one from pool
-            
+            return DatabaseFunctions.pool.get_connection()
         except mysql.connector.Error as err:
-            # Log and handle other errors
-            logging.error(f"Error: {err}")
-            if conn:
-                conn.close()
+            logging.error(f"Error getting connection: {err}")
             raise err
-        
-        return conn
+    '''
+    pool_stats
+
+    returns:
+        counters for this workers pool (checkouts, pings, reconnects, wait time)
+    '''
+    def pool_stats() -> dict:
+        return DatabaseFunctions.pool.stats()
+    '''
+    get_mongo_db
+
+    returns our mongo db off one MongoClient per worker. the client is created on first use so it always belongs to
+    the process using it (gunicorn forks workers, and a MongoClient must never be shared across a fork), pools its
+    connections for every collection, adds the time of every command to the requests mongo span (see RequestTiming) and
+    is closed when the worker exits
+
+    pool limits and timeouts come from the env:
+        MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE, MONGO_MAX_IDLE_TIME_MS,
+        MONGO_SERVER_SELECTION_TIMEOUT_MS, MONGO_CONNECT_TIMEOUT_MS, MONGO_SOCKET_TIMEOUT_MS
+
+    returns:
+        pymongo Database for MONGODB_DB_NAME
+    '''
+    def get_mongo_db() -> Database:
+        client: MongoClient | None = DatabaseFunctions.__mongo_client
+        if client is None or DatabaseFunctions.__mongo_client_pid != os.getpid():
+            with DatabaseFunctions.__mongo_lock:
+                if DatabaseFunctions.__mongo_client is None or DatabaseFunctions.__mongo_client_pid != os.getpid():
+                    logging.info("CREATING MONGO CLIENT FOR PROCESS " + str(os.getpid()))
+                    DatabaseFunctions.__mongo_client = MongoClient(
+                        DatabaseFunctions.MONGODB_URL,
+                        maxPoolSize=int(os.getenv("MONGO_MAX_POOL_SIZE", 20)),
+                        minPoolSize=int(os.getenv("MONGO_MIN_POOL_SIZE", 0)),
+                        maxIdleTimeMS=int(os.getenv("MONGO_MAX_IDLE_TIME_MS", 300000)),
+                        serverSelectionTimeoutMS=int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000)),
+                        connectTimeoutMS=int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", 5000)),
+                        socketTimeoutMS=int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", 30000)),
+                        event_listeners=[MongoCommandTiming()]
+                    )
+                    DatabaseFunctions.__mongo_client_pid = os.getpid()
+                    atexit.register(DatabaseFunctions.close_mongo_client)
+                client = DatabaseFunctions.__mongo_client
+        return client[DatabaseFunctions.MONGODB_DB_NAME]
+    '''
+    close_mongo_client
+
+    closes this workers mongo client, registered with atexit so it runs on worker shutdown
+    '''
+    def close_mongo_client() -> None:
+        with DatabaseFunctions.__mongo_lock:
+            client: MongoClient | None = DatabaseFunctions.__mongo_client
+            #a client inherited from a parent process isn't ours to close
+            if client is None or DatabaseFunctions.__mongo_client_pid != os.getpid():
+                return
+            DatabaseFunctions.__mongo_client = None
+            DatabaseFunctions.__mongo_client_pid = None
+        logging.info("CLOSING MONGO CLIENT")
+        client.close()
+    '''
+    release_request_connection
 
+    gives the connection bound to this request back to the pool, registered with app.teardown_request
+
+    args:
+        exc: exception the request ended with, if any
+    '''
+    def release_request_connection(exc: BaseException | None = None) -> None:
+        conn: RequestScopedConnection | None = g.pop("db_connection", None)
+        if conn is None:
+            return
+        try:
+            conn.release()
+        except mysql.connector.Error as err:
+            logging.error(f"Error releasing request connection: {err}")
+
+'''
+get_connection
+
+context manager that checks a connection out and gives it back
+
+args:
+    request_scoped: if True and we're inside a flask request, reuse one connection for the whole request. The first
+        call binds it to flask.g, later (and nested) calls get the same one, and it goes back to the pool on teardown.
+        Each outermost block still acts like its own transaction: an exception rolls back, and anything left
+        uncommitted when it ends is rolled back, same as returning a connection to the pool did.
+        Outside a request this is a normal checkout.
+'''
 @contextmanager
-def get_connection():
+def get_connection(request_scoped: bool = False):
     logging.debug("Getting connection")
+    if request_scoped and has_request_context():
+        with _request_connection() as conn:
+            yield conn
+        return
     conn = DatabaseFunctions.get_connection()
     try:
         yield conn
     finally:
         conn.close()
+
+@contextmanager
+def _request_connection():
+    conn: RequestScopedConnection | None = g.get("db_connection")
+    if conn is None:
+        conn = RequestScopedConnection(DatabaseFunctions.get_connection())
+        g.db_connection = conn
+    conn.depth += 1
+    try:
+        yield conn
+    except BaseException:
+        try:
+            conn.rollback()
+        except mysql.connector.Error as err:
+            logging.error(f"Error rolling back request connection: {err}")
+        raise
+    finally:
+        conn.depth -= 1
+        if conn.depth == 0:
+            try:
+                conn.end_transaction()
+            except mysql.connector.Error as err:
+                logging.error(f"Error ending request connection transaction: {err}")
@@ -29,7 +29,7 @@ logging.basicConfig(
     format='%(asctime)s %(levelname)s %(process)d: %(message)s',
 )
 
-from flask import Flask, abort, request, Response, jsonify
+from flask import Flask, abort, request, Response, jsonify, send_file
 from flask_bcrypt import Bcrypt
 from flask_cors import CORS
 from google.oauth2 import id_token
@@ -39,12 +39,16 @@ from uuid import UUID
 from dotenv import load_dotenv
 from auth_logic import get_token
 from payment_decorators import PaymentDecorators
+from database_functions import DatabaseFunctions
 import jwt
 import json
 from mailing import Mailing
 from auth_logic import decode_user_from_token, token_required
 from job_location_table import JobLocationTable
+from job_description_table import JobDescriptionTable
 from user_job_table import UserJobTable
+from user_sync import UserSync
+from user_data_version_table import UserDataVersionTable
 from user_preferences import UserPreferences
 from user_table import UserTable
 from job_table import JobTable
@@ -55,6 +59,7 @@ from user_preferences_table import UserPreferencesTable
 from keyword_table import KeywordTable
 from email_confirmation_table import EmailConfirmationTable
 from user_subscription_table import UserSubscriptionTable, UserSubscription
+from entitlement_cache import EntitlementCache
 from user_free_data_table import UserFreeDataTable
 from user import UserInvalidData
 from resume_nlp.resume_comparison import ResumeComparison
@@ -64,24 +69,37 @@ from location_finder import LocationFinder
 from relocation_data_grabber import RelocationDataGrabber
 from company import Company
 from job import Job
-from user import User
+from user import User, AuthUser
 from resume import Resume
 from location import Location
 from subcription import Subscription
-from typing import Dict
+from typing import Any, Callable, Dict
 import glassdoor_scraper
 from helper_functions import HelperFunctions
 import stripe
 import sys
 import os
 import traceback
+import io
+import mimetypes
+import hashlib
+import hmac
+import datetime
 import asyncio
 import time
 import requests
 from urllib.parse import quote
 from functools import partial
-from errors import DuplicateUserJob
+from errors import DuplicateUserJob, TextExtractionUnavailable, UploadTooLarge
+from resume_upload import ResumeUpload
+from text_extraction import TextExtraction
+from blob_store import BlobStore
+from response_encoding import ResponseEncoding
+from request_timing import RequestTiming
+from json_writer import JsonWriter, JsonView
+from doc2pdf import LibreOfficeError
 from gunicorn.app.base import BaseApplication
+from pymongo.errors import PyMongoError
 
 load_dotenv() 
 
@@ -90,6 +108,21 @@ app = Flask(__name__)
 #Give support for cross origin requests from our content Script
 CORS(app)
 bcrypt = Bcrypt(app)
+#table calls share one pooled connection per request, give it back when the request ends
+app.teardown_request(DatabaseFunctions.release_request_connection)
+#latency histograms and Server-Timing, registered before compress so it runs after it and counts it
+app.before_request(RequestTiming.start)
+app.after_request(RequestTiming.finish)
+app.teardown_request(RequestTiming.teardown)
+#gzip or brotli for clients that accept it
+app.after_request(ResponseEncoding.compress)
+#idempotent, every worker runs it so a fresh db gets its indexes before the first comparison is written
+try:
+    ResumeComparisonCollection.ensure_indexes()
+except PyMongoError as e:
+    logging.error(f"COULD NOT ENSURE RESUME COMPARISON INDEXES: {e}")
+#so the first resume upload in this worker doesn't wait on tika
+TextExtraction.warm_up()
 IS_PRODUCTION = os.getenv("ENVIRONMENT") == "production"
 HOST="0.0.0.0" if IS_PRODUCTION else "127.0.0.1"
 PORT=int(os.environ.get("PORT", 5001))
@@ -113,8 +146,11 @@ if os.environ["SERVER_ENVIRONMENT"] == "development":
 stripe.api_key = STRIPE_API_KEY if os.environ["STRIPE_ENVIRONMENT"] == "production" else STRIPE_TEST_API_KEY
 
 ADDUSERJOBBYDEFAULT = False
-
-#All frequently queried routes are timed. If a route isnt timed its not used extremely often
+#how long clients may reuse a job or company without revalidating, user data is always revalidated
+JOB_CACHE_SECONDS: int = int(os.environ.get("JOB_CACHE_SECONDS", 60))
+COMPANY_CACHE_SECONDS: int = int(os.environ.get("COMPANY_CACHE_SECONDS", 300))
+#sent as X-Metrics-Key to read /internal/metrics, the route 404s without it
+METRICS_KEY: str | None = os.environ.get("METRICS_KEY")
 
 class DatabaseServer:
     #########################################################################################
@@ -173,7 +209,7 @@ class DatabaseServer:
             logging.error("Request of: " + request + " is invalid")
             #Invalid request
             return abort(403)
-        user : User | None = UserTable.read_user_by_email(email)
+        user : AuthUser | None = UserTable.read_auth_user_by_email(email)
         if not user:
             abort(404)
         logging.info(f"============== END REQUEST TO GET SALT BY EMAIL TOOK {time.time() - st} seconds ================")
@@ -199,10 +235,11 @@ class DatabaseServer:
         email : str = request.args.get('email', default="NO EMAIL LOADED", type=str)
         password_hash : str = request.args.get('password', default="NO PASSWORD LOADED", type=str)
 
-        user : User | None = UserTable.read_user_by_email(email)
+        #only the lean auth row is read until the password checks out, the full profile loads on to_json
+        user : AuthUser | None = UserTable.read_auth_user_by_email(email)
         if not user:
             return 'User not found', 401
-        logging.info("ATTEMPTING TO LOGIN USER: " + json.dumps(user.to_json()))
+        logging.info("ATTEMPTING TO LOGIN USER: " + user.email)
         #PASSWORDS ARE SALTED AND HASHED! do not be scared...
         logging.debug("HASH SENT BY CLIENT: " + password_hash)
         logging.debug("HASH FOUND IN DB: " + user.password)
@@ -255,7 +292,7 @@ class DatabaseServer:
             return "Bad User Data", 400
         user.salt = salt
         logging.debug("Checking if user exists...")
-        if UserTable.read_user_by_email(user.email):
+        if UserTable.read_auth_user_by_email(user.email):
             logging.info("User already exists, returning a 401")
             return 'User already exists!', 401
         
@@ -376,7 +413,8 @@ class DatabaseServer:
         #we complete the jobs data before returning it to the client
         #NOTE: Needs to be acid
         try:
-            completeJob: Job = JobTable.add_job_with_foreign_keys(job, user_id, add_user_job=add_user_job)
+            completeJob, job_new, user_job_new = JobTable.upsert_job_with_foreign_keys(job, user_id, add_user_job=add_user_job)
+            logging.info(f"JOB NEW: {job_new} USER JOB NEW: {user_job_new}")
         except DuplicateUserJob:
             abort(409) 
         assert(completeJob.company is not None)
@@ -407,6 +445,48 @@ class DatabaseServer:
         logging.info("=============== END READ MOST RECENT JOB =================")
         return job.to_json()
     '''
+    make_etag
+
+    args:
+        parts: whatever the response body is derived from (versions, ids, query args)
+    returns:
+        strong etag for the body, without having built it
+    '''
+    def make_etag(*parts) -> str:
+        return hashlib.sha256("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()[:32]
+    '''
+    cached_response
+
+    answers a conditional GET. The body is only built when the clients If-None-Match doesn't have the etag, and is
+    sent as MessagePack or JSON like ResponseEncoding.make_response
+
+    args:
+        etag: etag from make_etag
+        max_age: seconds the client may reuse the body without asking, 0 to make it revalidate every time
+        build_body: returns the body, a model or a dict of them
+    returns:
+        304 or 200 with the body, with ETag and Cache-Control either way
+    '''
+    def cached_response(etag: str, max_age: int, build_body: Callable[[], Any]) -> Response:
+        #json and msgpack bodies are different bytes
+        etag = f"{etag}-msgpack" if ResponseEncoding.wants_msgpack() else etag
+        #weak comparison, compress sends compressed bodies with the weak form of the etag
+        if request.if_none_match.contains_weak(etag):
+            logging.info("CLIENT IS UP TO DATE, NOT MODIFIED")
+            response: Response = Response(status=304)
+            response.vary.add("Accept")
+        else:
+            response = ResponseEncoding.make_response(build_body())
+        response.set_etag(etag)
+        response.cache_control.private = True
+        if max_age > 0:
+            response.cache_control.max_age = max_age
+        else:
+            response.cache_control.no_cache = True
+        #the same url returns a different body for every token
+        response.vary.add("Authorization")
+        return response
+    '''
     read_job_by_id
 
     recieves request to read a company by the companies str id and returns the json representation of the job 
@@ -415,7 +495,7 @@ class DatabaseServer:
         request
             job_id str job id from linkedin
     returns:
-        json representation of job
+        json representation of job, or 304 if If-None-Match has its ETag
     '''
     @app.route('/databases/read_job_by_id', methods=['GET'])
     @token_required
@@ -430,12 +510,19 @@ class DatabaseServer:
             logging.info("Your request of: " + request)
             abort(403)
         logging.info("JOB ID:  " + job_id)
-        job : Job | None = JobTable.read_job_by_id(job_id)
-        if not job:
+        job_version : str | None = JobTable.read_job_version(job_id)
+        if not job_version:
             logging.error("JOB NOT IN DB")
             abort(404)
+        def build_body() -> Job:
+            job : Job | None = JobTable.read_job_by_id(job_id)
+            if not job:
+                #deleted since we read the version
+                abort(404)
+            return job
+        response : Response = DatabaseServer.cached_response(DatabaseServer.make_etag("job", job_id, job_version), JOB_CACHE_SECONDS, build_body)
         logging.info("=============== END READ JOB BY ID =================")
-        return job.to_json()
+        return response
     '''
     update_job
 
@@ -508,7 +595,7 @@ class DatabaseServer:
         request
             company: str company name
     returns
-        company json
+        company json, or 304 if If-None-Match has its ETag
     '''
     @app.route('/databases/read_company', methods=["GET"])
     @token_required
@@ -520,13 +607,19 @@ class DatabaseServer:
             #Invalid request
             abort(403)
         logging.info("Recieved message to read company: " + company)
-        company : Company | None = CompanyTable.read_company_by_id(company)
-        if not company:
-            abort(404)
-        #Symbolic empty company
-        if not company.overall_rating or company.overall_rating < 0.1:
+        company_version : datetime.datetime | None = CompanyTable.read_company_version(company)
+        if not company_version:
             abort(404)
-        return company.to_json()
+        company_name : str = company
+        def build_body() -> Company:
+            company : Company | None = CompanyTable.read_company_by_id(company_name)
+            if not company:
+                abort(404)
+            #Symbolic empty company
+            if not company.overall_rating or company.overall_rating < 0.1:
+                abort(404)
+            return company
+        return DatabaseServer.cached_response(DatabaseServer.make_etag("company", company_name, company_version.isoformat()), COMPANY_CACHE_SECONDS, build_body)
     @app.route('/databases/add_company_with_source', methods=["POST"])
     @token_required
     def add_company_with_source():
@@ -572,7 +665,7 @@ class DatabaseServer:
         request
             token: JWT token that holds user id
     returns:
-        json with user data and job data
+        json with user data and job data, or 304 if If-None-Match has the ETag of the users data version
     '''
     @app.route('/databases/get_user_data', methods=["GET"])
     @token_required
@@ -587,15 +680,55 @@ class DatabaseServer:
         user : User | None = decode_user_from_token(token)
         if not user:
             abort(404)
-        jobs : list[Job] = UserJobTable.get_user_jobs(user.user_id)
-        #TODO: clear file text and bytes no need to send it over the net
-        resumes: list[Resume] = ResumeTable.read_user_resumes(user.user_id)
-        json_jobs : list[Dict] = [job.to_json() for job in jobs]
-        json_resumes : list[Dict] = [resume.to_json() for resume in resumes]
-        best_resume_scores : Dict = ResumeComparisonCollection.get_best_resume_scores_object(jobs, user.user_id)
-        return_json = {"user": user.to_json(), "jobs": json_jobs, "resumes": json_resumes, "bestResumeScores": best_resume_scores}
+        #includeDescriptions=false lists jobs without reading or sending their descriptions
+        include_descriptions: bool = request.args.get('includeDescriptions', default="true", type=str).lower() != "false"
+        #bumped by every write to anything below, a client with this version already has it all
+        version : int = UserDataVersionTable.read_version(user.user_id)
+        def build_body() -> Dict:
+            #not the token's user, that can come from this worker's UserCache and be older than version
+            profile : User | None = UserTable.read_user_by_id(str(user.user_id))
+            if not profile:
+                abort(404)
+            jobs, best_resume_scores = UserJobTable.get_user_jobs_with_best_scores(user.user_id, with_description=include_descriptions)
+            #metadata only, the client gets the file itself from resume_file
+            resumes: list[Resume] = ResumeTable.read_user_resumes_metadata(user.user_id)
+            #models go in as they are, JsonWriter encodes each one as it reaches it
+            json_jobs : list[JsonView] = [JsonView(job, include_description=include_descriptions) for job in jobs]
+            json_resumes : list[Dict] = [resume.to_metadata_json() for resume in resumes]
+            return {"user": profile, "jobs": json_jobs, "resumes": json_resumes, "bestResumeScores": best_resume_scores}
+        response : Response = DatabaseServer.cached_response(DatabaseServer.make_etag("user_data", user.user_id, version, include_descriptions), 0, build_body)
         logging.info(f"=============== END GET USER JOB TOOK {time.time() - st} seconds =================")
-        return json.dumps(return_json)
+        return response
+    '''
+    sync_user_data
+
+    what get_user_data returns, but only what changed since the clients last sync, see UserSync
+
+    args:
+        request
+            token: JWT token that holds user id
+            cursor: cursor from the last sync, leave out for everything
+            includeDescriptions: false sends jobs without their descriptions
+    returns:
+        json with a new cursor, changed user data and ids of deleted jobs, resumes and scores
+    '''
+    @app.route('/databases/sync_user_data', methods=["GET"])
+    @token_required
+    def sync_user_data():
+        #start time
+        st = time.time()
+        logging.info("============== GOT REQUEST TO SYNC USER DATA ================")
+        token : str = request.headers.get('Authorization')
+        if not token:
+            return 'No token recieved', 401
+        user : User | None = decode_user_from_token(token)
+        if not user:
+            abort(404)
+        cursor : str | None = request.args.get('cursor', default=None, type=str)
+        include_descriptions: bool = request.args.get('includeDescriptions', default="true", type=str).lower() != "false"
+        return_json : Dict = UserSync.get_user_sync(user, cursor, include_descriptions)
+        logging.info(f"=============== END SYNC USER DATA TOOK {time.time() - st} seconds =================")
+        return ResponseEncoding.make_response(return_json)
     #Not the most restful but returns the full list of jobs for a us
     @app.route('/databases/add_user_job', methods=["POST"])
     @token_required
@@ -618,7 +751,7 @@ class DatabaseServer:
         
         addedJob: Job = UserJobTable.add_user_job(user.user_id, job_id)
         logging.info(f"=============== END ADD USER JOB TOOK {time.time() - st} seconds=================")
-        return json.dumps(addedJob.to_json())
+        return JsonWriter.dumps(addedJob)
 
     @app.route('/databases/update_user_job', methods=["POST"])
     @token_required
@@ -685,7 +818,7 @@ class DatabaseServer:
         if not user:
             return 'Invalid Token', 401
         user_email : str = user.email
-        if not UserTable.read_user_by_email(user_email):
+        if not UserTable.read_auth_user_by_email(user_email):
             return json.dumps({'message': 'User not in db'}), 401
         
         userSubscription: UserSubscription = UserSubscriptionTable.read_subscription(user.user_id)
@@ -829,10 +962,16 @@ class DatabaseServer:
 
     also gets additional data on resume (for pdfs file text and such)
 
-    req:
-        resume: resume Json
+    three ways to send it:
+        json (older extensions): {resume: resume Json with fileContent as an int array, replace, oldId}
+        multipart/form-data: the file in a part named file
+        raw body: the file bytes with Content-Type application/pdf or the docx type
+    binary uploads put their options in the query string: name, fileName, fileType, isDefault, replace, oldId.
+    They are streamed to a spooled temp file and hashed on the way in, and anything over
+    RESUME_MAX_UPLOAD_BYTES gets a 413 without being buffered
+
     returns:
-        dumped resume we added
+        dumped resume we added, metadata only for binary uploads
     '''
     @app.route('/databases/add_resume', methods=['POST'])
     @PaymentDecorators.check_subscription_for_resume_upload
@@ -843,17 +982,87 @@ class DatabaseServer:
         logging.info(request.url)
         token : str = request.headers.get('Authorization')
         user : User | None = decode_user_from_token(token)
-        request_json: Dict = request.get_json()
-        resume_json: Dict = request_json["resume"]
-        #Check for the key first to make sure theres no keyError and then check to make sure its true
-        if "replace" in request_json and request_json["replace"]:
-            logging.info("REPLACING RESUME")
-            ResumeTable.delete_resume(request_json["oldId"])
-        resume: Resume = Resume.create_with_json(resume_json)
+        if request.is_json:
+            request_json: Dict = request.get_json()
+            resume: Resume = Resume.create_with_json(request_json["resume"])
+            replace: bool = bool(request_json.get("replace", False))
+            old_id = request_json.get("oldId")
+        else:
+            try:
+                resume = DatabaseServer.read_binary_resume_upload(str(user.user_id))
+            except UploadTooLarge:
+                return f"Resume is larger than {ResumeUpload.MAX_BYTES} bytes", 413
+            if resume is None:
+                return "No resume file sent", 400
+            replace = ResumeUpload.parse_bool(request.args.get("replace"))
+            old_id = request.args.get("oldId")
         resume.user_id = str(user.user_id)
-        resume_json: Dict = ResumeTable.add_resume(user.user_id, resume)
+        try:
+            resume_json: Dict = ResumeTable.add_resume(user.user_id, resume)
+        except (TextExtractionUnavailable, LibreOfficeError):
+            return "Could not read resume right now, try again", 503
+        #only once the new one is in, a failed add must not cost the user their old resume
+        if replace:
+            logging.info("REPLACING RESUME")
+            ResumeTable.delete_resume(old_id, user.user_id)
         logging.info(f"=============== END ADD RESUME TOOK {time.time() - st} =================")
-        return json.dumps(resume_json)
+        #newer clients upload binary and read the file back from resume_file, don't echo it as an int array
+        return json.dumps(resume_json if request.is_json else resume.to_metadata_json())
+    '''
+    read_binary_resume_upload
+
+    streams a multipart or raw body resume out of the current request
+
+    args:
+        user_id: id of the uploading user
+    returns:
+        the resume, None if the request had no file
+    raises:
+        UploadTooLarge
+    '''
+    def read_binary_resume_upload(user_id: str) -> Resume | None:
+        ResumeUpload.check_content_length(request.content_length)
+        if request.mimetype == "multipart/form-data":
+            #werkzeug spools file parts to disk past 500KB, the content length check above bounds it
+            uploaded_file = request.files.get("file")
+            if uploaded_file is None:
+                return None
+            file_content, content_hash = ResumeUpload.read_stream(uploaded_file.stream)
+            file_name: str = request.args.get("fileName") or uploaded_file.filename or "resume"
+            file_type: str | None = request.args.get("fileType") or ResumeUpload.FILE_TYPES_BY_MIMETYPE.get(uploaded_file.mimetype)
+        else:
+            file_content, content_hash = ResumeUpload.read_stream(request.stream)
+            if not file_content:
+                return None
+            file_name = request.args.get("fileName", "resume")
+            file_type = request.args.get("fileType") or ResumeUpload.FILE_TYPES_BY_MIMETYPE.get(request.mimetype)
+        return ResumeUpload.create_resume(file_content, content_hash, user_id, file_name, file_type,
+                                          request.args.get("name"), ResumeUpload.parse_bool(request.args.get("isDefault")))
+    '''
+    get_resume_comparison
+
+    compares a resume against a job description, unless the resume was already compared against the same description
+    under another job id (a repost), then that comparison is copied over to this job id instead
+
+    args:
+        job_description: text of the job description
+        job_id: id of the job
+        resume: resume with its text
+        user_id: id of the user
+    returns:
+        comparison dict, not yet stored
+    '''
+    def get_resume_comparison(job_description: str, job_id: str, resume: Resume, user_id: str) -> Dict:
+        description_hash: str = JobDescriptionTable.hash_description(job_description)
+        resume_comparison_data: Dict | None = ResumeComparisonCollection.read_comparison_for_description(user_id, resume.id, description_hash)
+        if resume_comparison_data is not None:
+            logging.info("REUSING RESUME COMPARISON OF A JOB WITH THE SAME DESCRIPTION")
+            resume_comparison_data["jobId"] = job_id
+            return resume_comparison_data
+        with RequestTiming.span(RequestTiming.LLM):
+            resume_comparison_data = ResumeComparison.get_resume_comparison_dict(job_description, job_id, resume, user_id)
+        resume_comparison_data["descriptionHash"] = description_hash
+        return resume_comparison_data
     '''
     delete_resume
 
@@ -874,12 +1083,12 @@ class DatabaseServer:
         token : str = request.headers.get('Authorization')
         user : User | None = decode_user_from_token(token)
         resume_id: str = request.args.get('resumeId', default="NO RESUME LOADED", type=str)
-        reread_resume: Resume = ResumeTable.read_resume_by_id(resume_id)
+        reread_resume: Resume | None = ResumeTable.read_resume_metadata_by_id(resume_id)
         if not reread_resume:
             return "Resume not found", 404
         if (str(reread_resume.user_id) != str(user.user_id)):
             return 'Invalid Id', 403
-        ResumeTable.delete_resume(resume_id)
+        ResumeTable.delete_resume(resume_id, user.user_id)
         logging.info("=============== END DELETE RESUME =================")
         return 'success', 200
     @app.route('/databases/read_resume', methods=['GET'])
@@ -890,14 +1099,65 @@ class DatabaseServer:
         token : str = request.headers.get('Authorization')
         user : User | None = decode_user_from_token(token)
         resume_id: str = request.args.get('resumeId', default="NO RESUME LOADED", type=str)
-        reread_resume: Resume = ResumeTable.read_resume_by_id(resume_id)
+        reread_resume: Resume | None = ResumeTable.read_resume_metadata_by_id(resume_id)
+        if not reread_resume:
+            return "Could not find resume with id", 404
         if (str(reread_resume.user_id) != str(user.user_id)):
             return 'Invalid Id', 403
         resume: Resume = ResumeTable.read_resume_by_id(resume_id)
         if resume:
-            return json.dumps(resume.to_json())
+            return JsonWriter.dumps(resume)
         logging.info("=============== END READ RESUME =================")
         return "Could not find resume with id", 404
+    '''
+    resume_file
+
+    sends the raw bytes of a resume with an ETag of its content hash. Supports If-None-Match (304 without reading
+    the file) and Range requests
+
+    request
+        resumeId: id of resume
+    returns:
+        the file
+    '''
+    @app.route('/databases/resume_file', methods=['GET'])
+    @token_required
+    def resume_file():
+        st = time.time()
+        logging.info("=============== BEGIN RESUME FILE =================")
+        logging.info(request.url)
+        token : str = request.headers.get('Authorization')
+        user : User | None = decode_user_from_token(token)
+        resume_id: str = request.args.get('resumeId', default="NO RESUME LOADED", type=str)
+        resume_metadata: Resume | None = ResumeTable.read_resume_metadata_by_id(resume_id)
+        if not resume_metadata:
+            return "Resume not found", 404
+        if (str(resume_metadata.user_id) != str(user.user_id)):
+            return 'Invalid Id', 403
+        if resume_metadata.content_hash and request.if_none_match.contains(resume_metadata.content_hash):
+            logging.info(f"=============== END RESUME FILE NOT MODIFIED TOOK {time.time() - st} seconds =================")
+            response: Response = Response(status=304)
+            response.set_etag(resume_metadata.content_hash)
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            return response
+        mimetype: str = mimetypes.guess_type(f"resume.{resume_metadata.file_type}")[0] or "application/octet-stream"
+        if resume_metadata.file_hash:
+            #a real file for the local store, streamed in blocks instead of read into memory
+            file = BlobStore.open(resume_metadata.file_hash)
+            content_hash: str = resume_metadata.content_hash or resume_metadata.file_hash
+        else:
+            #not moved to the blob store yet
+            resume: Resume = ResumeTable.read_resume_by_id(resume_id)
+            file = io.BytesIO(resume.file_content)
+            content_hash = ResumeTable.ensure_content_hash(resume)
+        #conditional handles If-None-Match and Range (206/416) for us
+        response: Response = send_file(file, mimetype=mimetype, download_name=resume_metadata.file_name,
+                                       etag=content_hash, conditional=True, max_age=0)
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        logging.info(f"=============== END RESUME FILE TOOK {time.time() - st} seconds =================")
+        return response
     @app.route('/databases/update_resume', methods=['POST'])
     @token_required
     def update_resume():
@@ -907,7 +1167,7 @@ class DatabaseServer:
         user : User | None = decode_user_from_token(token)
         resume_id: str = request.args.get('resumeId', default="NO RESUME LOADED", type=str)
         update_json: str = request.get_json()
-        reread_resume: Resume = ResumeTable.read_resume_by_id(resume_id)
+        reread_resume: Resume | None = ResumeTable.read_resume_metadata_by_id(resume_id)
         if not reread_resume:
             return "Resume not found", 404
         if (str(reread_resume.user_id) != str(user.user_id)):
@@ -937,13 +1197,13 @@ class DatabaseServer:
         req_json = request.get_json()
         job_description: str = req_json["jobDescription"]
         job_id = req_json["jobId"]
-        resumes: list[Resume] = ResumeTable.read_user_resumes(user.user_id)
+        resumes: list[Resume] = ResumeTable.read_user_resumes_text(user.user_id)
         resume_comparison_data: Dict = {}
         for resume in resumes:
-            resume_comparison_data[resume.id] = ResumeComparison.get_resume_comparison_dict(job_description, job_id, resume, user.user_id)
+            resume_comparison_data[resume.id] = DatabaseServer.get_resume_comparison(job_description, job_id, resume, user.user_id)
         ResumeComparisonCollection.add_resume_comparisons(list(resume_comparison_data.values()))
         logging.info("=============== END COMPARE RESUMES =================")
-        return json.dumps(resume_comparison_data) 
+        return ResponseEncoding.make_response({str(resume_id): comparison for resume_id, comparison in resume_comparison_data.items()})
     '''
     compare_resumes_by_id
 
@@ -961,16 +1221,15 @@ class DatabaseServer:
         job_description: str = req_json["jobDescription"]
         job_id = req_json["jobId"]
         resume_id = req_json["resumeId"]
-        reread_resume: Resume = ResumeTable.read_resume_by_id(resume_id)
+        reread_resume: Resume | None = ResumeTable.read_resume_text_by_id(resume_id)
         if not reread_resume:
             return "Resume not found", 404
         if (str(reread_resume.user_id) != str(user.user_id)):
             return 'Invalid Id', 403
-        resume: Resume = ResumeTable.read_resume_by_id(resume_id)
-        resume_comparison_data = ResumeComparison.get_resume_comparison_dict(job_description, job_id, resume, user.user_id)
+        resume_comparison_data = DatabaseServer.get_resume_comparison(job_description, job_id, reread_resume, user.user_id)
         ResumeComparisonCollection.add_resume_comparison(resume_comparison_data)
         logging.info("=============== END COMPARE RESUMES BY ID =================")
-        return json.dumps(resume_comparison_data) 
+        return ResponseEncoding.make_response(resume_comparison_data)
     '''
     get_specific_resume_comparison
 
@@ -993,7 +1252,7 @@ class DatabaseServer:
         resume_id : str = request.args.get('resumeId', default="NO RESUME ID LOADED", type=str)
         logging.info({"job_id": job_id})
         logging.info({"resume_id": resume_id})
-        reread_resume: Resume = ResumeTable.read_resume_by_id(resume_id)
+        reread_resume: Resume | None = ResumeTable.read_resume_metadata_by_id(resume_id)
         if not reread_resume:
             logging.error("Resume not found")
             return "Resume not found", 404
@@ -1007,7 +1266,7 @@ class DatabaseServer:
         #Remove mongodb id
         del resume_comparison["_id"]
         logging.info(f"=============== END GET SPECIFIC RESUME COMPARISON TOOK {time.time() - st} seconds=================")
-        return json.dumps(resume_comparison)
+        return ResponseEncoding.make_response(resume_comparison)
     '''
     FOR TESTING ONLY
 
@@ -1033,11 +1292,12 @@ class DatabaseServer:
         resume_json: Dict = request.get_json()["resume"]
         resume: Resume = Resume.create_with_json(resume_json)
         logging.debug("got resumes")
-        resume_comparison_data = ResumeComparison.get_resume_comparison_dict(job_description, job_id, resume, user.user_id)
+        with RequestTiming.span(RequestTiming.LLM):
+            resume_comparison_data = ResumeComparison.get_resume_comparison_dict(job_description, job_id, resume, user.user_id)
         #Not going to add these to db, pretty much just for debugview
         logging.debug("Returning data")
         logging.info("=============== END COMPARE RESUME FROM REQUEST =================")
-        return json.dumps(resume_comparison_data) 
+        return ResponseEncoding.make_response(resume_comparison_data)
     
     @app.route('/databases/compare_resume_by_ids', methods=['GET'])
     @PaymentDecorators.check_subscription_for_resume_rating
@@ -1050,7 +1310,7 @@ class DatabaseServer:
         user : User | None = decode_user_from_token(token)
         job_id : str = request.args.get('jobId', default="NO JOB ID LOADED", type=str)
         resume_id : str = request.args.get('resumeId', default="NO RESUME ID LOADED", type=str)
-        reread_resume: Resume = ResumeTable.read_resume_by_id(resume_id)
+        reread_resume: Resume | None = ResumeTable.read_resume_text_by_id(resume_id)
         if not reread_resume:
             logging.error(f"Could not find resume with id: {resume_id}")
             return "Resume not found", 404
@@ -1060,12 +1320,10 @@ class DatabaseServer:
         if not job:
             logging.error(f"Could not find job with id: {job_id}")
             return "Job not found", 404
-        resume_comparison_data = ResumeComparison.get_resume_comparison_dict(job.description, job_id, reread_resume, user.user_id)
+        resume_comparison_data = DatabaseServer.get_resume_comparison(job.description, job_id, reread_resume, user.user_id)
         ResumeComparisonCollection.add_resume_comparison(resume_comparison_data)
-        #Remove mongodb id
-        del resume_comparison_data["_id"]
         logging.info(f"=============== END COMPARE RESUME BY IDS TOOK {time.time() - st} seconds =================")
-        return json.dumps(resume_comparison_data)
+        return ResponseEncoding.make_response(resume_comparison_data)
     ##################################################################################################
     #
     #
@@ -1119,7 +1377,8 @@ class DatabaseServer:
         search_text: str = search_json["street"] + " " + search_json["city"] + " " + search_json["zipCode"] + " " + search_json["stateCode"]
         endpoint: str = "mapbox.places"
         #quoting to uri encode it
-        mapbox_response: Dict = requests.get(f"https://api.mapbox.com/geocoding/v5/{endpoint}/{quote(search_text)}.json?access_token={MAPBOXKEY}").json()
+        with RequestTiming.span(RequestTiming.HTTP):
+            mapbox_response: Dict = requests.get(f"https://api.mapbox.com/geocoding/v5/{endpoint}/{quote(search_text)}.json?access_token={MAPBOXKEY}").json()
         main_location: Dict = mapbox_response["features"][0]
         logging.info("Verified location to:")
         logging.info(main_location)
@@ -1143,14 +1402,15 @@ class DatabaseServer:
         if not origin_lat or not origin_lng or not dest_lat or not dest_lng:
             logging.error("MISSING PARAMETERS! Cannot get directions")
             return json.dumps({'message': 'Missing required parameters'}), 400
-        response_json, other_way_arriving_json, response_json_reversed, other_way_returning_json = asyncio.run(LocationFinder.run_all_directions_queries_in_parallel(origin_lat, origin_lng, dest_lat, dest_lng))
+        with RequestTiming.span(RequestTiming.HTTP):
+            response_json, other_way_arriving_json, response_json_reversed, other_way_returning_json = asyncio.run(LocationFinder.run_all_directions_queries_in_parallel(origin_lat, origin_lng, dest_lat, dest_lng))
         if not response_json:
             return json.dumps({'message': 'Failed to grab location'}), 400
         response_json["leavingDuration"] = response_json_reversed["arrivingDuration"]
         response_json["leavingTrafficDuration"] = response_json_reversed["arrivingTrafficDuration"]
         LocationFinder.add_traffic_directions(response_json, other_way_arriving_json, other_way_returning_json)
         logging.info("=============== END GET DIRECTIONS =================")
-        return json.dumps(response_json), 200
+        return ResponseEncoding.make_response(response_json)
     @app.route('/api/get_relocation_data', methods=['POST'])
     @PaymentDecorators.pro_subscription_required
     @token_required
@@ -1166,9 +1426,10 @@ class DatabaseServer:
         if not location:
             logging.error("Failed to get location from request body")
             return json.dumps({'message': 'Missing required parameters'}), 400
-        relocation_data = asyncio.run(RelocationDataGrabber.get_data(location))
+        with RequestTiming.span(RequestTiming.HTTP):
+            relocation_data = asyncio.run(RelocationDataGrabber.get_data(location))
         logging.info(f"=============== END GET RELOCATION DATA TOOK {time.time() - st} seconds =================")
-        return json.dumps(relocation_data), 200
+        return ResponseEncoding.make_response(relocation_data)
     ##################################################################################################
     #
     #
@@ -1185,7 +1446,7 @@ class DatabaseServer:
         if forgot_password:
             logging.info("Forgot Password is true")
         if forgot_password:
-            user: User = UserTable.read_user_by_email(email)
+            user: AuthUser = UserTable.read_auth_user_by_email(email)
             if not user:
                 return "User not found!", 404
         confirmation_code = str(random.randint(0, 999999)).zfill(6)
@@ -1218,7 +1479,7 @@ class DatabaseServer:
         if confirmation_data["CreatedAt"].timestamp() + 600 < time.time():
             return "Expired Code", 401
         if forgot_password:
-            user: User = UserTable.read_user_by_email(email)
+            user: AuthUser = UserTable.read_auth_user_by_email(email)
             if not user:
                 logging.error("Couldn't find user")
                 return "Invalid Confirmation Code", 401
@@ -1253,7 +1514,7 @@ class DatabaseServer:
         if not new_password:
             return "No password sent", 400
         email = payload["email"]
-        user = UserTable.read_user_by_email(email)
+        user = UserTable.read_auth_user_by_email(email)
         UserTable.reset_user_password(user.user_id, new_password)
         logging.info("=============== END RESET PASSWORD =================")
         return "success", 200
@@ -1415,6 +1676,7 @@ class DatabaseServer:
                 user_subscription: UserSubscription = UserSubscriptionTable.read_subscription_by_stripe_sub_id(stripe_subscription_id)
                 user: User = UserTable.read_user_by_id(str(user_subscription.user_id))
                 Mailing.send_html_email("We're sorry to see you go!", Mailing.get_html_from_file("canceled"), user.email)
+                EntitlementCache.invalidate(user.user_id)
                 ResumeTable.clear_resumes_after_subscription_end(user.user_id)
             except RuntimeError as e:
                 logging.error(e)
@@ -1489,7 +1751,7 @@ class DatabaseServer:
         token : str = request.headers.get('Authorization')
         logging.debug(token)
         try:
-            user : User | None = decode_user_from_token(token)
+            user : AuthUser | None = decode_user_from_token(token)
             logging.debug("=============== END VERIFY TOKEN =================")
             if user:
                 return "AUTHED", 200
@@ -1497,6 +1759,40 @@ class DatabaseServer:
                 return "NO_AUTH", 200
         except:
             return "NO_AUTH", 200
+    ##################################################################################################
+    #
+    #
+    # METRICS
+    #
+    #
+    #################################################################################################
+    '''
+    metrics
+
+    latency of every route and of the mysql, mongo, http, llm and serialization time inside it, see RequestTiming
+
+    args:
+        request
+            X-Metrics-Key header: METRICS_KEY
+    returns:
+        json with count, mean, p50, p95, p99 and max ms per route and span for the worker that answered (with its
+        mysql pool and text extraction counters), each worker, and all workers together
+    '''
+    @app.route('/internal/metrics', methods=['GET'])
+    def metrics():
+        if not METRICS_KEY or not hmac.compare_digest(request.headers.get("X-Metrics-Key", ""), METRICS_KEY):
+            abort(404)
+        workers: Dict[int, Dict] = RequestTiming.read_workers()
+        return ResponseEncoding.make_response({
+            "worker": {
+                "pid": os.getpid(),
+                "routes": RequestTiming.summarize(workers[os.getpid()]),
+                "mysqlPool": DatabaseFunctions.pool_stats(),
+                "textExtraction": TextExtraction.stats()
+            },
+            "workers": {str(pid): RequestTiming.summarize(histograms) for pid, histograms in workers.items()},
+            "all": RequestTiming.summarize(RequestTiming.merge(list(workers.values())))
+        })
     #################################################################################################
     def shutdown():
         logging.critical("Handling database server shutdown")
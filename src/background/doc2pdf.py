@@ -1,12 +1,64 @@
 import sys
+import os
 import subprocess
 import re
+import tempfile
+import threading
+import requests
+
+#long lived conversion server (the doc2pdf service in docker-compose), keeps libreoffice warm, queues jobs and
+#restarts libreoffice every few conversions. Without it we fall back to a libreoffice process per conversion
+DOC2PDF_SERVER_URL = os.environ.get("DOC2PDF_SERVER_URL")
+DOC2PDF_TIMEOUT_SECONDS = float(os.environ.get("DOC2PDF_TIMEOUT_SECONDS", 60))
+#fallback only, how many libreoffice processes one worker may run at once
+DOC2PDF_MAX_CONCURRENCY = int(os.environ.get("DOC2PDF_MAX_CONCURRENCY", 1))
+_local_slots = threading.BoundedSemaphore(DOC2PDF_MAX_CONCURRENCY)
+
+
+def convert_bytes(docx_bytes, timeout=DOC2PDF_TIMEOUT_SECONDS):
+    if DOC2PDF_SERVER_URL:
+        return convert_with_server(docx_bytes, timeout)
+    return convert_locally(docx_bytes, timeout)
+
+
+def convert_with_server(docx_bytes, timeout=DOC2PDF_TIMEOUT_SECONDS):
+    #sent straight from memory, nothing touches disk on our side
+    try:
+        response = requests.post(
+            DOC2PDF_SERVER_URL.rstrip('/') + '/forms/libreoffice/convert',
+            files={'files': ('resume.docx', docx_bytes)},
+            timeout=timeout
+        )
+    except requests.RequestException as e:
+        raise LibreOfficeError(f'Conversion server unreachable: {e}')
+    if response.status_code != 200:
+        raise LibreOfficeError(f'Conversion server returned {response.status_code}: {response.text[:200]}')
+    return response.content
+
+
+def convert_locally(docx_bytes, timeout=DOC2PDF_TIMEOUT_SECONDS):
+    if not _local_slots.acquire(timeout=timeout):
+        raise LibreOfficeError(f'No conversion slot freed up in {timeout} seconds')
+    try:
+        with tempfile.TemporaryDirectory(prefix='doc2pdf_') as folder:
+            source = os.path.join(folder, 'resume.docx')
+            with open(source, 'wb') as f:
+                f.write(docx_bytes)
+            with open(convert_to(folder, source, timeout=timeout), 'rb') as f:
+                return f.read()
+    finally:
+        _local_slots.release()
 
 
 def convert_to(folder, source, timeout=None):
-    args = [libreoffice_exec(), '--headless', '--convert-to', 'pdf', '--outdir', folder, source]
+    #profile per worker thread, two libreoffice processes sharing one fail to start but building one costs seconds
+    profile = 'file://' + os.path.join(tempfile.gettempdir(), f'doc2pdf_profile_{os.getpid()}_{threading.get_ident()}')
+    args = [libreoffice_exec(), '-env:UserInstallation=' + profile, '--headless', '--convert-to', 'pdf', '--outdir', folder, source]
 
-    process = subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout)
+    try:
+        process = subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        raise LibreOfficeError(f'Conversion timed out after {timeout} seconds')
     filename = re.search('-> (.*?) using filter', process.stdout.decode())
 
     if filename is None:
@@ -26,5 +78,8 @@ class LibreOfficeError(Exception):
     def __init__(self, output):
         self.output = output
 
+    def __str__(self):
+        return self.output
+
 if __name__ == '__main__':
     print('Converted to ' + convert_to(sys.argv[1], sys.argv[2]))
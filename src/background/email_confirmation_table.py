@@ -25,7 +25,7 @@ class EmailConfirmationTable:
             WHERE Email = %s
         '''
     def add_confirmation_code(email, confirmation_code, forgot_password=False):
-        with get_connection() as conn:
+        with get_connection(request_scoped=True) as conn:
             with conn.cursor(dictionary=True) as cursor:
                 query = EmailConfirmationTable.__get_new_confirmation_code_query()
                 values = (email, confirmation_code, forgot_password)
@@ -33,7 +33,7 @@ class EmailConfirmationTable:
                 conn.commit()
         return 0
     def readConfirmationCode(email):
-        with get_connection() as conn:
+        with get_connection(request_scoped=True) as conn:
             with conn.cursor(dictionary=True) as cursor:
                 query = EmailConfirmationTable.__get_read_confirmation_code_query()
                 cursor.execute(query, (email,))
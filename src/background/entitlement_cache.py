@@ -0,0 +1,81 @@
+#(c) 2024 Daniel DeMoney. All rights reserved.
+from timed_cache import TimedCache
+from typing import Callable
+from uuid import UUID
+import datetime
+import os
+import logging
+
+class Entitlement:
+    '''
+    Entitlement
+
+    What a user is allowed to do right now, everything PaymentDecorators needs to gate a route
+
+    args:
+        subscription_valid: if the user has a subscription that hasn't passed its period end
+        current_period_end: end of the current period, None if the user never subscribed
+    '''
+    def __init__(self, subscription_valid: bool, current_period_end: datetime.datetime | None) -> None:
+        self.subscription_valid: bool = subscription_valid
+        self.current_period_end: datetime.datetime | None = current_period_end
+        #filled in lazily, only free users get gated on these
+        self.resume_count: int | None = None
+        self.free_ratings_exhausted: bool = False
+
+class EntitlementCache:
+    '''
+    EntitlementCache
+
+    Per worker cache of Entitlements so gated routes don't read the subscription (and count resumes) on every call
+
+    Valid subscriptions are cached until current_period_end, nothing but the period ending takes pro away.
+    Everything else (no subscription, expired, resume count, out of free ratings) only lives for NEGATIVE_TTL_SECONDS,
+    a stripe webhook can land on a different worker so this worker has to find out on its own that the user paid.
+
+    Subscription writes and resume add/delete call invalidate.
+    '''
+    NEGATIVE_TTL_SECONDS: float = float(os.environ.get("ENTITLEMENT_CACHE_NEGATIVE_TTL", 30))
+    MAX_SIZE: int = int(os.environ.get("ENTITLEMENT_CACHE_MAX_SIZE", 4096))
+    __worker_cache: TimedCache = TimedCache(MAX_SIZE, NEGATIVE_TTL_SECONDS)
+    '''
+    get_or_load
+
+    args:
+        user_id: id of the user
+        loader: function that reads the users subscription (or None) if we miss
+    returns:
+        the users Entitlement
+    '''
+    def get_or_load(user_id: UUID | str, loader: Callable) -> Entitlement:
+        user_id = str(user_id)
+        entitlement: Entitlement | None = EntitlementCache.__worker_cache.get(user_id)
+        if entitlement is not None:
+            logging.debug("ENTITLEMENT FOUND IN CACHE")
+            return entitlement
+        user_subscription = loader()
+        if user_subscription and user_subscription.valid():
+            entitlement = Entitlement(True, user_subscription.current_period_end)
+            ttl: float = (user_subscription.current_period_end - datetime.datetime.now()).total_seconds()
+        else:
+            entitlement = Entitlement(False, user_subscription.current_period_end if user_subscription else None)
+            ttl = EntitlementCache.NEGATIVE_TTL_SECONDS
+        EntitlementCache.__worker_cache.set(user_id, entitlement, ttl)
+        return entitlement
+    '''
+    invalidate
+
+    drops a users cached entitlement, call after any write to their subscription or resumes
+
+    args:
+        user_id: id of the user
+    '''
+    def invalidate(user_id: UUID | str) -> None:
+        EntitlementCache.__worker_cache.pop(str(user_id))
+    '''
+    clear
+
+    drops every entitlement in this worker
+    '''
+    def clear() -> None:
+        EntitlementCache.__worker_cache.clear()
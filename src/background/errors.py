@@ -15,4 +15,23 @@ class NoFreeRatingsLeft(Exception):
         self.message = message
         
     def __str__(self):
-        return self.message
\ No newline at end of file
+        return self.message
+
+class TextExtractionUnavailable(Exception):
+    """when a resume needs tika to read it and tika is busy or down"""
+    
+    def __init__(self, message="Error, could not extract text from the file right now"):
+        self.message = message
+        
+    def __str__(self):
+        return self.message
+
+
+class UploadTooLarge(Exception):
+    """when an uploaded file is bigger than we accept"""
+    
+    def __init__(self, message="Error, uploaded file is too large"):
+        self.message = message
+        
+    def __str__(self):
+        return self.message
@@ -8,7 +8,9 @@ from mysql.connector.types import RowType, RowItemType
 from typing import Dict
 from location_finder import LocationFinder
 from user_specific_job_data import UserSpecificJobData
-import zlib
+from compression_codec import CompressionCodec
+from sql_columns import SqlColumns
+from json_writer import JsonWriter
 import logging
 
 class JobInvalidData(Exception):
@@ -55,20 +57,30 @@ class Job:
         seconds_posted_ago: the number of seconds since the job was posted
         time_added: date_time that we added the job to our db
         location_object: Optional the location object correlating to the jobs location from google places
+        compressed_description: compressed description straight from the db, decompressed the first time
+            description is read instead of description being passed
+        description_hash: key of the description in JobDescription, worked out from the description if not passed
     returns:
         job object with given data
     '''
+    #a user with a thousand saved jobs holds a thousand of these per request
+    __slots__ = ("job_id", "applicants", "career_stage", "job_name", "company", "__compressed_description", "__description", "description_hash",
+                 "payment_base", "payment_freq", "payment_high", "location_str", "mode", "job_posted_at", "time_added", "location_object",
+                 "user_specific_job_data")
     def __init__(self, job_id : str, applicants : int | None, career_stage : str, job_name : str, company : Company | None, 
                  description: str, payment_base : Decimal | None, payment_freq : PaymentFrequency | None, payment_high : Decimal | None, location_str : str,
                  mode: Mode, job_posted_at : datetime, time_added : datetime, location_object : Location | None,
-                 user_specific_job_data: UserSpecificJobData | None = None) -> None:
+                 user_specific_job_data: UserSpecificJobData | None = None, compressed_description: bytes | None = None,
+                 description_hash: str | None = None) -> None:
         self.job_id : str = job_id
         assert(self.job_id is not None)
         self.applicants : int = applicants
         self.career_stage : str = career_stage
         self.job_name : str = job_name
         self.company : Company | None = company
-        self.description : str = description
+        self.__compressed_description: bytes | None = compressed_description
+        self.__description: str | None = description
+        self.description_hash: str | None = description_hash
         self.payment_base : Decimal | None = payment_base
         self.payment_freq : PaymentFrequency | None = payment_freq
         self.payment_high : Decimal | None = payment_high
@@ -79,6 +91,53 @@ class Job:
         self.location_object : Location = location_object
         self.user_specific_job_data : UserSpecificJobData = user_specific_job_data
     '''
+    description
+
+    text of the job description, decompressed on first read so jobs listed without it never pay for it
+    '''
+    @property
+    def description(self) -> str | None:
+        if self.__description is None and self.__compressed_description is not None:
+            self.__description = CompressionCodec.decompress_text(self.__compressed_description)
+        return self.__description
+    @description.setter
+    def description(self, description: str | None) -> None:
+        self.__description = description
+        self.__compressed_description = None
+        self.description_hash = None
+    '''
+    has_description
+
+    returns:
+        False for jobs read with a summary query, which leave the description out
+    '''
+    def has_description(self) -> bool:
+        return self.__description is not None or self.__compressed_description is not None
+    '''
+    get_description_hash
+
+    returns:
+        key of the description in JobDescription, reposts of the same posting share it
+    '''
+    def get_description_hash(self) -> str:
+        if self.description_hash is None:
+            #imported here so importing the model never builds the mysql pool
+            from job_description_table import JobDescriptionTable
+            self.description_hash = JobDescriptionTable.hash_description(self.description)
+        return self.description_hash
+    '''
+    get_compressed_description
+
+    returns:
+        the description as stored in JobDescription
+    '''
+    def get_compressed_description(self) -> bytes:
+        #a job read from the db and never read still has the bytes we'd compress it back into, unless they're from an
+        #older format or dictionary
+        if self.__compressed_description is not None and CompressionCodec.is_current(self.__compressed_description, CompressionCodec.JOB_DESCRIPTION):
+            return self.__compressed_description
+        return CompressionCodec.compress_text(self.description, CompressionCodec.JOB_DESCRIPTION)
+    '''
     str_to_mode
 
     turns a str mode into a Mode type mode
@@ -152,37 +211,42 @@ class Job:
     def create_with_sql_row(cls, sql_query_row: (Dict[str, RowItemType])) -> 'Job':
         logging.debug("CREATING JOB WITH SQL ROW OF: ")
         logging.debug(sql_query_row)
-        company : Company | None = Company.create_with_sql_row(sql_query_row)
-        location : Location | None = Location.try_get_location_from_sql_row(sql_query_row)
-        job_id : str = sql_query_row["JobId"]
-        applicants : int | None = int(sql_query_row["Applicants"]) if sql_query_row["Applicants"] is not None else None
-        career_stage : str = sql_query_row["CareerStage"]
-        decompressed_bytes: bytes = zlib.decompress(sql_query_row["Description"])
-        decompressed_description: str = decompressed_bytes.decode("utf-8")
-        description : str = decompressed_description
-        job_name : str = sql_query_row["Job"]
-        payment_base : Decimal = sql_query_row["PaymentBase"]
-        try:
-            payment_freq : PaymentFrequency = Job.str_to_payment_frequency(sql_query_row["PaymentFreq"])
-        except KeyError:
-            payment_freq = None
-        try:
-            payment_high : Decimal = sql_query_row["PaymentHigh"]
-        except KeyError:
-            payment_high = None
-        try:
-            location_str : str = sql_query_row["LocationStr"]
-        except KeyError:
-            location_str = None
-        mode : Mode = Job.str_to_mode(sql_query_row["Mode"])
-        job_posted_at : datetime = sql_query_row["JobPostedAt"]
-        time_added : datetime = sql_query_row["TimeAdded"]
-        user_specific_job_data : UserSpecificJobData | None = None
-        #Check if this is a job with userJob
-        if "TimeSelected" in sql_query_row:
-            user_specific_job_data = UserSpecificJobData.create_with_sql_row(sql_query_row)
-        return cls(job_id, applicants, career_stage, job_name, company, description, payment_base, payment_freq, payment_high, location_str, mode, job_posted_at,
-                   time_added, location, user_specific_job_data=user_specific_job_data)
+        return cls.create_many_with_sql_rows(*SqlColumns.from_dict_row(sql_query_row))[0]
+    '''
+    create_many_with_sql_rows
+
+    creates a job from every row of a result set read with a plain (tuple) cursor, with its company, location and
+    user specific data when they were joined. Column positions are looked up once for the whole result set, see
+    SqlColumns
+
+    args:
+        sql_query_rows: rows from fetchall
+        columns: column name to position in the rows
+    returns:
+        list of Job objects
+    '''
+    @classmethod
+    def create_many_with_sql_rows(cls, sql_query_rows: list[tuple], columns: Dict[str, int]) -> list['Job']:
+        companies : list[Company] = Company.create_many_with_sql_rows(sql_query_rows, columns)
+        locations : list[Location | None] = Location.try_get_locations_from_sql_rows(sql_query_rows, columns)
+        #Check if these are jobs with userJob
+        user_specific_job_datas : list[UserSpecificJobData | None] = (UserSpecificJobData.create_many_with_sql_rows(sql_query_rows, columns)
+                                                                      if "TimeSelected" in columns else [None] * len(sql_query_rows))
+        job_id, applicants, career_stage, job_name = columns["JobId"], columns["Applicants"], columns["CareerStage"], columns["Job"]
+        payment_base, mode, job_posted_at, time_added = columns["PaymentBase"], columns["Mode"], columns["JobPostedAt"], columns["TimeAdded"]
+        #summary queries leave the description out, otherwise it stays compressed until it's read
+        description, description_hash = columns.get("Description"), columns.get("DescriptionHash")
+        payment_freq, payment_high, location_str = columns.get("PaymentFreq"), columns.get("PaymentHigh"), columns.get("LocationStr")
+        jobs : list[Job] = []
+        for row, company, location, user_specific_job_data in zip(sql_query_rows, companies, locations, user_specific_job_datas):
+            jobs.append(cls(row[job_id], int(row[applicants]) if row[applicants] is not None else None, row[career_stage], row[job_name], company,
+                            None, row[payment_base], Job.str_to_payment_frequency(row[payment_freq]) if payment_freq is not None else None,
+                            row[payment_high] if payment_high is not None else None, row[location_str] if location_str is not None else None,
+                            Job.str_to_mode(row[mode]), row[job_posted_at], row[time_added], location,
+                            user_specific_job_data=user_specific_job_data,
+                            compressed_description=row[description] if description is not None else None,
+                            description_hash=row[description_hash] if description_hash is not None else None))
+        return jobs
     '''
     create_with_json
 
@@ -238,18 +302,18 @@ class Job:
     dumps job to json, includes all fks
 
     args:
-        None
+        include_description: False leaves the description out, for listings
     returns:
         Dict
     '''
-    def to_json(self) -> Dict:
-        return {
+    def to_json(self, include_description: bool = True) -> Dict:
+        job_json: Dict = {
             "jobId" : self.job_id,
             "applicants" : self.applicants,
             "careerStage" : self.career_stage,
             "jobName" : self.job_name,
             "company" : self.company.to_json(),
-            "description" : self.description,
+            "description" : self.description if include_description else None,
             "paymentBase": float(self.payment_base) if self.payment_base is not None else None,
             "paymentHigh": float(self.payment_high) if self.payment_high is not None else None,
             "paymentFreq" : Job.payment_frequency_to_str(self.payment_freq) if self.payment_freq else None,
@@ -260,11 +324,47 @@ class Job:
             "location" : self.location_object.to_json() if self.location_object else None,
             "userSpecificJobData" : self.user_specific_job_data.to_json() if self.user_specific_job_data else None
         }
+        if not include_description:
+            del job_json["description"]
+        return job_json
+    '''
+    write_json
+
+    appends the same JSON as JsonWriter.dumps(job.to_json(...)), written straight from the fields
+
+    args:
+        out: pieces of JSON, see JsonWriter.write
+        include_description: False leaves the description out, for listings
+    '''
+    def write_json(self, out: list[str], include_description: bool = True) -> None:
+        value = JsonWriter.value
+        out.append(f'{{"jobId": {value(self.job_id)}, "applicants": {value(self.applicants)}, "careerStage": {value(self.career_stage)}, '
+                   f'"jobName": {value(self.job_name)}, "company": ')
+        self.company.write_json(out)
+        if include_description:
+            out.append(', "description": ')
+            out.append(value(self.description))
+        out.append(f', "paymentBase": {JsonWriter.number(self.payment_base) if self.payment_base is not None else "null"}, '
+                   f'"paymentHigh": {JsonWriter.number(self.payment_high) if self.payment_high is not None else "null"}, '
+                   f'"paymentFreq": {value(Job.payment_frequency_to_str(self.payment_freq)) if self.payment_freq else "null"}, '
+                   f'"locationStr": {value(self.location_str)}, "mode": {value(Job.mode_to_str(self.mode)) if self.mode else "null"}, '
+                   f'"jobPostedAt": {int(self.job_posted_at.timestamp()) if self.job_posted_at is not None else "null"}, '
+                   f'"timeAdded": {int(self.time_added.timestamp()) if self.time_added is not None else "null"}, "location": ')
+        if self.location_object:
+            self.location_object.write_json(out)
+        else:
+            out.append("null")
+        out.append(', "userSpecificJobData": ')
+        if self.user_specific_job_data:
+            self.user_specific_job_data.write_json(out)
+        else:
+            out.append("null")
+        out.append("}")
     '''
     to_sql_friendly_json
 
     dumps job to json friendly for our sql queries where the company object is stored as 
-    fk.
+    fk, and the description as the key of its JobDescription row.
 
     args:
         None
@@ -272,14 +372,14 @@ class Job:
         Dict
     '''
     def to_sql_friendly_json(self) -> Dict:
-        description_bytes: bytes = self.description.encode("utf-8")
-        compressed_description: bytes = zlib.compress(description_bytes)
         sql_friendly_dict : Dict = {
             "jobId" : self.job_id,
             "applicants" : self.applicants,
             "careerStage" : self.career_stage,
             "job" : self.job_name,
-            "description" : compressed_description,
+            "descriptionHash" : self.get_description_hash(),
+            #the text lives in JobDescription, this clears the copy jobs from before it kept in Job
+            "description" : None,
             "company" : self.company.company_name,
             "paymentBase" : self.payment_base if self.payment_base else None,
             "paymentHigh": self.payment_high,
@@ -0,0 +1,167 @@
+#(c) 2024 Daniel DeMoney. All rights reserved.
+from database_functions import get_connection
+from compression_codec import CompressionCodec
+from mysql.connector.errors import IntegrityError
+from mysql.connector.types import RowItemType
+from typing import Dict
+import hashlib
+import sys
+import logging
+
+class JobDescriptionTable:
+    '''
+    JobDescriptionTable
+
+    Job descriptions stored once, keyed by the hash of their text. LinkedIn reposts the same posting under new job
+    ids all the time, every repost points at the same row through Job.DescriptionHash, and anything keyed by
+    DescriptionHash (resume comparisons) is only ever paid for once per posting. Only whitespace is normalized, the
+    row serves its text to every job pointing at it so two descriptions may only share one if they read the same
+    ("C++" and "C#" don't).
+
+    JobTable writes descriptions in the same transaction as the job. Jobs from before this table still have their
+    text in Job.Description, reads fall back to it, the migration at the bottom of this file moves them.
+    '''
+    def __get_read_job_ids_query() -> str:
+        return 'SELECT JobId FROM Job WHERE DescriptionHash = %s'
+    def __get_read_legacy_descriptions_query() -> str:
+        return 'SELECT JobId, Description FROM Job WHERE DescriptionHash IS NULL AND Description IS NOT NULL LIMIT %s'
+    def __get_move_description_query() -> str:
+        return 'UPDATE Job SET DescriptionHash = %s, Description = NULL WHERE JobId = %s'
+    def __get_read_unreferenced_query() -> str:
+        return """
+            SELECT JobDescription.DescriptionHash FROM JobDescription
+            LEFT JOIN Job ON Job.DescriptionHash = JobDescription.DescriptionHash
+            WHERE Job.JobId IS NULL
+        """
+    def __get_delete_description_query() -> str:
+        return 'DELETE FROM JobDescription WHERE DescriptionHash = %s'
+    '''
+    get_description_column
+
+    select item for reading a job joined with JobDescription, goes after * so the dictionary cursor keeps it over
+    the Description columns of Job and JobDescription
+
+    returns:
+        the description from JobDescription, or from Job for jobs from before JobDescription
+    '''
+    def get_description_column() -> str:
+        return "COALESCE(JobDescription.Description, Job.Description) AS Description"
+    '''
+    get_upsert_description_query
+
+    stores a description, or rewrites the stored one if it's in an older compression format. Compressing the same
+    text the same way gives the same bytes, so a description already in the current format isn't written again
+
+    returns:
+        query str with %s for the hash and the compressed description, affected rows are 1 if inserted, 2 if
+        rewritten and 0 if it was already stored as is
+    '''
+    def get_upsert_description_query() -> str:
+        return """
+            INSERT INTO JobDescription (DescriptionHash, Description) VALUES (%s, %s)
+            ON DUPLICATE KEY UPDATE Description = VALUES(Description)
+        """
+    '''
+    normalize
+
+    args:
+        description: text of a job description
+    returns:
+        the description single spaced, without leading or trailing whitespace
+    '''
+    def normalize(description: str) -> str:
+        return " ".join(description.split())
+    '''
+    hash_description
+
+    args:
+        description: text of a job description
+    returns:
+        sha256 hex digest of the normalized text, the key of the description
+    '''
+    def hash_description(description: str) -> str:
+        return hashlib.sha256(JobDescriptionTable.normalize(description).encode("utf-8")).hexdigest()
+    '''
+    read_job_ids_with_description
+
+    args:
+        description_hash: key of the description
+    returns:
+        ids of every job posted with this description
+    '''
+    def read_job_ids_with_description(description_hash: str) -> list[str]:
+        with get_connection(request_scoped=True) as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(JobDescriptionTable.__get_read_job_ids_query(), (description_hash,))
+                return [row[0] for row in cursor.fetchall()]
+    '''
+    migrate
+
+    moves descriptions still in Job.Description into this table
+
+    args:
+        batch_size: jobs read per round trip
+    returns:
+        number of jobs moved
+    '''
+    def migrate(batch_size: int) -> int:
+        moved: int = 0
+        with get_connection() as conn:
+            with conn.cursor(dictionary=True) as cursor:
+                while True:
+                    cursor.execute(JobDescriptionTable.__get_read_legacy_descriptions_query(), (batch_size,))
+                    rows: list[Dict[str, RowItemType]] = cursor.fetchall()
+                    if not rows:
+                        break
+                    for row in rows:
+                        description: str = CompressionCodec.decompress_text(row["Description"])
+                        description_hash: str = JobDescriptionTable.hash_description(description)
+                        compressed: bytes = CompressionCodec.compress_text(description, CompressionCodec.JOB_DESCRIPTION)
+                        cursor.execute(JobDescriptionTable.get_upsert_description_query(), (description_hash, compressed))
+                        cursor.execute(JobDescriptionTable.__get_move_description_query(), (description_hash, row["JobId"]))
+                    conn.commit()
+                    moved += len(rows)
+                    logging.info(f"MOVED {moved} JOB DESCRIPTIONS")
+        return moved
+    '''
+    delete_unreferenced
+
+    deletes descriptions no job points to anymore. The foreign key from Job stops us deleting one a job is being
+    added with right now, those are skipped
+
+    returns:
+        number of descriptions deleted
+    '''
+    def delete_unreferenced() -> int:
+        deleted: int = 0
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(JobDescriptionTable.__get_read_unreferenced_query())
+                description_hashes: list[str] = [row[0] for row in cursor.fetchall()]
+                for description_hash in description_hashes:
+                    try:
+                        cursor.execute(JobDescriptionTable.__get_delete_description_query(), (description_hash,))
+                        conn.commit()
+                        deleted += cursor.rowcount
+                    except IntegrityError:
+                        conn.rollback()
+                        logging.info("DESCRIPTION WAS REUSED, KEEPING IT")
+        logging.info(f"DELETED {deleted} UNREFERENCED JOB DESCRIPTIONS")
+        return deleted
+
+'''
+moves descriptions out of the Job table and clears out descriptions no job uses
+
+python job_description_table.py migrate [batch size]
+python job_description_table.py gc
+'''
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    command: str = sys.argv[1] if len(sys.argv) > 1 else "migrate"
+    if command == "migrate":
+        JobDescriptionTable.migrate(int(sys.argv[2]) if len(sys.argv) > 2 else 500)
+    elif command == "gc":
+        JobDescriptionTable.delete_unreferenced()
+    else:
+        print("usage: python job_description_table.py migrate [batch size] | gc")
+        sys.exit(1)
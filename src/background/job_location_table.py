@@ -11,6 +11,7 @@ from mysql.connector.errors import DataError
 from location import Location
 from mysql.connector.errors import IntegrityError
 from mysql.connector.types import RowType, RowItemType
+from user_data_version_table import UserDataVersionTable
 import logging
 
 class LocationNotFound(Exception):
@@ -81,7 +82,7 @@ class JobLocationTable:
         0 if no error occured
     '''
     def add_job_location(location : Location, job : Job) -> int:
-        with get_connection() as conn:
+        with get_connection(request_scoped=True) as conn:
             with conn.cursor(dictionary=True) as cursor:
                 logging.info("ADDING JOB LOCATION")
                 #we do sql_friendly here because we dont need all foreign key data
@@ -97,6 +98,8 @@ class JobLocationTable:
                 query = JobLocationTable.__get_add_location_query(location_json)
                 try:
                     cursor.execute(query, params)
+                    #every job at this company and location reads the new location
+                    cursor.execute(UserDataVersionTable.get_bump_job_users_query("Job.Company = %s AND Job.LocationStr = %s"), (company, location_str))
                     conn.commit()
                 except IntegrityError:
                     logging.info("Job location already in db")
@@ -118,7 +121,7 @@ class JobLocationTable:
         location object or none if nothing was found
     '''
     def try_read_location(company : str, location_str : str) -> Location | None:
-        with get_connection() as conn:
+        with get_connection(request_scoped=True) as conn:
             with conn.cursor(dictionary=True) as cursor:
                 #Switch to our jobDb
                 cursor.execute("USE JOBDB")
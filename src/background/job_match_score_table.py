@@ -0,0 +1,129 @@
+#(c) 2024 Daniel DeMoney. All rights reserved.
+from database_functions import DatabaseFunctions, get_connection
+from typing import Dict
+from uuid import UUID
+from sync_tombstone_table import SyncTombstoneTable
+from user_data_version_table import UserDataVersionTable
+from datetime import datetime
+import logging
+
+class JobMatchScoreTable:
+    '''
+    JobMatchScoreTable
+
+    Best resume match score per (user, job), reset from mongo whenever resume comparisons are written so
+    get_user_data can read every score with the jobs in one join instead of scanning mongo once per job.
+
+    Mongo is still the source of truth, the backfill at the bottom of this file rebuilds this table from it.
+    '''
+    '''
+    __get_set_match_score_query
+
+    inserts a score or overwrites it, a rerun comparison can lower the best so we never just keep the max
+    '''
+    def __get_set_match_score_query() -> str:
+        return """
+            INSERT INTO JobMatchScore (UserId, JobId, BestMatchScore) VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE BestMatchScore = VALUES(BestMatchScore)
+        """
+    def __get_read_user_match_scores_query(changed_since: bool = False) -> str:
+        return 'SELECT JobId, BestMatchScore FROM JobMatchScore WHERE UserId=%s' + (' AND UpdatedAt > %s' if changed_since else '')
+    def __get_delete_match_score_query() -> str:
+        return 'DELETE FROM JobMatchScore WHERE UserId=%s AND JobId=%s'
+    def __get_delete_user_match_scores_query() -> str:
+        return 'DELETE FROM JobMatchScore WHERE UserId=%s'
+    '''
+    __score_rows
+
+    collapses comparisons to one (user, job, best score) row each so a batch only touches each key once
+    '''
+    def __score_rows(resume_comparison_dicts: list[Dict]) -> list[tuple]:
+        best_scores: Dict[tuple, int] = {}
+        for resume_comparison in resume_comparison_dicts:
+            match_score = resume_comparison.get("matchScore")
+            if match_score is None:
+                continue
+            key: tuple = (str(resume_comparison["userId"]), resume_comparison["jobId"])
+            best_scores[key] = max(best_scores.get(key, match_score), match_score)
+        return [(user_id, job_id, score) for (user_id, job_id), score in best_scores.items()]
+    '''
+    set_match_scores
+
+    overwrites best scores
+
+    args:
+        resume_comparison_dicts: the best comparison (or every comparison) for each (user, job) pair being set
+    returns:
+        number of (user, job) pairs set
+    '''
+    def set_match_scores(resume_comparison_dicts: list[Dict]) -> int:
+        rows: list[tuple] = JobMatchScoreTable.__score_rows(resume_comparison_dicts)
+        if not rows:
+            return 0
+        with get_connection(request_scoped=True) as conn:
+            with conn.cursor() as cursor:
+                cursor.executemany(JobMatchScoreTable.__get_set_match_score_query(), rows)
+                cursor.executemany(UserDataVersionTable.get_bump_version_query(), [(user_id,) for user_id in {row[0] for row in rows}])
+                conn.commit()
+        return len(rows)
+    '''
+    read_user_match_scores
+
+    args:
+        user_id: id of the user
+        changed_since: only read scores set after this db time
+    returns:
+        dict of job id to best match score for every job the user has a comparison for
+    '''
+    def read_user_match_scores(user_id: UUID | str, changed_since: datetime | None = None) -> Dict[str, int]:
+        params: tuple = (str(user_id),) if changed_since is None else (str(user_id), changed_since)
+        with get_connection(request_scoped=True) as conn:
+            with conn.cursor(dictionary=True) as cursor:
+                cursor.execute(JobMatchScoreTable.__get_read_user_match_scores_query(changed_since is not None), params)
+                results = cursor.fetchall()
+        return {row["JobId"]: row["BestMatchScore"] for row in results}
+    def delete_match_score(user_id: UUID | str, job_id: str) -> int:
+        with get_connection(request_scoped=True) as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(SyncTombstoneTable.get_add_tombstones_query(SyncTombstoneTable.SCORE, "JobMatchScore", "UserId", "JobId", "UserId=%s AND JobId=%s"), (str(user_id), job_id))
+                cursor.execute(JobMatchScoreTable.__get_delete_match_score_query(), (str(user_id), job_id))
+                deleted: int = cursor.rowcount
+                cursor.execute(UserDataVersionTable.get_bump_version_query(), (str(user_id),))
+                conn.commit()
+                return deleted
+    def delete_user_match_scores(user_id: UUID | str) -> int:
+        with get_connection(request_scoped=True) as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(SyncTombstoneTable.get_add_tombstones_query(SyncTombstoneTable.SCORE, "JobMatchScore", "UserId", "JobId", "UserId=%s"), (str(user_id),))
+                cursor.execute(JobMatchScoreTable.__get_delete_user_match_scores_query(), (str(user_id),))
+                deleted: int = cursor.rowcount
+                cursor.execute(UserDataVersionTable.get_bump_version_query(), (str(user_id),))
+                conn.commit()
+                return deleted
+
+'''
+Backfill
+
+rebuilds JobMatchScore from every resume comparison in mongo, safe to rerun
+
+python job_match_score_table.py
+'''
+if __name__ == '__main__':
+    from mysql.connector.errors import IntegrityError
+    from resume_comparison_collection import ResumeComparisonCollection
+    logging.basicConfig(level=logging.INFO)
+    best_scores: list[Dict] = ResumeComparisonCollection.read_best_match_scores()
+    BATCH_SIZE: int = 1000
+    for i in range(0, len(best_scores), BATCH_SIZE):
+        batch: list[Dict] = best_scores[i:i + BATCH_SIZE]
+        try:
+            JobMatchScoreTable.set_match_scores(batch)
+        except IntegrityError:
+            #comparisons left behind by deleted users, retry the batch one by one and skip those
+            for best_score in batch:
+                try:
+                    JobMatchScoreTable.set_match_scores([best_score])
+                except IntegrityError:
+                    logging.warning(f"SKIPPING MATCH SCORE FOR MISSING USER {best_score['userId']}")
+    logging.info(f"BACKFILLED {len(best_scores)} JOB MATCH SCORES")
+    DatabaseFunctions.close_mongo_client()
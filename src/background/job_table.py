@@ -3,11 +3,14 @@ from database_functions import DatabaseFunctions, get_connection
 from collections import OrderedDict
 import json
 import uuid
-from company_table import CompanyTable
 from user_job_table import UserJobTable
 from job_location_table import JobLocationTable
+from job_description_table import JobDescriptionTable
+from sync_tombstone_table import SyncTombstoneTable
+from user_data_version_table import UserDataVersionTable
 from job import Job, Mode
 from company import Company
+from location import Location
 from user_specific_job_data import UserSpecificJobData
 from typing import Dict
 from mysql.connector.errors import IntegrityError
@@ -66,13 +69,15 @@ class JobTable:
         literal defined below
     '''
     def __get_most_recent_job_query() -> str:
-        return '''SELECT *
+        return f'''SELECT *, {JobDescriptionTable.get_description_column()}
         FROM Job
         LEFT JOIN Company
         ON Company.CompanyName = Job.Company
         LEFT JOIN JobLocation
         ON JobLocation.QueryStr = CONCAT(Job.Company, " ", Job.LocationStr)
-        ORDER BY TimeAdded DESC'''
+        LEFT JOIN JobDescription
+        ON JobDescription.DescriptionHash = Job.DescriptionHash
+        ORDER BY Job.TimeAdded DESC'''
     '''
     __get_select_job_by_id_query
 
@@ -82,15 +87,27 @@ class JobTable:
         literal defined below
     '''
     def __get_select_job_by_id_query() -> str:
-        return """
-        SELECT * 
+        return f"""
+        SELECT *, {JobDescriptionTable.get_description_column()}
         FROM JOB
         LEFT JOIN Company
         ON Company.CompanyName = Job.Company
         LEFT JOIN JobLocation
         ON JobLocation.QueryStr = CONCAT(Job.Company, " ", Job.LocationStr)
+        LEFT JOIN JobDescription
+        ON JobDescription.DescriptionHash = Job.DescriptionHash
         WHERE Job.JobID = %s;
         """
+    def __get_read_job_version_query() -> str:
+        return """
+        SELECT Job.UpdatedAt AS JobUpdatedAt, Company.UpdatedAt AS CompanyUpdatedAt, JobLocation.QueryStr IS NOT NULL AS HasLocation
+        FROM Job
+        LEFT JOIN Company
+        ON Company.CompanyName = Job.Company
+        LEFT JOIN JobLocation
+        ON JobLocation.QueryStr = CONCAT(Job.Company, " ", Job.LocationStr)
+        WHERE Job.JobId = %s
+        """
     '''
     __get_delete_job_by_id_query
 
@@ -102,11 +119,83 @@ class JobTable:
     def __get_delete_job_by_id_query():
         return f"DELETE FROM Job WHERE JobId=%s"
     '''
+    __get_upsert_company_query
+
+    inserts the company if it's new, leaves it alone if it isn't. affected rows are 1 if inserted and 0 if it was
+    already there
+
+    args:
+        company_json: company.to_json() so we know the cols
+    returns:
+        query str with %s for injection
+    '''
+    def __get_upsert_company_query(company_json: Dict) -> str:
+        cols: list[str] = list(company_json.keys())
+        col_str: str = ", ".join(cols)
+        vals: str = ", ".join(["%s"] * len(cols))
+        return f"INSERT INTO Company ({col_str}) VALUES ({vals}) ON DUPLICATE KEY UPDATE CompanyName = CompanyName"
+    '''
+    __get_fill_empty_company_query
+
+    overwrites a company only if its ratings are empty the way Company.isEmpty means it, the check and the write
+    are one statement so we never overwrite ratings someone else filled in between
+
+    args:
+        company_json: company.to_json() so we know the cols, companyName first
+    returns:
+        query str with %s for injection, company name goes last
+    '''
+    def __get_fill_empty_company_query(company_json: Dict) -> str:
+        cols: list[str] = list(company_json.keys())[1:]
+        col_str: str = "=%s, ".join(cols) + "=%s"
+        ratings: list[str] = ["BusinessOutlookRating", "CareerOpportunitiesRating", "CeoRating", "CompensationAndBenefitsRating",
+                              "CultureAndValuesRating", "DiversityAndInclusionRating", "SeniorManagementRating", "WorkLifeBalanceRating"]
+        #same as Company.isEmpty, no ratings at all or any one of them missing
+        empty_check: str = " + ".join([f"COALESCE({rating}, 0)" for rating in ratings]) + " = 0 OR " + " OR ".join([f"{rating} IS NULL" for rating in ratings])
+        return f"UPDATE Company SET {col_str} WHERE CompanyName = %s AND ({empty_check})"
+    '''
+    __get_upsert_job_query
+
+    inserts the job if it's new, affected rows are 1 if inserted and 0 if it was already there
+
+    args:
+        job_json: job.to_sql_friendly_json() so we know the cols
+    returns:
+        query str with %s for injection
+    '''
+    def __get_upsert_job_query(job_json: Dict) -> str:
+        cols: list[str] = list(job_json.keys())
+        col_str: str = ", ".join(cols)
+        vals: str = ", ".join(["%s"] * len(cols))
+        return f"INSERT INTO Job ({col_str}) VALUES ({vals}) ON DUPLICATE KEY UPDATE JobId = JobId"
+    '''
+    __get_upsert_user_job_query
+
+    adds the user job if it's new, affected rows are 1 if inserted and 0 if the user already had it
+    '''
+    def __get_upsert_user_job_query() -> str:
+        return """
+            INSERT INTO UserJob (UserJobId, UserId, JobId) VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE UserJobId = UserJobId
+        """
+    '''
+    __get_read_company_and_location_query
+
+    reads the stored company and the cached location for the jobs location str in one go
+    '''
+    def __get_read_company_and_location_query() -> str:
+        return """
+            SELECT *
+            FROM Company
+            LEFT JOIN JobLocation
+            ON JobLocation.QueryStr = %s
+            WHERE Company.CompanyName = %s
+        """
+    '''
     add_job_with_foreign_keys
 
     adds a job with all foreign keys
         company
-        user_job
         job_location
     
     and of course adds the job as well
@@ -118,62 +207,102 @@ class JobTable:
         full job with all data for client
     '''
     def add_job_with_foreign_keys(job : Job, user_id_uuid : UUID | str, add_user_job=False) -> Job:
+        job, _, _ = JobTable.upsert_job_with_foreign_keys(job, user_id_uuid, add_user_job=add_user_job)
+        return job
+    '''
+    upsert_job_with_foreign_keys
+
+    adds a job, its company and the user job in one transaction with no failing statements, then fills in
+    the location (only asking google if we've never seen the company + location str before)
+
+        company: inserted if new, filled in if we only had an empty one
+        job: inserted if new
+        user job: inserted if new
+        read back company and cached location in one query
+        commit
+
+    args:
+        job: job object with foreign keys
+        user_id_uuid: user UUID for user that "owns" the job
+        add_user_job: whether to add the job to the users jobs
+    returns:
+        tuple of the full job for the client, whether the job was new, whether the user job was new
+        (always False if add_user_job is False)
+    raises:
+        DuplicateUserJob if add_user_job and the user already has the job, the job and company are still committed
+    '''
+    def upsert_job_with_foreign_keys(job : Job, user_id_uuid : UUID | str, add_user_job=False) -> tuple[Job, bool, bool]:
         user_id : str = str(user_id_uuid)
-        #check that the company isn't already in our DB if it isn't then we add it
-
-        # ============== Company ===============
-        company = CompanyTable.read_company_by_id(job.company.company_name)
-        if not company:
-            CompanyTable.add_company(job.company)
-            logging.info("COMPANY SUCCESSFULLY ADDED")
-        else:
-            logging.info("COMPANY ALREADY IN DB")
-            if company.isEmpty() and not job.company.isEmpty():
-                CompanyTable.update_company(job.company)
-                logging.info("COMPANY DETAILS UPDATED IN DB")
-            job.company = company
-        # =====================================
-
-        # =============== Job =================
-        try:
-            JobTable.add_job(job)
-            logging.info("JOB SUCCESSFULLY ADDED")
-        except IntegrityError:
-            logging.info("JOB ALREADY IN DB")
-        #add the job to the users db
-        # =====================================
+        job_json : Dict = job.to_sql_friendly_json()
+        company_json : Dict = job.company.to_json()
+        location_query_str : str = f"{job_json['company']} {job_json['locationStr']}"
+        user_job_new : bool = False
+        with get_connection(request_scoped=True) as conn:
+            with conn.cursor(dictionary=True) as cursor:
+                # ============== Company ===============
+                cursor.execute(JobTable.__get_upsert_company_query(company_json), list(company_json.values()))
+                company_new : bool = cursor.rowcount == 1
+                company_filled : bool = False
+                if not company_new and not job.company.isEmpty():
+                    params : list = list(company_json.values())[1:]
+                    params.append(company_json["companyName"])
+                    cursor.execute(JobTable.__get_fill_empty_company_query(company_json), params)
+                    company_filled = cursor.rowcount == 1
+                    if company_filled:
+                        cursor.execute(UserDataVersionTable.get_bump_job_users_query("Job.Company = %s"), (company_json["companyName"],))
+                logging.info(f"COMPANY NEW: {company_new} FILLED IN: {company_filled}")
+                # =====================================
+
+                # =============== Job =================
+                cursor.execute(JobDescriptionTable.get_upsert_description_query(), (job_json["descriptionHash"], job.get_compressed_description()))
+                if cursor.rowcount == 0:
+                    logging.info("DESCRIPTION ALREADY STORED")
+                elif cursor.rowcount == 2:
+                    logging.info("REWROTE DESCRIPTION STORED IN AN OLDER FORMAT")
+                cursor.execute(JobTable.__get_upsert_job_query(job_json), list(job_json.values()))
+                job_new : bool = cursor.rowcount == 1
+                logging.info("JOB SUCCESSFULLY ADDED" if job_new else "JOB ALREADY IN DB")
+                # =====================================
 
+                # =========== User Job ================
+                if add_user_job:
+                    user_job_id : str = UserJobTable.generate_user_job_id(user_id, job.job_id)
+                    cursor.execute(JobTable.__get_upsert_user_job_query(), (user_job_id, user_id, job.job_id))
+                    user_job_new = cursor.rowcount == 1
+                    if user_job_new:
+                        cursor.execute(UserDataVersionTable.get_bump_version_query(), (user_id,))
+                # =====================================
+
+                cursor.execute(JobTable.__get_read_company_and_location_query(), (location_query_str, job_json["company"]))
+                stored : Dict[str, RowItemType] = cursor.fetchone()
+                conn.commit()
+        if add_user_job and not user_job_new:
+            logging.info("USER JOB ALREADY IN DB")
+            raise DuplicateUserJob
         if add_user_job:
-            # =========== User Job ================
-            try:
-                UserJobTable.add_user_job(user_id, job.job_id)
-                logging.info("USER JOB ADDED")
-                job.user_specific_job_data = UserSpecificJobData(False, False, datetime.datetime.utcnow())
-            except IntegrityError:
-                logging.info("USER JOB ALREADY IN DB")
-                raise DuplicateUserJob
-        # =====================================
+            logging.info("USER JOB ADDED")
+            job.user_specific_job_data = UserSpecificJobData(False, False, datetime.datetime.utcnow())
+        if not company_new and not company_filled:
+            job.company = Company.create_with_sql_row(stored)
 
         # =========== Location ================
-        #TODO: ADD CHECK FOR IF LOCATION IS IN DB
-        try:
-            if job.location_str and job.mode != Mode.REMOTE:
-                logging.info("No location sent, attempting to request from google places")
+        job.location_object = None
+        if job.location_str and job.mode != Mode.REMOTE:
+            if stored["QueryStr"] is not None:
+                logging.info("LOCATION ALREADY IN DB")
+                job.location_object = Location.try_get_location_from_sql_row(stored)
+            else:
+                logging.info("No location in db, attempting to request from google places")
                 try:
                     job.location_object = JobLocationTable.get_and_add_location_for_job(job)
                 #Will indexerror if the location cant be found
                 except IndexError:
                     job.location_object = None
-            else:
-                job.location_object = None
-        except LocationNotFound:
-            logging.info("COULD NOT FIND LOCATION FOR JOB: " + job.job_name)
-            job.location_object = None
-        except IntegrityError:
-            logging.info('job location already in DB')
+                except LocationNotFound:
+                    logging.info("COULD NOT FIND LOCATION FOR JOB: " + job.job_name)
         # ======================================
         job.time_added = datetime.datetime.utcnow()
-        return job
+        return job, job_new, user_job_new
     '''
     add_job
 
@@ -187,12 +316,13 @@ class JobTable:
         0 if no errors occured
     '''
     def add_job(job: Job) -> int:
-        with get_connection() as conn:
+        with get_connection(request_scoped=True) as conn:
             with conn.cursor(dictionary=True) as cursor:
                 job_json : Dict = job.to_sql_friendly_json()
                 job_add_str : str = JobTable.__get_add_job_query(job_json)
                 try:
                     print(job_json)
+                    cursor.execute(JobDescriptionTable.get_upsert_description_query(), (job_json["descriptionHash"], job.get_compressed_description()))
                     cursor.execute(job_add_str, list(job_json.values()))
                 except IntegrityError as e:
                     raise e
@@ -207,7 +337,7 @@ class JobTable:
         Job Object
     '''
     def read_most_recent_job() -> Job | None:
-        with get_connection() as conn:
+        with get_connection(request_scoped=True) as conn:
             with conn.cursor(dictionary=True) as cursor:
                 query : str = JobTable.__get_most_recent_job_query()
                 cursor.execute(query)
@@ -228,7 +358,7 @@ class JobTable:
         Job Object
     '''
     def read_job_by_id(job_id : str) -> Job | None:
-        with get_connection() as conn:
+        with get_connection(request_scoped=True) as conn:
             with conn.cursor(dictionary=True) as cursor:
                 query : str = JobTable.__get_select_job_by_id_query()
                 #Pass the job Id to be inserted into the query
@@ -240,6 +370,25 @@ class JobTable:
                 logging.info(result)
         return Job.create_with_sql_row(result)
     '''
+    read_job_version
+
+    what read_job_by_id would return changes whenever this does, read from the Job, Company and JobLocation rows
+    without touching the description
+
+    args:
+        job_id: string job id from linkedin
+    returns:
+        version str, None if the job isn't in the db
+    '''
+    def read_job_version(job_id : str) -> str | None:
+        with get_connection(request_scoped=True) as conn:
+            with conn.cursor(dictionary=True) as cursor:
+                cursor.execute(JobTable.__get_read_job_version_query(), (job_id,))
+                result : Dict[str, RowItemType] | None = cursor.fetchone()
+        if not result:
+            return None
+        return f"{result['JobUpdatedAt'].isoformat()}|{result['CompanyUpdatedAt'].isoformat() if result['CompanyUpdatedAt'] else ''}|{result['HasLocation']}"
+    '''
     update_job
 
     matches job id of the job object to the values of the job object.
@@ -252,9 +401,10 @@ class JobTable:
         0 if no errors occured
     '''
     def update_job(job: Job) -> int:
-        with get_connection() as conn:
+        with get_connection(request_scoped=True) as conn:
             with conn.cursor(dictionary=True) as cursor:
                 job_json : Dict = job.to_sql_friendly_json()
+                cursor.execute(JobDescriptionTable.get_upsert_description_query(), (job_json["descriptionHash"], job.get_compressed_description()))
                 #Grab the specific update columns to add to our query
                 update_str : str = JobTable.__get_update_str_job(job_json)
                 #convert the values of our json to a list
@@ -265,6 +415,7 @@ class JobTable:
                 params.append(job_json["jobId"])
                 #Execute the query
                 cursor.execute(update_str, params)
+                cursor.execute(UserDataVersionTable.get_bump_versions_query("UserJob", "UserId", "JobId = %s"), (job_json["jobId"],))
                 conn.commit()
                 #return success
         return 0
@@ -279,9 +430,12 @@ class JobTable:
         0 if no errors occured
     '''
     def delete_job_by_id(job_id):
-        with get_connection() as conn:
+        with get_connection(request_scoped=True) as conn:
             with conn.cursor(dictionary=True) as cursor:
                 query : str = JobTable.__get_delete_job_by_id_query()
+                #the user jobs go with it through the cascade, tell their users
+                cursor.execute(SyncTombstoneTable.get_add_tombstones_query(SyncTombstoneTable.JOB, "UserJob", "UserId", "JobId", "JobId = %s"), (job_id,))
+                cursor.execute(UserDataVersionTable.get_bump_versions_query("UserJob", "UserId", "JobId = %s"), (job_id,))
                 #Run the sql to delete the job
                 cursor.execute(query, (job_id,))
                 conn.commit()
@@ -0,0 +1,152 @@
+#(c) 2024 Daniel DeMoney. All rights reserved.
+from typing import Any
+from decimal import Decimal
+from json.encoder import encode_basestring_ascii
+from uuid import UUID
+import datetime
+import json
+
+class JsonWriter:
+    '''
+    JsonWriter
+
+    Writes response bodies as JSON. Bodies can hold models (Job, Company, User, Resume...) as they are.
+
+    Models with a write_json (Job and what it holds) write themselves straight to JSON text with their field names
+    baked in, no to_json dict is built and strings go through the C escaper directly. That's where most of a body's
+    time went: the stdlib encoder calls back into Python for every float and a job has a dozen. Dicts and lists are
+    walked here so the models in them are reached, other models are encoded from their to_json by the C encoder.
+    Everything is appended to one list of pieces joined once at the end, so a description is only copied into the
+    body once.
+
+    Beyond what json.dumps takes, anything in a body can be a Decimal (a float), a datetime or date (isoformat),
+    a UUID (str) or bytes (a latin1 string, one char per byte, how map images have always been sent).
+
+    The output is byte for byte what json.dumps(model.to_json()) gives (ascii only, ", " and ": " separators),
+    src/tests/json_benchmark.py checks it.
+    '''
+    '''
+    default
+
+    encodes what json can't on its own, for the encoder and msgpack.packb(default=...)
+
+    args:
+        value: value the encoder couldn't handle
+    returns:
+        something it can
+    '''
+    def default(value: Any) -> Any:
+        if hasattr(value, "to_json"):
+            return value.to_json()
+        if isinstance(value, Decimal):
+            return float(value)
+        if isinstance(value, (datetime.datetime, datetime.date)):
+            return value.isoformat()
+        if isinstance(value, UUID):
+            return str(value)
+        if isinstance(value, (bytes, bytearray)):
+            return bytes(value).decode("latin1")
+        raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+    #made once, json.dumps(default=...) makes a new encoder every call
+    __encoder: json.JSONEncoder = json.JSONEncoder(default=default)
+    '''
+    dumps
+
+    args:
+        obj: body, models and dicts or lists of them
+    returns:
+        obj as JSON
+    '''
+    def dumps(obj: Any) -> str:
+        out: list[str] = []
+        JsonWriter.write(obj, out)
+        return "".join(out)
+    '''
+    write
+
+    args:
+        value: anything dumps takes
+        out: pieces of JSON the value is appended to
+    '''
+    def write(value: Any, out: list[str]) -> None:
+        value_type: type = type(value)
+        if value_type is dict:
+            if not all(type(key) is str for key in value):
+                #json turns other keys into strings its own way
+                out.append(JsonWriter.__encoder.encode(value))
+                return
+            separator: str = "{"
+            for key, item in value.items():
+                out.append(f"{separator}{encode_basestring_ascii(key)}: ")
+                JsonWriter.write(item, out)
+                separator = ", "
+            out.append("}" if value else "{}")
+        elif value_type is list or value_type is tuple:
+            separator = "["
+            for item in value:
+                out.append(separator)
+                JsonWriter.write(item, out)
+                separator = ", "
+            out.append("]" if value else "[]")
+        elif hasattr(value, "write_json"):
+            value.write_json(out)
+        else:
+            out.append(JsonWriter.value(value))
+    '''
+    value
+
+    for write_json methods, fields whose type isn't fixed go through here
+
+    args:
+        value: anything dumps takes
+    returns:
+        value as JSON
+    '''
+    def value(value: Any) -> str:
+        if value is None:
+            return "null"
+        value_type: type = type(value)
+        if value_type is str:
+            return encode_basestring_ascii(value)
+        if value_type is bool:
+            return "true" if value else "false"
+        if value_type is int:
+            return int.__repr__(value)
+        if value_type is float:
+            return JsonWriter.number(value)
+        if value_type is dict or value_type is list or value_type is tuple or hasattr(value, "write_json"):
+            return JsonWriter.dumps(value)
+        return JsonWriter.__encoder.encode(value)
+    '''
+    number
+
+    args:
+        value: a float, or a Decimal
+    returns:
+        value as a JSON number, NaN and Infinity written the way json.dumps writes them
+    '''
+    def number(value: float | Decimal) -> str:
+        text: str = float.__repr__(float(value))
+        #only inf and nan end in a letter
+        return text if text[-1].isdigit() else JsonWriter.__encoder.encode(float(value))
+
+class JsonView:
+    '''
+    JsonView
+
+    a model with the args its to_json takes, for putting a job without its description in a body
+
+    args:
+        model: the model
+        kwargs: passed to model.to_json
+    '''
+    def __init__(self, model: Any, **kwargs) -> None:
+        self.model: Any = model
+        self.kwargs: dict = kwargs
+    def to_json(self) -> Any:
+        return self.model.to_json(**self.kwargs)
+    def write_json(self, out: list[str]) -> None:
+        if hasattr(self.model, "write_json"):
+            self.model.write_json(out, **self.kwargs)
+        else:
+            JsonWriter.write(self.to_json(), out)
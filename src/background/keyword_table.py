@@ -1,6 +1,8 @@
 import logging
 from database_functions import DatabaseFunctions, get_connection
 from uuid import UUID
+from user_cache import UserCache
+from user_data_version_table import UserDataVersionTable
 
 NUMKEYWORDS = 10
 
@@ -25,7 +27,7 @@ class KeywordTable:
         '''
     def add_keywords(userId: UUID | str, positive_keywords: list[str], negative_keywords: list[str]) -> int:
         logging.info("ADDING USER KEYWORDS WITH USER ID " + str(userId))
-        with get_connection() as conn:
+        with get_connection(request_scoped=True) as conn:
             with conn.cursor(dictionary=True) as cursor:
                 #Make sure we fill any holes with nones
                 positive_keywords.extend([None] * (NUMKEYWORDS - len(positive_keywords)))
@@ -35,12 +37,15 @@ class KeywordTable:
                 negative_keywords = negative_keywords[:NUMKEYWORDS]
                 query = KeywordTable.__get_add_keywords_query()
                 cursor.execute(query, (userId, *positive_keywords, *negative_keywords))
+                #keywords are part of the preferences get_user_data returns
+                cursor.execute(UserDataVersionTable.get_bump_version_query(), (str(userId),))
                 logging.info("USER KEYWORDS SUCCESSFULLY ADDED")
                 conn.commit()
+        UserCache.invalidate(user_id=userId)
         return 0
     def update_keywords(userId: UUID | str, positive_keywords: list[str], negative_keywords: list[str]) -> int:
         logging.info("UPDATING USER KEYWORDS WITH USER ID " + str(userId))
-        with get_connection() as conn:
+        with get_connection(request_scoped=True) as conn:
             with conn.cursor(dictionary=True) as cursor:
                 #Make sure we fill any holes with nones
                 positive_keywords.extend([None] * (NUMKEYWORDS - len(positive_keywords)))
@@ -50,6 +55,9 @@ class KeywordTable:
                 negative_keywords = negative_keywords[:NUMKEYWORDS]
                 query = KeywordTable.__get_update_keywords_query()
                 cursor.execute(query, (*positive_keywords, *negative_keywords, userId))
+                #keywords are part of the preferences get_user_data returns
+                cursor.execute(UserDataVersionTable.get_bump_version_query(), (str(userId),))
                 logging.info("USER KEYWORDS SUCCESSFULLY UPDATED")
                 conn.commit()
+        UserCache.invalidate(user_id=userId)
         return 0
\ No newline at end of file
@@ -2,6 +2,9 @@
 from typing import Dict
 from mysql.connector.types import RowType, RowItemType
 from typing import Optional
+from operator import itemgetter
+from sql_columns import SqlColumns
+from json_writer import JsonWriter
 import logging
 
 class LocationInvalidData(Exception):
@@ -45,6 +48,9 @@ class Location:
 
         location object
     '''
+    #in the order __init__ takes them
+    SQL_COLUMNS: tuple[str, ...] = ("AddressStr", "City", "ZipCode", "StateCode", "Latitude", "Longitude")
+    __slots__ = ("address_str", "city", "zip_code", "state_code", "latitude", "longitude")
     def __init__(self, address_str: str, city: str, zip_code: str | None, state_code: str | None, latitude: float | None, longitude: float | None) -> None:
         self.address_str = address_str
         self.city = city
@@ -64,14 +70,27 @@ class Location:
     '''
     @classmethod
     def try_get_location_from_sql_row(cls, sql_query_row: (Dict[str, RowItemType])) -> Optional['Location']:
+        return cls.try_get_locations_from_sql_rows(*SqlColumns.from_dict_row(sql_query_row))[0]
+    '''
+    try_get_locations_from_sql_rows
+
+    try_get_location_from_sql_row for every row of a result set read with a plain cursor, see SqlColumns
+
+    args:
+        sql_query_rows: rows from fetchall
+        columns: column name to position in the rows
+    returns:
+        list of Location objects, all None if the location table wasn't joined
+    '''
+    @classmethod
+    def try_get_locations_from_sql_rows(cls, sql_query_rows: list[tuple], columns: Dict[str, int]) -> list[Optional['Location']]:
+        if "AddressStr" not in columns:
+            return [None] * len(sql_query_rows)
         try:
-            sql_query_row["AddressStr"]
-        except KeyError:
-            return None
-        try:
-            return cls(sql_query_row["AddressStr"], sql_query_row["City"], sql_query_row["ZipCode"], sql_query_row["StateCode"], sql_query_row["Latitude"], sql_query_row["Longitude"])
+            get_values: itemgetter = itemgetter(*[columns[column] for column in cls.SQL_COLUMNS])
         except KeyError:
-            raise LocationInvalidData(sql_query_row)
+            raise LocationInvalidData(list(columns))
+        return [cls(*get_values(row)) for row in sql_query_rows]
     '''
     try_get_location_from_json
 
@@ -133,4 +152,18 @@ class Location:
             "stateCode" : self.state_code,
             "latitude" : float(self.latitude) if self.latitude is not None else None,
             "longitude" : float(self.longitude) if self.longitude is not None else None
-        }
\ No newline at end of file
+        }
+    '''
+    write_json
+
+    appends the same JSON as JsonWriter.dumps(location.to_json()), written straight from the fields
+
+    args:
+        out: pieces of JSON, see JsonWriter.write
+    '''
+    def write_json(self, out: list[str]) -> None:
+        value = JsonWriter.value
+        out.append(f'{{"addressStr": {value(self.address_str)}, "city": {value(self.city)}, "zipCode": {value(self.zip_code)}, '
+                   f'"stateCode": {value(self.state_code)}, '
+                   f'"latitude": {JsonWriter.number(self.latitude) if self.latitude is not None else "null"}, '
+                   f'"longitude": {JsonWriter.number(self.longitude) if self.longitude is not None else "null"}}}')
\ No newline at end of file
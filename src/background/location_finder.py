@@ -6,7 +6,7 @@ import aiohttp
 from typing import Dict
 import os
 from location import Location
-from io import BytesIO
+from request_timing import RequestTiming
 import json
 from datetime import datetime, timedelta, timezone
 import pytz
@@ -78,7 +78,8 @@ class LocationFinder:
         query : str = f"{company}, {location_str}"
         logging.debug("Sending request to read company location with query: " +  query)
         google_places_url : str = LocationFinder.base_url + f"?input={query}&inputtype=textquery&fields=name,formatted_address,geometry&key={GOOGLE_API_KEY}"
-        response : requests.Response = requests.get(google_places_url)
+        with RequestTiming.span(RequestTiming.HTTP):
+            response : requests.Response = requests.get(google_places_url)
         data : Dict = response.json()
         if 'candidates' in data and data['candidates']:
             return Location.create_from_google_places_response(data['candidates'][0])
@@ -128,11 +129,11 @@ class LocationFinder:
                     async with session.get(static_map_url) as map_response:
                         if map_response.status == 200:
                             # Return both image bytes and durations
-                            image_bytes = BytesIO(await map_response.read())
                             return {
                                 'arrivingTrafficDuration': duration_in_traffic,
                                 'arrivingDuration': arriving_duration,
-                                'mapImage': image_bytes.getvalue().decode('latin1')  # Encoding to pass binary data as a string
+                                #raw png, ResponseEncoding sends it as bytes or as a latin1 string in json
+                                'mapImage': await map_response.read()
                             }
                         else:
                             logging.error("Failed to get map with status: " + str(map_response.status))
@@ -198,10 +199,9 @@ class LocationFinder:
             async with session.get(static_map_url, params=params) as map_response:
                 if map_response.status == 200:
                     # Read the content of the image as bytes
-                    content = await map_response.read()
-                    image_bytes = BytesIO(content)
+                    #raw png, ResponseEncoding sends it as bytes or as a latin1 string in json
                     return {
-                        'mapImage': image_bytes.getvalue().decode('latin1')  # Encoding to pass binary data as a string
+                        'mapImage': await map_response.read()
                     }
                 else:
                     logging.error(f"Failed to get map with status code: {map_response.status}")
@@ -2,6 +2,7 @@ import requests
 import os
 import logging
 from jinja2 import Template
+from request_timing import RequestTiming
 
 class Mailing:
     domain = "applicantiq.org"
@@ -21,13 +22,14 @@ class Mailing:
         template = Template(html_template)
         return template.render(variables)
     def send_email(subject, body_text, receiver_email, sender_email=info_email_address):
-        response = requests.post(
-  		Mailing.mailgun_url,
-  		auth=("api", os.environ.get("MAILGUN_API_KEY")),
-  		data={"from": f"ApplicantIQ <{sender_email}>",
-  			"to": [receiver_email],
-  			"subject": subject,
-  			"text": body_text})
+        with RequestTiming.span(RequestTiming.HTTP):
+            response = requests.post(
+  		    Mailing.mailgun_url,
+  		    auth=("api", os.environ.get("MAILGUN_API_KEY")),
+  		    data={"from": f"ApplicantIQ <{sender_email}>",
+  			    "to": [receiver_email],
+  			    "subject": subject,
+  			    "text": body_text})
         logging.info("Sent request to send email")
         logging.info("Status Code:")
         logging.info(response.status_code)  # HTTP status code
@@ -36,13 +38,14 @@ class Mailing:
     def send_html_email(subject, body_html, receiver_email, sender_email=info_email_address, variables=None):
         if variables:
             body_html = Mailing.render_template(body_html, variables)
-        response = requests.post(
-  		Mailing.mailgun_url,
-  		auth=("api", os.environ.get("MAILGUN_API_KEY")),
-  		data={"from": f"ApplicantIQ <{sender_email}>",
-  			"to": [receiver_email],
-  			"subject": subject,
-  			"html": body_html})
+        with RequestTiming.span(RequestTiming.HTTP):
+            response = requests.post(
+  		    Mailing.mailgun_url,
+  		    auth=("api", os.environ.get("MAILGUN_API_KEY")),
+  		    data={"from": f"ApplicantIQ <{sender_email}>",
+  			    "to": [receiver_email],
+  			    "subject": subject,
+  			    "html": body_html})
         logging.info("Sent request to send email")
         logging.info("Status Code:")
         logging.info(response.status_code)  # HTTP status code
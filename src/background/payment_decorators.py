@@ -1,11 +1,12 @@
 from functools import wraps
 import os
-from typing import Callable, Tuple, Dict
+from typing import Callable, Tuple
 from user import User
 import logging
 from resume_table import ResumeTable
-from user_subscription import UserSubscription
+from resume_upload import ResumeUpload
 from user_subscription_table import UserSubscriptionTable
+from entitlement_cache import EntitlementCache, Entitlement
 from user_free_data_table import UserFreeDataTable
 from errors import NoFreeRatingsLeft
 from auth_logic import decode_user_from_token
@@ -39,6 +40,18 @@ class PaymentDecorators:
     @pro_subscription_required  # This is applied second
     @token_required             # This is applied first, but runs first
     '''
+    '''
+    __get_entitlement
+
+    reads the users entitlement through the cache, a valid subscription is only read once per period
+
+    args:
+        user_id: id of the user
+    returns:
+        Entitlement for the user
+    '''
+    def __get_entitlement(user_id: str) -> Entitlement:
+        return EntitlementCache.get_or_load(user_id, lambda: UserSubscriptionTable.read_subscription(user_id))
     #can edit logic more if needed once premium comes along
     def pro_subscription_required(f: Callable) -> Callable:
         @wraps(f)
@@ -46,8 +59,8 @@ class PaymentDecorators:
             if PaymentDecorators.REQUIRING_PAYMENT:
                 token: str = request.headers['Authorization']
                 user : User | None = decode_user_from_token(token)
-                user_subscription: UserSubscription = UserSubscriptionTable.read_subscription(user.user_id)
-                if not user_subscription or not user_subscription.valid():
+                entitlement: Entitlement = PaymentDecorators.__get_entitlement(user.user_id)
+                if not entitlement.subscription_valid:
                     return jsonify({'message': 'Pro Subscription required'}), 402
             return f(*args, **kwargs)
         return decorated
@@ -56,11 +69,14 @@ class PaymentDecorators:
         def decorated(*args, **kwargs) -> Tuple[Response, int]:
             if PaymentDecorators.REQUIRING_PAYMENT:
                 token: str = request.headers['Authorization']
-                req_json: Dict = request.get_json()
+                #binary uploads send their options as query args, don't parse the body here
+                replace: bool = request.get_json().get("replace", False) if request.is_json else ResumeUpload.parse_bool(request.args.get("replace"))
                 user : User | None = decode_user_from_token(token)
-                user_subscription: UserSubscription = UserSubscriptionTable.read_subscription(user.user_id)
-                if not user_subscription or not user_subscription.valid():
-                    if len(ResumeTable.read_user_resumes(user.user_id)) and not req_json.get("replace", False):
+                entitlement: Entitlement = PaymentDecorators.__get_entitlement(user.user_id)
+                if not entitlement.subscription_valid:
+                    if entitlement.resume_count is None:
+                        entitlement.resume_count = ResumeTable.count_user_resumes(user.user_id)
+                    if entitlement.resume_count and not replace:
                         return jsonify({'message': 'Pro Subscription required'}), 402
             return f(*args, **kwargs)
         return decorated
@@ -70,12 +86,16 @@ class PaymentDecorators:
             if PaymentDecorators.REQUIRING_PAYMENT:
                 token: str = request.headers['Authorization']
                 user : User | None = decode_user_from_token(token)
-                user_subscription: UserSubscription = UserSubscriptionTable.read_subscription(user.user_id)
-                if not user_subscription or not user_subscription.valid():
+                entitlement: Entitlement = PaymentDecorators.__get_entitlement(user.user_id)
+                if not entitlement.subscription_valid:
+                    #known to be out, skip trying to use one until the entry expires
+                    if entitlement.free_ratings_exhausted:
+                        return jsonify({'message': 'Pro Subscription required'}), 402
                     try:
-                        UserFreeDataTable.use_free_resume_rating(user.user_id)
+                        ratings_left: int = UserFreeDataTable.use_free_resume_rating(user.user_id)
+                        entitlement.free_ratings_exhausted = ratings_left == 0
                     except NoFreeRatingsLeft:
+                        entitlement.free_ratings_exhausted = True
                         return jsonify({'message': 'Pro Subscription required'}), 402
             return f(*args, **kwargs)
         return decorated
-    
\ No newline at end of file
@@ -0,0 +1,284 @@
+#(c) 2024 Daniel DeMoney. All rights reserved.
+from flask import Response, g, has_request_context, request
+from contextlib import contextmanager
+from pymongo import monitoring
+from typing import Dict, Iterator
+import copy
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+import logging
+
+class RequestTiming:
+    '''
+    RequestTiming
+
+    Times every request, and inside it the time spent waiting on MySQL, Mongo, outbound HTTP, LLM calls and
+    serializing the response.
+
+    Spans: code that waits on one of those wraps it in `with RequestTiming.span(RequestTiming.MYSQL):`, the time is
+    added to the requests total for that span, kept on flask.g like the requests connection. Outside a request it's
+    dropped. Spans that run at the same time (async http, executor threads) each count their own time, so a span
+    can add up to more than the request did. Every response lists its spans in a Server-Timing header, browser
+    devtools show it next to the request.
+
+    Histograms: each worker keeps a latency histogram per route, and per route and span, counted in buckets
+    BUCKET_GROWTH apart so a percentile is off by at most that much. Bucket counts add, so workers write theirs to
+    METRICS_DIR every FLUSH_SECONDS and /internal/metrics sums them for percentiles across workers. They count
+    from when the worker started.
+    '''
+    MYSQL: str = "mysql"
+    MONGO: str = "mongo"
+    HTTP: str = "http"
+    LLM: str = "llm"
+    SERIALIZE: str = "serialize"
+    COMPRESS: str = "compress"
+    TOTAL: str = "total"
+    PERCENTILES: tuple[float, ...] = (0.5, 0.95, 0.99)
+    #upper bound of bucket i is MIN_MS * BUCKET_GROWTH ** i, everything under MIN_MS is bucket 0
+    MIN_MS: float = 0.1
+    BUCKET_GROWTH: float = 1.1
+    FLUSH_SECONDS: float = float(os.environ.get("METRICS_FLUSH_SECONDS", 10))
+    METRICS_DIR: str = os.environ.get("METRICS_DIR", os.path.join(tempfile.gettempdir(), "jobrater_metrics"))
+    __histograms: Dict[str, Dict[str, Dict]] = {}
+    __lock: threading.Lock = threading.Lock()
+    __last_flush: float = 0
+    '''
+    span
+
+    times the block as part of the current request
+
+    args:
+        name: MYSQL, MONGO, HTTP, LLM, SERIALIZE or COMPRESS
+    '''
+    @contextmanager
+    def span(name: str) -> Iterator[None]:
+        st: float = time.perf_counter()
+        try:
+            yield
+        finally:
+            RequestTiming.add(name, time.perf_counter() - st)
+    '''
+    add
+
+    args:
+        name: span the time was spent in
+        seconds: time spent
+    '''
+    def add(name: str, seconds: float) -> None:
+        if not has_request_context():
+            return
+        spans: Dict[str, list[float]] | None = g.get("timing_spans")
+        if spans is None:
+            return
+        total: list[float] = spans.setdefault(name, [0.0, 0])
+        total[0] += seconds
+        total[1] += 1
+    '''
+    start
+
+    starts timing the request, for app.before_request
+    '''
+    def start() -> None:
+        g.timing_start = time.perf_counter()
+        g.timing_spans = {}
+    '''
+    finish
+
+    records the request and adds its Server-Timing header, for app.after_request. Register it before anything
+    else that changes the response so it runs last and counts it.
+
+    args:
+        response: the response
+    returns:
+        the response
+    '''
+    def finish(response: Response) -> Response:
+        timing: tuple[float, Dict[str, list[float]]] | None = RequestTiming.__pop_request()
+        if timing is None:
+            return response
+        total_seconds, spans = timing
+        server_timing: list[str] = [f'{name};dur={seconds * 1000:.1f};desc="{count} calls"' for name, (seconds, count) in spans.items()]
+        server_timing.append(f"{RequestTiming.TOTAL};dur={total_seconds * 1000:.1f}")
+        response.headers["Server-Timing"] = ", ".join(server_timing)
+        return response
+    '''
+    teardown
+
+    records requests that ended in an exception, after_request doesn't run for those. For app.teardown_request
+
+    args:
+        exc: exception the request ended with, if any
+    '''
+    def teardown(exc: BaseException | None = None) -> None:
+        RequestTiming.__pop_request()
+    def __pop_request() -> tuple[float, Dict[str, list[float]]] | None:
+        start: float | None = g.pop("timing_start", None)
+        if start is None:
+            return None
+        total_seconds: float = time.perf_counter() - start
+        spans: Dict[str, list[float]] = g.pop("timing_spans", {})
+        #unmatched urls share one entry so scanners can't grow the histograms without bound
+        route: str = f"{request.method} {request.url_rule.rule if request.url_rule else '<unmatched>'}"
+        RequestTiming.record(route, total_seconds, {name: seconds for name, (seconds, _) in spans.items()})
+        return total_seconds, spans
+    '''
+    record
+
+    args:
+        route: method and url rule of the request
+        total_seconds: how long the request took
+        span_seconds: span name to time spent in it during the request
+    '''
+    def record(route: str, total_seconds: float, span_seconds: Dict[str, float]) -> None:
+        with RequestTiming.__lock:
+            route_histograms: Dict[str, Dict] = RequestTiming.__histograms.setdefault(route, {})
+            RequestTiming.__add_to_histogram(route_histograms, RequestTiming.TOTAL, total_seconds * 1000)
+            for name, seconds in span_seconds.items():
+                RequestTiming.__add_to_histogram(route_histograms, name, seconds * 1000)
+        if time.monotonic() - RequestTiming.__last_flush > RequestTiming.FLUSH_SECONDS:
+            RequestTiming.flush()
+    def __add_to_histogram(route_histograms: Dict[str, Dict], name: str, ms: float) -> None:
+        histogram: Dict = route_histograms.setdefault(name, {"count": 0, "sumMs": 0.0, "maxMs": 0.0, "buckets": {}})
+        bucket: str = str(0 if ms <= RequestTiming.MIN_MS else math.ceil(math.log(ms / RequestTiming.MIN_MS, RequestTiming.BUCKET_GROWTH)))
+        histogram["count"] += 1
+        histogram["sumMs"] += ms
+        histogram["maxMs"] = max(histogram["maxMs"], ms)
+        histogram["buckets"][bucket] = histogram["buckets"].get(bucket, 0) + 1
+    '''
+    snapshot
+
+    returns:
+        copy of this workers histograms, route to span name (or TOTAL) to histogram
+    '''
+    def snapshot() -> Dict[str, Dict[str, Dict]]:
+        with RequestTiming.__lock:
+            return copy.deepcopy(RequestTiming.__histograms)
+    '''
+    flush
+
+    writes this workers histograms to METRICS_DIR for the other workers to read
+    '''
+    def flush() -> None:
+        RequestTiming.__last_flush = time.monotonic()
+        path: str = os.path.join(RequestTiming.METRICS_DIR, f"{os.getpid()}.json")
+        try:
+            os.makedirs(RequestTiming.METRICS_DIR, exist_ok=True)
+            with open(path + ".tmp", "w") as f:
+                json.dump(RequestTiming.snapshot(), f)
+            #readers never see a half written file
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            logging.error(f"COULDN'T WRITE REQUEST METRICS TO {path}: {e}")
+    '''
+    read_workers
+
+    returns:
+        pid to histograms of every live worker that has flushed, this worker's read live
+    '''
+    def read_workers() -> Dict[int, Dict[str, Dict[str, Dict]]]:
+        workers: Dict[int, Dict[str, Dict[str, Dict]]] = {}
+        try:
+            file_names: list[str] = os.listdir(RequestTiming.METRICS_DIR)
+        except FileNotFoundError:
+            file_names = []
+        for file_name in file_names:
+            if not file_name.endswith(".json") or not file_name[:-len(".json")].isdigit():
+                continue
+            pid: int = int(file_name[:-len(".json")])
+            path: str = os.path.join(RequestTiming.METRICS_DIR, file_name)
+            if pid != os.getpid() and not RequestTiming.__is_alive(pid):
+                #gunicorn replaced the worker, its requests go with it
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            try:
+                with open(path) as f:
+                    workers[pid] = json.load(f)
+            except (OSError, ValueError) as e:
+                logging.error(f"COULDN'T READ REQUEST METRICS {path}: {e}")
+        workers[os.getpid()] = RequestTiming.snapshot()
+        return workers
+    def __is_alive(pid: int) -> bool:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+    '''
+    merge
+
+    args:
+        workers: histograms of each worker
+    returns:
+        histograms with every workers counts added together
+    '''
+    def merge(workers: list[Dict[str, Dict[str, Dict]]]) -> Dict[str, Dict[str, Dict]]:
+        merged: Dict[str, Dict[str, Dict]] = {}
+        for histograms in workers:
+            for route, route_histograms in histograms.items():
+                for name, histogram in route_histograms.items():
+                    total: Dict = merged.setdefault(route, {}).setdefault(name, {"count": 0, "sumMs": 0.0, "maxMs": 0.0, "buckets": {}})
+                    total["count"] += histogram["count"]
+                    total["sumMs"] += histogram["sumMs"]
+                    total["maxMs"] = max(total["maxMs"], histogram["maxMs"])
+                    for bucket, count in histogram["buckets"].items():
+                        total["buckets"][bucket] = total["buckets"].get(bucket, 0) + count
+        return merged
+    '''
+    percentile
+
+    args:
+        histogram: a histogram
+        fraction: 0.5 for p50, 0.99 for p99
+    returns:
+        upper bound in ms of the bucket the percentile falls in, no more than the slowest request
+    '''
+    def percentile(histogram: Dict, fraction: float) -> float:
+        rank: int = max(1, math.ceil(histogram["count"] * fraction))
+        seen: int = 0
+        for bucket in sorted(histogram["buckets"], key=int):
+            seen += histogram["buckets"][bucket]
+            if seen >= rank:
+                return min(RequestTiming.MIN_MS * RequestTiming.BUCKET_GROWTH ** int(bucket), histogram["maxMs"])
+        return histogram["maxMs"]
+    '''
+    summarize
+
+    args:
+        histograms: route to span name to histogram
+    returns:
+        route to span name to count, mean, p50, p95, p99 and max in ms, slowest routes by p99 first
+    '''
+    def summarize(histograms: Dict[str, Dict[str, Dict]]) -> Dict[str, Dict[str, Dict[str, float]]]:
+        summary: Dict[str, Dict[str, Dict[str, float]]] = {}
+        for route, route_histograms in histograms.items():
+            summary[route] = {}
+            for name, histogram in route_histograms.items():
+                stats: Dict[str, float] = {"count": histogram["count"], "meanMs": round(histogram["sumMs"] / histogram["count"], 1)}
+                for fraction in RequestTiming.PERCENTILES:
+                    stats[f"p{round(fraction * 100)}Ms"] = round(RequestTiming.percentile(histogram, fraction), 1)
+                stats["maxMs"] = round(histogram["maxMs"], 1)
+                summary[route][name] = stats
+        return dict(sorted(summary.items(), key=lambda item: item[1][RequestTiming.TOTAL]["p99Ms"] if RequestTiming.TOTAL in item[1] else 0, reverse=True))
+
+class MongoCommandTiming(monitoring.CommandListener):
+    '''
+    MongoCommandTiming
+
+    pymongo listener adding every commands time to the current requests mongo span, pass it to MongoClient's
+    event_listeners. pymongo calls it on the thread that ran the command, so it sees the request
+    '''
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        pass
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        RequestTiming.add(RequestTiming.MONGO, event.duration_micros / 1e6)
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        RequestTiming.add(RequestTiming.MONGO, event.duration_micros / 1e6)
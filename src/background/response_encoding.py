@@ -0,0 +1,124 @@
+#(c) 2024 Daniel DeMoney. All rights reserved.
+from flask import Response, request
+from json_writer import JsonWriter
+from request_timing import RequestTiming
+from typing import Any
+import brotli
+import gzip
+import msgpack
+import os
+import logging
+
+class ResponseEncoding:
+    '''
+    ResponseEncoding
+
+    How response bodies go over the wire.
+
+    Body format: routes that send a lot (user data, comparisons, relocation data) build their response with
+    make_response, which sends MessagePack to clients whose Accept asks for it and JSON to everyone else. Binary
+    values (map images) are raw bytes in MessagePack, in JSON they stay latin1 strings like clients have always read.
+    Bodies can hold models (a Job, a User...) as they are, JsonWriter encodes them as it reaches them.
+
+    Content encoding: compress runs after every request, and brotli or gzip compresses bodies over MIN_BYTES when
+    Accept-Encoding allows it. Quality is kept where it's cheap for dynamic responses, and bodies over LARGE_BYTES
+    drop to a faster level so one huge response can't hold a worker.
+    '''
+    MSGPACK_MIMETYPE: str = "application/msgpack"
+    MSGPACK_MIMETYPES: tuple[str, ...] = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+    COMPRESSIBLE_MIMETYPES: tuple[str, ...] = ("application/json", "application/msgpack", "application/javascript", "image/svg+xml")
+    MIN_BYTES: int = int(os.environ.get("RESPONSE_COMPRESSION_MIN_BYTES", 1024))
+    LARGE_BYTES: int = int(os.environ.get("RESPONSE_COMPRESSION_LARGE_BYTES", 1024 * 1024))
+    BROTLI_QUALITY: int = int(os.environ.get("RESPONSE_BROTLI_QUALITY", 5))
+    BROTLI_LARGE_QUALITY: int = int(os.environ.get("RESPONSE_BROTLI_LARGE_QUALITY", 3))
+    GZIP_LEVEL: int = int(os.environ.get("RESPONSE_GZIP_LEVEL", 6))
+    GZIP_LARGE_LEVEL: int = int(os.environ.get("RESPONSE_GZIP_LARGE_LEVEL", 3))
+    '''
+    dumps
+
+    args:
+        obj: body to send, models are encoded with their to_json
+    returns:
+        the body as JSON
+    '''
+    def dumps(obj: Any) -> str:
+        return JsonWriter.dumps(obj)
+    '''
+    wants_msgpack
+
+    returns:
+        True if the client of this request prefers MessagePack over JSON
+    '''
+    def wants_msgpack() -> bool:
+        #json is listed first so */* (what fetch sends by default) and ties stay json
+        return request.accept_mimetypes.best_match(["application/json", *ResponseEncoding.MSGPACK_MIMETYPES]) in ResponseEncoding.MSGPACK_MIMETYPES
+    '''
+    make_response
+
+    args:
+        obj: body to send
+        status: status code
+    returns:
+        response with the body as MessagePack or JSON, whichever the requests Accept prefers
+    '''
+    def make_response(obj: Any, status: int = 200) -> Response:
+        with RequestTiming.span(RequestTiming.SERIALIZE):
+            if ResponseEncoding.wants_msgpack():
+                response: Response = Response(msgpack.packb(obj, use_bin_type=True, default=JsonWriter.default), status=status, mimetype=ResponseEncoding.MSGPACK_MIMETYPE)
+            else:
+                response = Response(ResponseEncoding.dumps(obj), status=status, mimetype="application/json")
+        response.vary.add("Accept")
+        return response
+    '''
+    choose_encoding
+
+    returns:
+        "br", "gzip" or None, whichever the client of this request accepts that we'd rather send
+    '''
+    def choose_encoding() -> str | None:
+        accept_encodings = request.accept_encodings
+        if accept_encodings.quality("br") > 0:
+            return "br"
+        if accept_encodings.quality("gzip") > 0:
+            return "gzip"
+        return None
+    '''
+    compress
+
+    compresses a finished response if it's worth it, for app.after_request
+
+    args:
+        response: the response
+    returns:
+        the response, compressed in place when it was
+    '''
+    def compress(response: Response) -> Response:
+        mimetype: str = response.mimetype or ""
+        if mimetype not in ResponseEncoding.COMPRESSIBLE_MIMETYPES and not mimetype.startswith("text/"):
+            return response
+        response.vary.add("Accept-Encoding")
+        #files and streams aren't buffered, and a 206 has to stay byte for byte what was asked for
+        if response.direct_passthrough or response.is_streamed or response.status_code != 200 or "Content-Encoding" in response.headers:
+            return response
+        encoding: str | None = ResponseEncoding.choose_encoding()
+        if encoding is None:
+            return response
+        body: bytes = response.get_data()
+        if len(body) < ResponseEncoding.MIN_BYTES:
+            return response
+        large: bool = len(body) > ResponseEncoding.LARGE_BYTES
+        with RequestTiming.span(RequestTiming.COMPRESS):
+            if encoding == "br":
+                compressed: bytes = brotli.compress(body, quality=ResponseEncoding.BROTLI_LARGE_QUALITY if large else ResponseEncoding.BROTLI_QUALITY)
+            else:
+                compressed = gzip.compress(body, compresslevel=ResponseEncoding.GZIP_LARGE_LEVEL if large else ResponseEncoding.GZIP_LEVEL, mtime=0)
+        if len(compressed) >= len(body):
+            return response
+        response.set_data(compressed)
+        response.headers["Content-Encoding"] = encoding
+        #the compressed bytes differ from what a strong etag promised
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        logging.debug(f"COMPRESSED {len(body)} BYTES TO {len(compressed)} WITH {encoding.upper()}")
+        return response
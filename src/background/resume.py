@@ -3,9 +3,10 @@ from datetime import datetime
 from typing import Dict
 from mysql.connector.types import RowItemType
 import zlib
-from tika import parser
-import uuid
-import os
+import hashlib
+from text_extraction import TextExtraction
+from blob_store import BlobStore
+from compression_codec import CompressionCodec
 import json
 import logging
 import doc2pdf
@@ -21,61 +22,130 @@ class Resume:
     file_name: name of the uploaded resume file
     file_type: type of file uploaded (extension, .docx for word)
     file_content: bytes, content of the resume (not a readable str)
-    file_text: str, readable text of the resume
+    file_text: str, readable text of the resume, extracted from file_content on first use if not passed
     upload_date: datetime of the upload
+    content_hash: sha256 of the file as the user uploaded it, computed on first use if not passed
+    file_hash: key of the stored file in the BlobStore, None until it's stored (or for rows still holding FileContent)
+
+    rows from the db hand over FileContent and FileText still compressed, they're decompressed the first time
+    file_content and file_text are read
     '''
-    def __init__(self, id: int, user_id: str, file_name: str, file_type: str, file_content: bytes, upload_date: datetime, file_text=None, name=None, isDefault=False) -> None:
+    def __init__(self, id: int, user_id: str, file_name: str, file_type: str, file_content: bytes, upload_date: datetime, file_text=None, name=None, isDefault=False, content_hash=None, file_hash=None,
+                 compressed_file_content=None, compressed_file_text=None) -> None:
         self.id = id
         self.name = name
         self.user_id = user_id
         self.file_name = file_name
         self.file_type = file_type
-        self.file_content = file_content
+        self.__file_content: bytes = file_content
+        self.__compressed_file_content: bytes | None = compressed_file_content
+        #docx uploads are stored as pdfs, converted the first time file_content is needed
+        self.__docx_content: bytes | None = None
         self.isDefault = isDefault
-        if file_text:
-            self.file_text = file_text
+        self.content_hash: str | None = content_hash
+        self.file_hash: str | None = file_hash
+        self.__file_text: str | None = file_text
+        self.__compressed_file_text: bytes | None = compressed_file_text
         if self.file_type == "docx":
-            self.convert_docx_to_pdf()
+            self.__docx_content = file_content
+            #hash what was uploaded, the converted pdf isn't byte for byte the same between conversions
+            self.content_hash = content_hash or hashlib.sha256(file_content).hexdigest()
             self.file_type = "pdf"
-        result = parser.from_buffer(self.file_content)
-        self.file_text = result["content"]
         self.upload_date = upload_date
-    def convert_docx_to_pdf(self) -> None:
-        """Converts the DOCX file_content to PDF and assigns it back to self.file_content."""
-        # Create a unique identifier for this file
-        unique_id = str(uuid.uuid4())
+    '''
+    file_content
 
-        # Define the temp directory and file paths
-        temp_dir = os.path.join(os.getcwd(), "src", "background", "temp")
-        os.makedirs(temp_dir, exist_ok=True)
-        temp_docx_path = os.path.join(temp_dir, f"resume_{unique_id}.docx")
+    bytes of the resume, always a pdf once a docx has been converted. Converts on first access so
+    ResumeTable.add_resume can hand back an already converted copy of the same upload instead, and reads
+    stored resumes from the BlobStore on first access
+    '''
+    @property
+    def file_content(self) -> bytes | None:
+        if self.__docx_content is not None:
+            self.convert_docx_to_pdf()
+        elif self.__compressed_file_content is not None:
+            self.__file_content = zlib.decompress(self.__compressed_file_content)
+            self.__compressed_file_content = None
+        elif self.__file_content is None and self.file_hash is not None:
+            self.__file_content = BlobStore.get(self.file_hash)
+        return self.__file_content
+    @file_content.setter
+    def file_content(self, file_content: bytes) -> None:
+        self.__file_content = file_content
+        self.__compressed_file_content = None
+        self.__docx_content = None
+    '''
+    needs_conversion
 
-        try:
-            # Write the DOCX bytes to the temp DOCX file
-            with open(temp_docx_path, "wb") as f:
-                f.write(self.file_content)
+    returns:
+        True if this is a docx upload that hasn't been converted to a pdf yet
+    '''
+    def needs_conversion(self) -> bool:
+        return self.__docx_content is not None
+    '''
+    use_stored_file
 
-            # Convert the DOCX to PDF using docx2pdf
-            temp_pdf_path = doc2pdf.convert_to(temp_dir, temp_docx_path)
+    points the resume at a file already in the BlobStore, dropping whatever upload it was holding
+
+    args:
+        file_hash: key of the blob
+    '''
+    def use_stored_file(self, file_hash: str) -> None:
+        self.file_hash = file_hash
+        self.__file_content = None
+        self.__compressed_file_content = None
+        self.__docx_content = None
+    '''
+    file_text
+
+    text of the resume. Rows from the db always carry it, so extraction only runs for a new upload whose text
+    we haven't seen before (ResumeTable.add_resume reuses text stored under the same content hash)
+    '''
+    @property
+    def file_text(self) -> str | None:
+        if self.__compressed_file_text is not None:
+            self.__file_text = Resume.decompress(self.__compressed_file_text)
+            self.__compressed_file_text = None
+        if self.__file_text is None and self.file_content:
+            logging.info("EXTRACTING RESUME TEXT")
+            self.__file_text = TextExtraction.extract_text(self.file_content)
+        return self.__file_text
+    @file_text.setter
+    def file_text(self, file_text: str | None) -> None:
+        self.__file_text = file_text
+        self.__compressed_file_text = None
+    '''
+    has_file_text
+
+    returns:
+        True if the text is already known, checking file_text would extract it
+    '''
+    def has_file_text(self) -> bool:
+        return self.__file_text is not None or self.__compressed_file_text is not None
+    '''
+    get_content_hash
 
-            # Read the PDF file into bytes and assign it to self.file_content
-            with open(temp_pdf_path, "rb") as f:
-                self.file_content = f.read()
+    returns:
+        sha256 hex digest of the uploaded file
+    '''
+    def get_content_hash(self) -> str:
+        if self.content_hash is None:
+            self.content_hash = hashlib.sha256(self.file_content).hexdigest()
+        return self.content_hash
+    def convert_docx_to_pdf(self) -> None:
+        """Converts the pending DOCX upload to PDF and assigns it to self.file_content."""
+        try:
+            self.file_content = doc2pdf.convert_bytes(self.__docx_content)
         except Exception as e:
             logging.critical(f"FAILED TO CONVERT DOCX RESUME TO PDF: {e}")
             raise  # Re-raise the exception for further handling if needed
-        finally:
-            # Clean up temporary files
-            if os.path.exists(temp_docx_path):
-                os.remove(temp_docx_path)
-            if os.path.exists(temp_pdf_path):
-                os.remove(temp_pdf_path)
     '''
     compress
 
     quick alogirithm for str to bytes compression, used for the text of the resume
 
-    We just use the zlib base compress decompress algos for the resume content, (raw bytes of file)
+    Goes through CompressionCodec (zstd, with the resume_text dictionary once one is trained). The raw bytes of
+    files from before the BlobStore are plain zlib
 
     resume_str: text of resume
 
@@ -84,13 +154,12 @@ class Resume:
     bytes: compressed text of resume
     '''
     def compress(resume_str: str) -> bytes:
-        resume_bytes: bytes = resume_str.encode("utf-8")
-        compressed_resume: bytes = zlib.compress(resume_bytes)
-        return compressed_resume
+        return CompressionCodec.compress_text(resume_str, CompressionCodec.RESUME_TEXT)
     '''
     decompress
 
-    reverse alogirthm for the above function to decompress our compressed resume text.
+    reverse alogirthm for the above function to decompress our compressed resume text, also reads text stored as
+    zlib before CompressionCodec.
 
     compressed_resume: the compressed version of the resumes text
 
@@ -99,9 +168,7 @@ class Resume:
     uncompressed resume
     '''
     def decompress(compressed_resume: bytes) -> str:
-        decompressed_bytes: bytes = zlib.decompress(compressed_resume)
-        decompressed_resume: str = decompressed_bytes.decode("utf-8")
-        return decompressed_resume
+        return CompressionCodec.decompress_text(compressed_resume)
     '''
     create_with_sql_row
 
@@ -121,11 +188,15 @@ class Resume:
         name: str | None = sql_query_row["Name"]
         file_name: str = sql_query_row["FileName"]
         file_type: str = sql_query_row["FileType"]
-        file_content: bytes = zlib.decompress(sql_query_row["FileContent"])
-        file_text: str = Resume.decompress(sql_query_row["FileText"])
+        #metadata reads leave the file columns out, rows moved to the BlobStore have no FileContent
+        compressed_file_content: bytes | None = sql_query_row.get("FileContent")
+        compressed_file_text: bytes | None = sql_query_row.get("FileText")
         upload_date: datetime = sql_query_row["UploadDate"]
         isDefault: bool = sql_query_row["IsDefault"]
-        return cls(id, user_id, file_name, file_type, file_content, upload_date, file_text=file_text, name=name, isDefault=isDefault)
+        content_hash: str | None = sql_query_row.get("ContentHash")
+        file_hash: str | None = sql_query_row.get("FileHash")
+        return cls(id, user_id, file_name, file_type, None, upload_date, name=name, isDefault=isDefault, content_hash=content_hash, file_hash=file_hash,
+                   compressed_file_content=compressed_file_content, compressed_file_text=compressed_file_text)
     '''
     create_with_json
 
@@ -177,9 +248,30 @@ class Resume:
             "isDefault": self.isDefault
         }
     '''
+    to_metadata_json
+
+    dumps a resume to json without the file or its text, for listings. The file itself comes from
+    /databases/resume_file, contentHash is its ETag
+
+    returns:
+
+    json
+    '''
+    def to_metadata_json(self) -> Dict:
+        return {
+            "id": self.id,
+            "userId": self.user_id,
+            "name": self.name,
+            "fileName": self.file_name,
+            "fileType": self.file_type,
+            "uploadDate": int(self.upload_date.timestamp()) if self.upload_date else None,
+            "isDefault": self.isDefault,
+            "contentHash": self.content_hash
+        }
+    '''
     to_sql_friendly_json
 
-    dumps a resume to json to be added to db, compresses necessary data
+    dumps a resume to json to be added to db, compresses necessary data. The file itself goes to the BlobStore first
 
     returns:
 
@@ -192,8 +284,9 @@ class Resume:
             "name": self.name,
             "fileName": self.file_name,
             "fileType": self.file_type,
-            "fileContent": zlib.compress(self.file_content),
+            "fileHash": self.file_hash,
             "fileText": Resume.compress(self.file_text),
-            "isDefault": self.isDefault
+            "isDefault": self.isDefault,
+            "contentHash": self.get_content_hash()
         }
     
\ No newline at end of file
@@ -0,0 +1,71 @@
+#(c) 2024 Daniel DeMoney. All rights reserved.
+from blob_store import BlobStore
+from resume_table import ResumeTable
+import sys
+import time
+import zlib
+import logging
+
+'''
+Moves resume files out of the Resumes.FileContent column into the BlobStore, and clears out blobs no resume
+points to anymore. Safe to rerun, and safe to run while serving since reads fall back to FileContent until a
+row is moved.
+
+python resume_blob_migration.py migrate [batch size]
+python resume_blob_migration.py gc [min age in seconds]
+'''
+'''
+migrate
+
+args:
+    batch_size: rows read per round trip
+returns:
+    number of resumes moved
+'''
+def migrate(batch_size: int) -> int:
+    moved: int = 0
+    while True:
+        rows = ResumeTable.read_legacy_files(batch_size)
+        if not rows:
+            break
+        for row in rows:
+            #blob first, the row only points at it once it exists
+            file_hash: str = BlobStore.put(zlib.decompress(row["FileContent"]))
+            ResumeTable.move_file_to_blob_store(row["Id"], file_hash)
+            moved += 1
+        logging.info(f"MOVED {moved} RESUME FILES TO THE BLOB STORE")
+    return moved
+'''
+gc
+
+deletes blobs no resume points to
+
+args:
+    min_age_seconds: only delete blobs stored longer ago than this, an upload stores its blob a moment before
+        its row is committed
+returns:
+    number of blobs deleted
+'''
+def gc(min_age_seconds: float) -> int:
+    cutoff: float = time.time() - min_age_seconds
+    #list blobs before reading the hashes so a resume added in between is never missed
+    candidates: list[str] = [blob_hash for blob_hash, stored_at in BlobStore.list_blobs() if stored_at < cutoff]
+    referenced: set[str] = ResumeTable.read_file_hashes()
+    deleted: int = 0
+    for blob_hash in candidates:
+        if blob_hash not in referenced:
+            BlobStore.delete(blob_hash)
+            deleted += 1
+    logging.info(f"DELETED {deleted} UNREFERENCED RESUME BLOBS")
+    return deleted
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    command: str = sys.argv[1] if len(sys.argv) > 1 else "migrate"
+    if command == "migrate":
+        migrate(int(sys.argv[2]) if len(sys.argv) > 2 else 100)
+    elif command == "gc":
+        gc(float(sys.argv[2]) if len(sys.argv) > 2 else 24 * 60 * 60)
+    else:
+        print("usage: python resume_blob_migration.py migrate [batch size] | gc [min age in seconds]")
+        sys.exit(1)
@@ -1,60 +1,171 @@
 #(c) 2024 Daniel DeMoney. All rights reserved.
 import json
-from pymongo import MongoClient
-from pymongo.results import InsertOneResult, InsertManyResult
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import DuplicateKeyError
+from pymongo.results import BulkWriteResult
 from database_functions import DatabaseFunctions
+from job_match_score_table import JobMatchScoreTable
 from job import Job
 from typing import Dict
 from uuid import UUID
+import os
+import logging
 
 class ResumeComparisonCollection:
+    '''
+    ResumeComparisonCollection
+
+    One comparison per (userId, jobId, resumeId), rerunning a comparison replaces the old one. Comparisons carry the
+    descriptionHash of the job description they were run against, so a repost of a job can reuse the comparison
+    instead of paying for the llm again (read_comparison_for_description). Every write stamps
+    updatedAt, if RESUME_COMPARISON_TTL_DAYS is set mongo expires comparisons that haven't been rerun in that long.
+    ensure_indexes has to run before the first write so every query below is an index lookup
+    '''
     COLLECTION_NAME = "ResumeComparisons"
-    def add_resume_comparison(resumeComparisonDict: Dict) -> InsertOneResult:
-        with MongoClient(DatabaseFunctions.MONGODB_URL) as client:
-            db = client[DatabaseFunctions.MONGODB_DB_NAME]
-            collection = db[ResumeComparisonCollection.COLLECTION_NAME]
-            result: InsertOneResult = collection.insert_one(resumeComparisonDict)
-        return result.inserted_id is not None
-    def add_resume_comparisons(resumeComparisonDicts: list[Dict]) -> InsertManyResult:
-        with MongoClient(DatabaseFunctions.MONGODB_URL) as client:
-            db = client[DatabaseFunctions.MONGODB_DB_NAME]
-            collection = db[ResumeComparisonCollection.COLLECTION_NAME]
-            results: InsertManyResult = collection.insert_many(resumeComparisonDicts)
+    TTL_DAYS: float | None = float(os.environ["RESUME_COMPARISON_TTL_DAYS"]) if os.environ.get("RESUME_COMPARISON_TTL_DAYS") else None
+    #written by us on every upsert, not part of the comparison clients see
+    __READ_PROJECTION: Dict = {"updatedAt": 0}
+    __TTL_INDEX_NAME: str = "updatedAt_ttl"
+    '''
+    ensure_indexes
+
+    creates an index for every query shape this collection uses, safe to call from every worker on startup:
+        (userId, jobId, resumeId) unique: the upsert key, its prefixes cover reads and deletes by user and by user + job
+        (jobId, resumeId, updatedAt): read_specific_resume_comparison
+        (userId, resumeId, descriptionHash): read_comparison_for_description
+        updatedAt TTL: only if TTL_DAYS is set, dropped again if it gets unset
+
+    args:
+        remove_duplicates: delete all but the newest comparison for each key first, needed once for comparisons
+            inserted before we upserted, otherwise the unique index can't be built
+    '''
+    def ensure_indexes(remove_duplicates: bool = False) -> None:
+        collection = DatabaseFunctions.get_mongo_db()[ResumeComparisonCollection.COLLECTION_NAME]
+        if remove_duplicates:
+            ResumeComparisonCollection.__remove_duplicate_comparisons(collection)
+        try:
+            collection.create_index([("userId", ASCENDING), ("jobId", ASCENDING), ("resumeId", ASCENDING)], unique=True)
+        except DuplicateKeyError:
+            logging.error("RESUME COMPARISONS HAVE DUPLICATES, RUN python resume_comparison_collection.py TO REMOVE THEM AND BUILD THE UNIQUE INDEX")
+        collection.create_index([("jobId", ASCENDING), ("resumeId", ASCENDING), ("updatedAt", DESCENDING)])
+        collection.create_index([("userId", ASCENDING), ("resumeId", ASCENDING), ("descriptionHash", ASCENDING)])
+        ResumeComparisonCollection.__ensure_ttl_index(collection)
+    def __ensure_ttl_index(collection) -> None:
+        existing: Dict | None = collection.index_information().get(ResumeComparisonCollection.__TTL_INDEX_NAME)
+        if ResumeComparisonCollection.TTL_DAYS is None:
+            if existing:
+                logging.info("RESUME COMPARISON TTL UNSET, DROPPING TTL INDEX")
+                collection.drop_index(ResumeComparisonCollection.__TTL_INDEX_NAME)
+            return
+        expire_after_seconds: int = int(ResumeComparisonCollection.TTL_DAYS * 24 * 60 * 60)
+        if existing is None:
+            #comparisons from before we stamped updatedAt would never expire
+            collection.update_many({"updatedAt": {"$exists": False}}, {"$currentDate": {"updatedAt": True}})
+            collection.create_index([("updatedAt", ASCENDING)], name=ResumeComparisonCollection.__TTL_INDEX_NAME, expireAfterSeconds=expire_after_seconds)
+        elif existing.get("expireAfterSeconds") != expire_after_seconds:
+            logging.info(f"CHANGING RESUME COMPARISON TTL TO {expire_after_seconds} SECONDS")
+            collection.database.command("collMod", collection.name, index={"name": ResumeComparisonCollection.__TTL_INDEX_NAME, "expireAfterSeconds": expire_after_seconds})
+    def __remove_duplicate_comparisons(collection) -> int:
+        pipeline = [
+            {"$sort": {"_id": -1}},
+            {"$group": {"_id": {"userId": "$userId", "jobId": "$jobId", "resumeId": "$resumeId"}, "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+            {"$match": {"count": {"$gt": 1}}}
+        ]
+        removed: int = 0
+        for duplicates in collection.aggregate(pipeline, allowDiskUse=True):
+            #ObjectIds grow with insert time, keep the first (newest)
+            removed += collection.delete_many({"_id": {"$in": duplicates["ids"][1:]}}).deleted_count
+        logging.info(f"REMOVED {removed} DUPLICATE RESUME COMPARISONS")
+        return removed
+    def __upsert_operation(resumeComparisonDict: Dict) -> UpdateOne:
+        return UpdateOne(
+            ResumeComparisonCollection.__key(resumeComparisonDict),
+            {"$set": {key: value for key, value in resumeComparisonDict.items() if key != "_id"}, "$currentDate": {"updatedAt": True}},
+            upsert=True
+        )
+    def __key(resumeComparisonDict: Dict) -> Dict:
+        return {"userId": str(resumeComparisonDict["userId"]), "jobId": resumeComparisonDict["jobId"], "resumeId": str(resumeComparisonDict["resumeId"])}
+    '''
+    __refresh_best_scores
+
+    a rerun can lower a resumes score so the best for each touched (user, job) is reread from mongo instead of
+    just keeping the max
+    '''
+    def __refresh_best_scores(resumeComparisonDicts: list[Dict]) -> None:
+        user_ids: set[str] = {str(resume_comparison["userId"]) for resume_comparison in resumeComparisonDicts}
+        job_ids: set[str] = {resume_comparison["jobId"] for resume_comparison in resumeComparisonDicts}
+        JobMatchScoreTable.set_match_scores(ResumeComparisonCollection.read_best_match_scores(list(user_ids), list(job_ids)))
+    '''
+    add_resume_comparison
+
+    adds a comparison, replacing the last comparison of the same resume against the same job
+
+    args:
+        resumeComparisonDict: comparison with userId, jobId and resumeId, not modified
+    returns:
+        True if written
+    '''
+    def add_resume_comparison(resumeComparisonDict: Dict) -> bool:
+        collection = DatabaseFunctions.get_mongo_db()[ResumeComparisonCollection.COLLECTION_NAME]
+        result: BulkWriteResult = collection.bulk_write([ResumeComparisonCollection.__upsert_operation(resumeComparisonDict)])
+        ResumeComparisonCollection.__refresh_best_scores([resumeComparisonDict])
+        return result.upserted_count + result.matched_count == 1
+    '''
+    add_resume_comparisons
+
+    adds comparisons in one round trip, replacing older comparisons of the same resume against the same job
+
+    args:
+        resumeComparisonDicts: comparisons with userId, jobId and resumeId, not modified
+    returns:
+        pymongo BulkWriteResult
+    '''
+    def add_resume_comparisons(resumeComparisonDicts: list[Dict]) -> BulkWriteResult:
+        collection = DatabaseFunctions.get_mongo_db()[ResumeComparisonCollection.COLLECTION_NAME]
+        results: BulkWriteResult = collection.bulk_write([ResumeComparisonCollection.__upsert_operation(resume_comparison) for resume_comparison in resumeComparisonDicts], ordered=False)
+        ResumeComparisonCollection.__refresh_best_scores(resumeComparisonDicts)
         return results
     def read_user_resume_comparisons(userId: str | UUID) -> list[Dict]:
-        with MongoClient(DatabaseFunctions.MONGODB_URL) as client:
-            db = client[DatabaseFunctions.MONGODB_DB_NAME]
-            collection = db[ResumeComparisonCollection.COLLECTION_NAME]
-            query = {"userId": str(userId)}
-            results: list[Dict] = list(collection.find(query))
+        collection = DatabaseFunctions.get_mongo_db()[ResumeComparisonCollection.COLLECTION_NAME]
+        query = {"userId": str(userId)}
+        results: list[Dict] = list(collection.find(query, ResumeComparisonCollection.__READ_PROJECTION))
         return results
     def read_job_resume_comparisons(jobId: str, userId: str) -> list[Dict]:
-        with MongoClient(DatabaseFunctions.MONGODB_URL) as client:
-            db = client[DatabaseFunctions.MONGODB_DB_NAME]
-            collection = db[ResumeComparisonCollection.COLLECTION_NAME]
-            query = {"jobId": jobId, "userId": str(userId)}
-            results = list(collection.find(query))
+        collection = DatabaseFunctions.get_mongo_db()[ResumeComparisonCollection.COLLECTION_NAME]
+        query = {"jobId": jobId, "userId": str(userId)}
+        results = list(collection.find(query, ResumeComparisonCollection.__READ_PROJECTION))
         return results
     def read_specific_resume_comparison(jobId: str, resumeId: str) -> Dict:
-        with MongoClient(DatabaseFunctions.MONGODB_URL) as client:
-            db = client[DatabaseFunctions.MONGODB_DB_NAME]
-            collection = db[ResumeComparisonCollection.COLLECTION_NAME]
-            query = {"jobId": jobId, "resumeId": str(resumeId)}
-            result = collection.find_one(query)
+        collection = DatabaseFunctions.get_mongo_db()[ResumeComparisonCollection.COLLECTION_NAME]
+        query = {"jobId": jobId, "resumeId": str(resumeId)}
+        #newest first in case duplicates from before the unique index are still around
+        result = collection.find_one(query, ResumeComparisonCollection.__READ_PROJECTION, sort=[("updatedAt", DESCENDING)])
         return result
+    '''
+    read_comparison_for_description
+
+    args:
+        userId: id of the user
+        resumeId: id of the resume
+        descriptionHash: JobDescriptionTable key of the job description
+    returns:
+        the newest comparison of this resume against the same description under any job id, None if there is none
+    '''
+    def read_comparison_for_description(userId: str | UUID, resumeId: str, descriptionHash: str) -> Dict | None:
+        collection = DatabaseFunctions.get_mongo_db()[ResumeComparisonCollection.COLLECTION_NAME]
+        query = {"userId": str(userId), "resumeId": str(resumeId), "descriptionHash": descriptionHash}
+        return collection.find_one(query, {"_id": 0, "updatedAt": 0}, sort=[("updatedAt", DESCENDING)])
     def delete_job_resume_comparisons(jobId: str, userId: str):
-        with MongoClient(DatabaseFunctions.MONGODB_URL) as client:
-            db = client[DatabaseFunctions.MONGODB_DB_NAME]
-            collection = db[ResumeComparisonCollection.COLLECTION_NAME]
-            query = {"jobId": jobId, "userId": str(userId)}
-            results_len: int = collection.delete_many(query)
+        collection = DatabaseFunctions.get_mongo_db()[ResumeComparisonCollection.COLLECTION_NAME]
+        query = {"jobId": jobId, "userId": str(userId)}
+        results_len: int = collection.delete_many(query)
+        JobMatchScoreTable.delete_match_score(userId, jobId)
         return results_len
     def delete_user_resume_comparisons(userId: str | UUID):
-        with MongoClient(DatabaseFunctions.MONGODB_URL) as client:
-            db = client[DatabaseFunctions.MONGODB_DB_NAME]
-            collection = db[ResumeComparisonCollection.COLLECTION_NAME]
-            query = {"userId": userId}
-            results_len: int = collection.delete_many(query)
+        collection = DatabaseFunctions.get_mongo_db()[ResumeComparisonCollection.COLLECTION_NAME]
+        query = {"userId": str(userId)}
+        results_len: int = collection.delete_many(query)
+        JobMatchScoreTable.delete_user_match_scores(userId)
         return results_len
     def get_job_best_resume_comparison(jobId: str, userId: str | UUID):
         job_resume_comparisons = ResumeComparisonCollection.read_job_resume_comparisons(jobId, userId)
@@ -63,9 +174,49 @@ class ResumeComparisonCollection:
             if not best_resume_comparison or resume_comparison["matchScore"] > best_resume_comparison["matchScore"]:
                 best_resume_comparison = resume_comparison
         return best_resume_comparison
+    '''
+    get_best_resume_scores_object
+
+    args:
+        jobs: jobs to get scores for
+        userId: id of the user
+    returns:
+        dict of job id to the best match score or None, read from JobMatchScore in one query
+    '''
     def get_best_resume_scores_object(jobs: list[Job], userId: str | UUID):
-        best_resume_scores = {}
-        for job in jobs:
-            best_resume_comparison = ResumeComparisonCollection.get_job_best_resume_comparison(job.job_id, userId)
-            best_resume_scores[job.job_id] = best_resume_comparison["matchScore"] if best_resume_comparison else None
-        return best_resume_scores
+        match_scores: Dict[str, int] = JobMatchScoreTable.read_user_match_scores(userId)
+        return {job.job_id: match_scores.get(job.job_id) for job in jobs}
+    '''
+    read_best_match_scores
+
+    groups comparisons by user and job in mongo
+
+    args:
+        userIds: optional user ids to limit to, all users if None
+        jobIds: optional job ids to limit to, all jobs if None
+    returns:
+        list of {userId, jobId, matchScore} with the highest matchScore for each pair
+    '''
+    def read_best_match_scores(userIds: list[str] | None = None, jobIds: list[str] | None = None) -> list[Dict]:
+        collection = DatabaseFunctions.get_mongo_db()[ResumeComparisonCollection.COLLECTION_NAME]
+        match: Dict = {"matchScore": {"$ne": None}}
+        if userIds is not None:
+            match["userId"] = {"$in": userIds}
+        if jobIds is not None:
+            match["jobId"] = {"$in": jobIds}
+        pipeline = [
+            {"$match": match},
+            {"$group": {"_id": {"userId": "$userId", "jobId": "$jobId"}, "matchScore": {"$max": "$matchScore"}}}
+        ]
+        return [{"userId": result["_id"]["userId"], "jobId": result["_id"]["jobId"], "matchScore": result["matchScore"]}
+                for result in collection.aggregate(pipeline, allowDiskUse=True)]
+
+'''
+removes comparisons duplicated before we upserted and builds the indexes
+
+python resume_comparison_collection.py
+'''
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    ResumeComparisonCollection.ensure_indexes(remove_duplicates=True)
+    DatabaseFunctions.close_mongo_client()
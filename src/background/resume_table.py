@@ -3,10 +3,15 @@ from database_functions import DatabaseFunctions, get_connection
 from typing import Dict
 from uuid import UUID
 from resume import Resume
+from entitlement_cache import EntitlementCache
+from blob_store import BlobStore
+from sync_tombstone_table import SyncTombstoneTable
+from user_data_version_table import UserDataVersionTable
 from mysql.connector.cursor import MySQLCursor
 from mysql.connector.connection_cext import CMySQLConnection
 from mysql.connector.types import RowType, RowItemType
 import datetime
+import zlib
 import logging
 
 class ResumeTable:
@@ -17,7 +22,19 @@ class ResumeTable:
     '''
     def __get_add_resume_query() -> str:
         return """
-            INSERT INTO Resumes (UserId, Name, FileName, FileType, FileContent, FileText, IsDefault) VALUES (%s, %s, %s, %s, %s, %s, %s)
+            INSERT INTO Resumes (UserId, Name, FileName, FileType, FileHash, FileText, IsDefault, ContentHash) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        """
+    '''
+    __get_read_by_hash_query
+
+    text (and the converted pdf if asked for) of any resume uploaded with the same bytes, so an identical upload
+    doesn't have to be converted or go through text extraction again
+    '''
+    def __get_read_by_hash_query(with_content: bool) -> str:
+        #FileContent only for rows from before the BlobStore
+        columns: str = "FileHash, FileContent, FileText" if with_content else "FileText"
+        return f"""
+            SELECT {columns} FROM RESUMES WHERE ContentHash = %s LIMIT 1
         """
     '''
     __get_delete_resume_query
@@ -37,6 +54,70 @@ class ResumeTable:
         return """
             SELECT * FROM RESUMES WHERE UserId = %s
         """
+    '''
+    __get_count_resumes_query
+
+    counts a users resumes without reading the files
+    '''
+    def __get_count_resumes_query() -> str:
+        return """
+            SELECT COUNT(*) AS ResumeCount FROM RESUMES WHERE UserId = %s
+        """
+    '''
+    __get_read_resumes_metadata_query
+
+    every column but the file and its text
+    '''
+    def __get_read_resumes_metadata_query(changed_since: bool = False) -> str:
+        changed_filter: str = "AND UpdatedAt > %s" if changed_since else ""
+        return f"""
+            SELECT {ResumeTable.__get_metadata_columns()} FROM RESUMES WHERE UserId = %s {changed_filter}
+        """
+    def __get_read_resume_metadata_by_id() -> str:
+        return f"""
+            SELECT {ResumeTable.__get_metadata_columns()} FROM RESUMES WHERE Id = %s
+        """
+    '''
+    __get_read_resumes_text_query
+
+    metadata and text without the file, all a comparison needs
+    '''
+    def __get_read_resumes_text_query() -> str:
+        return f"""
+            SELECT {ResumeTable.__get_metadata_columns()}, FileText FROM RESUMES WHERE UserId = %s
+        """
+    def __get_read_resume_text_by_id() -> str:
+        return f"""
+            SELECT {ResumeTable.__get_metadata_columns()}, FileText FROM RESUMES WHERE Id = %s
+        """
+    def __get_metadata_columns() -> str:
+        return "Id, Name, UserId, FileName, FileType, UploadDate, IsDefault, ContentHash, FileHash"
+    '''
+    __get_set_content_hash_query
+
+    fills in the hash for resumes uploaded before we stored one
+    '''
+    def __get_set_content_hash_query() -> str:
+        return """
+            UPDATE RESUMES SET ContentHash = %s WHERE Id = %s AND ContentHash IS NULL
+        """
+    '''
+    __get_read_legacy_files_query
+
+    rows still holding their file in FileContent, for the move to the BlobStore
+    '''
+    def __get_read_legacy_files_query() -> str:
+        return """
+            SELECT Id, FileContent FROM RESUMES WHERE FileHash IS NULL AND FileContent IS NOT NULL LIMIT %s
+        """
+    def __get_move_file_query() -> str:
+        return """
+            UPDATE RESUMES SET FileHash = %s, ContentHash = COALESCE(ContentHash, %s), FileContent = NULL WHERE Id = %s
+        """
+    def __get_read_file_hashes_query() -> str:
+        return """
+            SELECT DISTINCT FileHash FROM RESUMES WHERE FileHash IS NOT NULL
+        """
     def __get_read_resume_by_id() -> str:
         return """
             SELECT * FROM RESUMES WHERE Id = %s
@@ -79,8 +160,21 @@ class ResumeTable:
     def add_resume(user_id: UUID | str, resume: Resume) -> int:
         user_id : str = str(user_id)
         logging.info("ADDING RESUME WITH USER ID " + user_id + " FILENAME OF " + resume.file_name)
-        with get_connection() as conn:
+        with get_connection(request_scoped=True) as conn:
             with conn.cursor(dictionary=True) as cursor:
+                if not resume.has_file_text() or resume.needs_conversion():
+                    cursor.execute(ResumeTable.__get_read_by_hash_query(resume.needs_conversion()), (resume.get_content_hash(),))
+                    stored: Dict[str, RowItemType] | None = cursor.fetchone()
+                    if stored:
+                        logging.info("REUSING IDENTICAL RESUME")
+                        if resume.needs_conversion() and stored["FileHash"]:
+                            resume.use_stored_file(stored["FileHash"])
+                        elif resume.needs_conversion() and stored["FileContent"]:
+                            resume.file_content = zlib.decompress(stored["FileContent"])
+                        if not resume.has_file_text():
+                            resume.file_text = Resume.decompress(stored["FileText"])
+                if resume.file_hash is None:
+                    resume.file_hash = BlobStore.put(resume.file_content)
                 query : str = ResumeTable.__get_add_resume_query()
                 resume_json: Dict = resume.to_sql_friendly_json()
                 resume_values: list = [
@@ -88,9 +182,10 @@ class ResumeTable:
                     resume_json["name"],
                     resume_json["fileName"],
                     resume_json["fileType"],
-                    resume_json["fileContent"],
+                    resume_json["fileHash"],
                     resume_json["fileText"],
-                    resume_json["isDefault"]
+                    resume_json["isDefault"],
+                    resume_json["contentHash"]
                     ]
                 try:
                     cursor.execute(query, resume_values)
@@ -100,8 +195,10 @@ class ResumeTable:
                     cursor.close()
                     conn.close()
                     raise e
+                cursor.execute(UserDataVersionTable.get_bump_version_query(), (user_id,))
                 logging.info("RESUME SUCCESSFULLY ADDED")
                 conn.commit()
+                EntitlementCache.invalidate(user_id)
                 resume.upload_date = datetime.datetime.utcnow()
                 resume.id = cursor.lastrowid
                 logging.info("Resume uploaded at ")
@@ -115,14 +212,21 @@ class ResumeTable:
     deletes a resume from our db
 
     resume_id: id of the resume we are deleting
+    user_id: optional id of the owner, without it every cached entitlement in this worker is dropped
     '''
-    def delete_resume(resume_id: int) -> int:
-        with get_connection() as conn:
+    def delete_resume(resume_id: int, user_id: UUID | str | None = None) -> int:
+        with get_connection(request_scoped=True) as conn:
             with conn.cursor(dictionary=True) as cursor:
                 query : str = ResumeTable.__get_delete_resume_query()
+                cursor.execute(SyncTombstoneTable.get_add_tombstones_query(SyncTombstoneTable.RESUME, "Resumes", "UserId", "Id", "Id = %s"), (resume_id,))
+                cursor.execute(UserDataVersionTable.get_bump_versions_query("Resumes", "UserId", "Id = %s"), (resume_id,))
                 cursor.execute(query, (resume_id,))
                 logging.info("RESUME SUCCESSFULLY DELETED")
                 conn.commit()
+        if user_id is not None:
+            EntitlementCache.invalidate(user_id)
+        else:
+            EntitlementCache.clear()
         return 0
     '''
     read_user_resumes
@@ -134,7 +238,7 @@ class ResumeTable:
     returns: list of resumes 
     '''
     def read_user_resumes(user_id: UUID | str) -> list[Resume]:
-        with get_connection() as conn:
+        with get_connection(request_scoped=True) as conn:
             with conn.cursor(dictionary=True) as cursor:
                 user_id : str = str(user_id)
                 query: str = ResumeTable.__get_read_resumes_query()
@@ -143,6 +247,110 @@ class ResumeTable:
                 results_list : list[Resume] = [Resume.create_with_sql_row(row) for row in results]
         return results_list
     '''
+    read_user_resumes_metadata
+
+    returns all resumes assoiciated with a user without their files or text, use for listings
+
+    user_id: uuid or str uuid of user
+    changed_since: only read resumes added or changed after this db time
+
+    returns: list of resumes with file_content and file_text of None
+    '''
+    def read_user_resumes_metadata(user_id: UUID | str, changed_since: datetime.datetime | None = None) -> list[Resume]:
+        params: tuple = (str(user_id),) if changed_since is None else (str(user_id), changed_since)
+        with get_connection(request_scoped=True) as conn:
+            with conn.cursor(dictionary=True) as cursor:
+                query: str = ResumeTable.__get_read_resumes_metadata_query(changed_since is not None)
+                cursor.execute(query, params)
+                results: list[Dict[str, RowItemType]] = cursor.fetchall()
+        return [Resume.create_with_sql_row(row) for row in results]
+    '''
+    read_resume_metadata_by_id
+
+    reads a resume without its file or text, enough for ownership checks and ETags
+
+    resume_id: the id of the resume we are reading
+
+    returns:
+
+    resume with file_content and file_text of None, None if there is no resume with that id
+    '''
+    def read_resume_metadata_by_id(resume_id: int) -> Resume | None:
+        with get_connection(request_scoped=True) as conn:
+            with conn.cursor(dictionary=True) as cursor:
+                query: str = ResumeTable.__get_read_resume_metadata_by_id()
+                cursor.execute(query, (resume_id,))
+                result: Dict[str, RowItemType] | None = cursor.fetchone()
+        return Resume.create_with_sql_row(result) if result else None
+    '''
+    read_user_resumes_text
+
+    returns all resumes assoiciated with a user with their text but not their files, use for comparisons
+
+    user_id: uuid or str uuid of user
+
+    returns: list of resumes, file_content is only read from the BlobStore if something asks for it
+    '''
+    def read_user_resumes_text(user_id: UUID | str) -> list[Resume]:
+        with get_connection(request_scoped=True) as conn:
+            with conn.cursor(dictionary=True) as cursor:
+                cursor.execute(ResumeTable.__get_read_resumes_text_query(), (str(user_id),))
+                results: list[Dict[str, RowItemType]] = cursor.fetchall()
+        return [Resume.create_with_sql_row(row) for row in results]
+    '''
+    read_resume_text_by_id
+
+    reads a resume with its text but not its file
+
+    resume_id: the id of the resume we are reading
+
+    returns:
+
+    the resume, None if there is no resume with that id
+    '''
+    def read_resume_text_by_id(resume_id: int) -> Resume | None:
+        with get_connection(request_scoped=True) as conn:
+            with conn.cursor(dictionary=True) as cursor:
+                cursor.execute(ResumeTable.__get_read_resume_text_by_id(), (resume_id,))
+                result: Dict[str, RowItemType] | None = cursor.fetchone()
+        return Resume.create_with_sql_row(result) if result else None
+    '''
+    ensure_content_hash
+
+    gives a resume uploaded before we hashed uploads a hash of its stored file so it can have an ETag
+
+    resume: resume read with its file
+
+    returns: the content hash
+    '''
+    def ensure_content_hash(resume: Resume) -> str:
+        if resume.content_hash is not None:
+            return resume.content_hash
+        content_hash: str = resume.get_content_hash()
+        with get_connection(request_scoped=True) as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(ResumeTable.__get_set_content_hash_query(), (content_hash, resume.id))
+                #the hash is part of the resumes metadata
+                cursor.execute(UserDataVersionTable.get_bump_version_query(), (str(resume.user_id),))
+                conn.commit()
+        return content_hash
+    '''
+    count_user_resumes
+
+    counts a users resumes, use over read_user_resumes when the files aren't needed
+
+    user_id: uuid or str uuid of user
+
+    returns: number of resumes the user has
+    '''
+    def count_user_resumes(user_id: UUID | str) -> int:
+        with get_connection(request_scoped=True) as conn:
+            with conn.cursor(dictionary=True) as cursor:
+                query: str = ResumeTable.__get_count_resumes_query()
+                cursor.execute(query, (str(user_id),))
+                result: Dict[str, RowItemType] = cursor.fetchone()
+        return result["ResumeCount"]
+    '''
     read_resume_by_id
 
     reads resume by it's specific id
@@ -154,7 +362,7 @@ class ResumeTable:
     resume we read
     '''
     def read_resume_by_id(resume_id: int) -> Resume:
-        with get_connection() as conn:
+        with get_connection(request_scoped=True) as conn:
             with conn.cursor(dictionary=True) as cursor:
                 query: str = ResumeTable.__get_read_resume_by_id()
                 cursor.execute(query, (resume_id,))
@@ -170,20 +378,58 @@ class ResumeTable:
     returns: updated resume
     '''
     def update_resume_by_id(resume_id: int, user_id: str, update_dict: Dict) -> Resume:
-        with get_connection() as conn:
+        with get_connection(request_scoped=True) as conn:
             with conn.cursor(dictionary=True) as cursor:
                 if "isDefault" in update_dict:
                     clear_default_query = ResumeTable.__get_clear_defaults()
                     cursor.execute(clear_default_query, (str(user_id),))
                 query: str = ResumeTable.__get_update_resume_by_id(update_dict)
                 cursor.execute(query, (*update_dict.values(), resume_id))
+                cursor.execute(UserDataVersionTable.get_bump_version_query(), (str(user_id),))
                 conn.commit()
         return ResumeTable.read_resume_by_id(resume_id)
+    '''
+    read_legacy_files
+
+    limit: max rows to read
+
+    returns: list of {Id, FileContent} for resumes whose file hasn't been moved to the BlobStore
+    '''
+    def read_legacy_files(limit: int) -> list[Dict[str, RowItemType]]:
+        with get_connection() as conn:
+            with conn.cursor(dictionary=True) as cursor:
+                cursor.execute(ResumeTable.__get_read_legacy_files_query(), (limit,))
+                return cursor.fetchall()
+    '''
+    move_file_to_blob_store
+
+    points a resume at its blob and drops the legacy FileContent, call once the blob is stored
+
+    resume_id: id of the resume
+    file_hash: key of the blob
+    '''
+    def move_file_to_blob_store(resume_id: int, file_hash: str) -> None:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                #rows from before ContentHash get the stored files hash, the best we have
+                cursor.execute(ResumeTable.__get_move_file_query(), (file_hash, file_hash, resume_id))
+                cursor.execute(UserDataVersionTable.get_bump_versions_query("Resumes", "UserId", "Id = %s"), (resume_id,))
+                conn.commit()
+    '''
+    read_file_hashes
+
+    returns: every blob a resume points to
+    '''
+    def read_file_hashes() -> set[str]:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(ResumeTable.__get_read_file_hashes_query())
+                return {row[0] for row in cursor.fetchall()}
     def clear_resumes_after_subscription_end(user_id: str):
-        resumes: list[Resume] = ResumeTable.read_user_resumes(user_id)
+        resumes: list[Resume] = ResumeTable.read_user_resumes_metadata(user_id)
         if len(resumes) < 2:
             return
         resume_to_keep = ResumeTable.__get_resume_to_keep(resumes)
         for resume in resumes:
             if resume.id != resume_to_keep.id:
-                ResumeTable.delete_resume(resume.id)
\ No newline at end of file
+                ResumeTable.delete_resume(resume.id, user_id)
\ No newline at end of file
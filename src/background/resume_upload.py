@@ -0,0 +1,92 @@
+#(c) 2024 Daniel DeMoney. All rights reserved.
+from errors import UploadTooLarge
+from resume import Resume
+from typing import BinaryIO, Dict
+import hashlib
+import os
+import tempfile
+
+class ResumeUpload:
+    '''
+    ResumeUpload
+
+    Reads resumes uploaded as raw bytes (multipart or a raw request body) instead of the JSON int array the older
+    extension sends, which flask parses into a python list costing tens of bytes per file byte.
+
+    The body is copied in chunks into a spooled temp file (memory up to SPOOL_BYTES, disk after) while we hash it,
+    and we stop as soon as it passes MAX_BYTES, so a worker holds roughly one copy of the file at the end.
+    '''
+    MAX_BYTES: int = int(os.environ.get("RESUME_MAX_UPLOAD_BYTES", 10 * 1024 * 1024))
+    SPOOL_BYTES: int = int(os.environ.get("RESUME_UPLOAD_SPOOL_BYTES", 1024 * 1024))
+    CHUNK_BYTES: int = 64 * 1024
+    #raw body uploads say what they are with Content-Type
+    FILE_TYPES_BY_MIMETYPE: Dict[str, str] = {
+        "application/pdf": "pdf",
+        "application/vnd.openxmlformats-officedocument.wordprocessingml.document": "docx"
+    }
+    '''
+    check_content_length
+
+    rejects a request before we read any of it if it says it's too big
+
+    args:
+        content_length: Content-Length of the request, None if it's chunked
+    raises:
+        UploadTooLarge
+    '''
+    def check_content_length(content_length: int | None) -> None:
+        #multipart boundaries and form fields take a little room on top of the file
+        if content_length is not None and content_length > ResumeUpload.MAX_BYTES + ResumeUpload.CHUNK_BYTES:
+            raise UploadTooLarge()
+    '''
+    read_stream
+
+    args:
+        stream: file like object to read the upload from
+    returns:
+        bytes of the file, sha256 hex digest of the bytes
+    raises:
+        UploadTooLarge as soon as more than MAX_BYTES have been read
+    '''
+    def read_stream(stream: BinaryIO) -> tuple[bytes, str]:
+        hasher = hashlib.sha256()
+        size: int = 0
+        with tempfile.SpooledTemporaryFile(max_size=ResumeUpload.SPOOL_BYTES) as spool:
+            while True:
+                chunk: bytes = stream.read(ResumeUpload.CHUNK_BYTES)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > ResumeUpload.MAX_BYTES:
+                    raise UploadTooLarge()
+                hasher.update(chunk)
+                spool.write(chunk)
+            spool.seek(0)
+            return spool.read(), hasher.hexdigest()
+    '''
+    create_resume
+
+    builds a resume from an uploaded file, the hash we computed while streaming becomes its content hash
+
+    args:
+        file_content: bytes of the file
+        content_hash: sha256 hex digest of file_content
+        user_id: id of the user uploading
+        file_name: name of the uploaded file
+        file_type: extension of the file, worked out from file_name if None
+        name: optional display name
+        is_default: if this should be the users default resume
+    returns:
+        the resume
+    '''
+    def create_resume(file_content: bytes, content_hash: str, user_id: str, file_name: str, file_type: str | None, name: str | None, is_default: bool) -> Resume:
+        if not file_type:
+            file_type = os.path.splitext(file_name)[1].lstrip(".").lower()
+        return Resume(None, user_id, file_name, file_type, file_content, None, name=name, isDefault=is_default, content_hash=content_hash)
+    '''
+    parse_bool
+
+    form fields and query args are strings
+    '''
+    def parse_bool(value: str | None) -> bool:
+        return value is not None and value.lower() in ("true", "1", "yes")
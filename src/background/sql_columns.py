@@ -0,0 +1,51 @@
+#(c) 2024 Daniel DeMoney. All rights reserved.
+from typing import Any, Dict, Iterable
+
+class SqlColumns:
+    '''
+    SqlColumns
+
+    Column name to position maps for hydrating models from a plain (tuple) cursor. A dictionary cursor turns every
+    row into a dict of every column name before a model reads five of them, reading by position skips that. The map
+    for a query is worked out from the cursors column names the first time it runs and kept, and is only worked out
+    again if the columns come back different (a table altered under a running worker).
+
+    Like the dictionary cursor, a name selected twice (UserJob.* and Job.* both have JobId) maps to the last one.
+    '''
+    __indexes: Dict[str, tuple[tuple[str, ...], Dict[str, int]]] = {}
+    '''
+    index
+
+    args:
+        column_names: names of the columns, in row order
+    returns:
+        column name to its position in a row
+    '''
+    def index(column_names: Iterable[str]) -> Dict[str, int]:
+        return {name: position for position, name in enumerate(column_names)}
+    '''
+    for_query
+
+    args:
+        query: query the cursor just executed
+        cursor: the cursor
+    returns:
+        column name to its position in the rows the cursor returns
+    '''
+    def for_query(query: str, cursor: Any) -> Dict[str, int]:
+        column_names: tuple[str, ...] = tuple(cursor.column_names)
+        cached: tuple[tuple[str, ...], Dict[str, int]] | None = SqlColumns.__indexes.get(query)
+        if cached is None or cached[0] != column_names:
+            cached = (column_names, SqlColumns.index(column_names))
+            SqlColumns.__indexes[query] = cached
+        return cached[1]
+    '''
+    from_dict_row
+
+    args:
+        sql_query_row: a row from a dictionary cursor
+    returns:
+        ([the row as a tuple], its column positions), for hydrating one dict row with a create_many_with_sql_rows
+    '''
+    def from_dict_row(sql_query_row: Dict[str, Any]) -> tuple[list[tuple], Dict[str, int]]:
+        return [tuple(sql_query_row.values())], SqlColumns.index(sql_query_row.keys())
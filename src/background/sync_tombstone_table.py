@@ -0,0 +1,100 @@
+#(c) 2024 Daniel DeMoney. All rights reserved.
+from database_functions import get_connection
+from mysql.connector.types import RowItemType
+from typing import Dict
+from uuid import UUID
+import datetime
+import os
+import logging
+
+class SyncTombstoneTable:
+    '''
+    SyncTombstoneTable
+
+    Remembers what was deleted from a users data and when, so /databases/sync_user_data can tell a client to drop
+    things it still has. Tables write tombstones in the same transaction as the delete, with an INSERT ... SELECT
+    from the rows being deleted (see get_add_tombstones_query). Foreign key cascades don't run triggers in mysql so
+    this can't be a trigger, deleting a job tombstones its user jobs first for the same reason.
+
+    Tombstones older than RETENTION_DAYS can be pruned, clients that last synced before that get a full sync.
+    '''
+    JOB: str = "job"
+    RESUME: str = "resume"
+    SCORE: str = "score"
+    RETENTION_DAYS: float = float(os.environ.get("SYNC_TOMBSTONE_DAYS", 30))
+    '''
+    get_add_tombstones_query
+
+    tombstones every row a delete is about to remove, run it right before the delete with the same params
+
+    args:
+        entity_type: JOB, RESUME or SCORE
+        table: table the delete is from
+        user_column: column of table holding the users id
+        id_column: column of table holding the id the client knows the row by
+        where: where clause of the delete, with %s params
+    returns:
+        query str
+    '''
+    def get_add_tombstones_query(entity_type: str, table: str, user_column: str, id_column: str, where: str) -> str:
+        return f"""
+            INSERT INTO SyncTombstone (UserId, EntityType, EntityId)
+            SELECT {user_column}, '{entity_type}', {id_column} FROM {table} WHERE {where}
+            ON DUPLICATE KEY UPDATE DeletedAt = CURRENT_TIMESTAMP(3)
+        """
+    def __get_read_tombstones_query() -> str:
+        return 'SELECT EntityType, EntityId FROM SyncTombstone WHERE UserId = %s AND DeletedAt > %s'
+    def __get_read_now_query() -> str:
+        return 'SELECT CURRENT_TIMESTAMP(3) AS Now'
+    def __get_prune_query() -> str:
+        return 'DELETE FROM SyncTombstone WHERE DeletedAt < %s'
+    '''
+    read_now
+
+    returns:
+        the dbs clock, what UpdatedAt and DeletedAt columns are stamped with
+    '''
+    def read_now() -> datetime.datetime:
+        with get_connection(request_scoped=True) as conn:
+            with conn.cursor(dictionary=True) as cursor:
+                cursor.execute(SyncTombstoneTable.__get_read_now_query())
+                return cursor.fetchone()["Now"]
+    '''
+    read_tombstones
+
+    args:
+        user_id: id of the user
+        since: db time of the clients last sync
+    returns:
+        entity type to the ids of everything of that type deleted since
+    '''
+    def read_tombstones(user_id: UUID | str, since: datetime.datetime) -> Dict[str, list[str]]:
+        tombstones: Dict[str, list[str]] = {SyncTombstoneTable.JOB: [], SyncTombstoneTable.RESUME: [], SyncTombstoneTable.SCORE: []}
+        with get_connection(request_scoped=True) as conn:
+            with conn.cursor(dictionary=True) as cursor:
+                cursor.execute(SyncTombstoneTable.__get_read_tombstones_query(), (str(user_id), since))
+                rows: list[Dict[str, RowItemType]] = cursor.fetchall()
+        for row in rows:
+            tombstones[row["EntityType"]].append(row["EntityId"])
+        return tombstones
+    '''
+    prune
+
+    returns:
+        number of tombstones older than RETENTION_DAYS deleted
+    '''
+    def prune() -> int:
+        cutoff: datetime.datetime = SyncTombstoneTable.read_now() - datetime.timedelta(days=SyncTombstoneTable.RETENTION_DAYS)
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(SyncTombstoneTable.__get_prune_query(), (cutoff,))
+                conn.commit()
+                logging.info(f"PRUNED {cursor.rowcount} SYNC TOMBSTONES")
+                return cursor.rowcount
+
+'''
+python sync_tombstone_table.py
+'''
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    SyncTombstoneTable.prune()
@@ -0,0 +1,163 @@
+#(c) 2024 Daniel DeMoney. All rights reserved.
+from errors import TextExtractionUnavailable
+from pypdf import PdfReader
+from tika import parser
+from typing import Dict
+import io
+import os
+import threading
+import time
+import logging
+
+class TextExtraction:
+    '''
+    TextExtraction
+
+    Pulls readable text out of uploaded resumes
+
+    pdfs with a real text layer are read in process with pypdf, no JVM involved. Everything else (scans, odd font
+    encodings, anything pypdf chokes on) goes to tika. Tika runs as its own server started at boot (the tika service
+    in docker-compose, pointed at with TIKA_SERVER_ENDPOINT and TIKA_CLIENT_ONLY) instead of a JVM spawned by
+    whichever worker asks first, and each worker sends it at most TIKA_MAX_CONCURRENCY files at a time. Callers past
+    that wait up to TIKA_QUEUE_TIMEOUT_SECONDS for a slot before we give up with TextExtractionUnavailable.
+
+    Everything is per worker, stats() gives the counters
+    '''
+    MAX_CONCURRENCY: int = int(os.environ.get("TIKA_MAX_CONCURRENCY", 2))
+    QUEUE_TIMEOUT_SECONDS: float = float(os.environ.get("TIKA_QUEUE_TIMEOUT_SECONDS", 30))
+    REQUEST_TIMEOUT_SECONDS: float = float(os.environ.get("TIKA_REQUEST_TIMEOUT_SECONDS", 60))
+    #past this many pages pypdf is slower than the round trip to tika, resumes are never this long anyway
+    FAST_PATH_MAX_PAGES: int = int(os.environ.get("PDF_FAST_PATH_MAX_PAGES", 10))
+    #less text than this per page means a scanned or image only pdf, let tika try
+    FAST_PATH_MIN_CHARS_PER_PAGE: int = 100
+    #share of characters that have to be readable, broken font encodings come out as control chars and U+FFFD
+    FAST_PATH_MIN_PRINTABLE_RATIO: float = 0.95
+    __tika_slots: threading.BoundedSemaphore = threading.BoundedSemaphore(MAX_CONCURRENCY)
+    __stats_lock: threading.Lock = threading.Lock()
+    __stats: Dict[str, float] = {
+        "fast_path_hits": 0,
+        "fast_path_misses": 0,
+        "fast_path_seconds_total": 0.0,
+        "tika_calls": 0,
+        "tika_failures": 0,
+        "tika_queue_timeouts": 0,
+        "tika_seconds_total": 0.0,
+        "tika_wait_seconds_total": 0.0,
+        "tika_wait_seconds_max": 0.0,
+        "tika_waiting": 0,
+        "tika_in_flight": 0
+    }
+    '''
+    extract_text
+
+    args:
+        file_content: bytes of the file
+    returns:
+        text of the file, None if tika couldn't find any
+    raises:
+        TextExtractionUnavailable if the file needed tika and tika was busy or down
+    '''
+    def extract_text(file_content: bytes) -> str | None:
+        if file_content[:5] == b"%PDF-":
+            text: str | None = TextExtraction.extract_pdf_text_fast(file_content)
+            if text is not None:
+                return text
+        return TextExtraction.extract_text_with_tika(file_content)
+    '''
+    extract_pdf_text_fast
+
+    in process extraction with pypdf
+
+    args:
+        file_content: bytes of a pdf
+    returns:
+        the text, or None if the pdf doesn't look like it has a usable text layer
+    '''
+    def extract_pdf_text_fast(file_content: bytes) -> str | None:
+        st: float = time.monotonic()
+        text: str | None = None
+        try:
+            reader: PdfReader = PdfReader(io.BytesIO(file_content))
+            if len(reader.pages) <= TextExtraction.FAST_PATH_MAX_PAGES:
+                text = "\n".join(page.extract_text() or "" for page in reader.pages)
+                if not TextExtraction.__looks_readable(text, len(reader.pages)):
+                    text = None
+        except Exception as e:
+            #pypdf raises all sorts (AttributeError, IndexError, RecursionError...) on malformed pdfs, tika still gets a go
+            logging.info(f"PDF FAST PATH FAILED, FALLING BACK TO TIKA: {e!r}")
+            text = None
+        TextExtraction.__add("fast_path_seconds_total", time.monotonic() - st)
+        TextExtraction.__add("fast_path_hits" if text is not None else "fast_path_misses", 1)
+        return text
+    '''
+    extract_text_with_tika
+
+    args:
+        file_content: bytes of the file
+    returns:
+        text tika found, None if it found none
+    raises:
+        TextExtractionUnavailable if no tika slot freed up in time or tika failed
+    '''
+    def extract_text_with_tika(file_content: bytes) -> str | None:
+        st: float = time.monotonic()
+        TextExtraction.__add("tika_waiting", 1)
+        acquired: bool = TextExtraction.__tika_slots.acquire(timeout=TextExtraction.QUEUE_TIMEOUT_SECONDS)
+        waited: float = time.monotonic() - st
+        with TextExtraction.__stats_lock:
+            TextExtraction.__stats["tika_waiting"] -= 1
+            TextExtraction.__stats["tika_wait_seconds_total"] += waited
+            TextExtraction.__stats["tika_wait_seconds_max"] = max(TextExtraction.__stats["tika_wait_seconds_max"], waited)
+        if not acquired:
+            TextExtraction.__add("tika_queue_timeouts", 1)
+            logging.error(f"NO TIKA SLOT FREED UP IN {TextExtraction.QUEUE_TIMEOUT_SECONDS} SECONDS")
+            raise TextExtractionUnavailable()
+        TextExtraction.__add("tika_in_flight", 1)
+        st = time.monotonic()
+        try:
+            result: Dict = parser.from_buffer(file_content, requestOptions={"timeout": TextExtraction.REQUEST_TIMEOUT_SECONDS})
+        except Exception as e:
+            TextExtraction.__add("tika_failures", 1)
+            logging.error(f"TIKA EXTRACTION FAILED: {e}")
+            raise TextExtractionUnavailable() from e
+        finally:
+            TextExtraction.__tika_slots.release()
+            with TextExtraction.__stats_lock:
+                TextExtraction.__stats["tika_in_flight"] -= 1
+                TextExtraction.__stats["tika_calls"] += 1
+                TextExtraction.__stats["tika_seconds_total"] += time.monotonic() - st
+        return result.get("content")
+    '''
+    warm_up
+
+    sends tika a tiny buffer off the request path so the first upload doesn't pay for tika starting up. Runs in a
+    daemon thread, a tika that is down only gets logged
+    '''
+    def warm_up() -> None:
+        def ping() -> None:
+            try:
+                TextExtraction.extract_text_with_tika(b"warm up")
+                logging.info("TIKA IS UP")
+            except TextExtractionUnavailable:
+                logging.error("TIKA DID NOT ANSWER WARM UP")
+        threading.Thread(target=ping, name="tika-warm-up", daemon=True).start()
+    '''
+    stats
+
+    returns:
+        copy of this workers extraction counters
+    '''
+    def stats() -> Dict[str, float]:
+        with TextExtraction.__stats_lock:
+            stats: Dict[str, float] = dict(TextExtraction.__stats)
+        stats["tika_max_concurrency"] = TextExtraction.MAX_CONCURRENCY
+        return stats
+    def __add(stat: str, amount: float) -> None:
+        with TextExtraction.__stats_lock:
+            TextExtraction.__stats[stat] += amount
+    def __looks_readable(text: str, num_pages: int) -> bool:
+        stripped: str = "".join(text.split())
+        if len(stripped) < TextExtraction.FAST_PATH_MIN_CHARS_PER_PAGE * max(num_pages, 1):
+            return False
+        readable: int = sum(1 for char in stripped if char.isprintable() and char != "�")
+        return readable / len(stripped) >= TextExtraction.FAST_PATH_MIN_PRINTABLE_RATIO
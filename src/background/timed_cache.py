@@ -0,0 +1,91 @@
+#(c) 2024 Daniel DeMoney. All rights reserved.
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+import threading
+import time
+
+class TimedCache:
+    '''
+    TimedCache
+
+    Small thread safe, size bounded cache where every entry carries its own expiry.
+
+    Used for per worker caches (each gunicorn worker gets its own copy, nothing is shared
+    across processes) so entries should always have a short enough lifetime that another worker
+    writing to the db doesn't leave us serving stale data for long.
+
+    args:
+        max_size: max number of entries before we evict the least recently used
+        default_ttl: seconds an entry lives for if set is not passed an explicit expiry
+    '''
+    def __init__(self, max_size: int, default_ttl: float) -> None:
+        self.max_size: int = max_size
+        self.default_ttl: float = default_ttl
+        self.__entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.__lock: threading.Lock = threading.Lock()
+    '''
+    get
+
+    args:
+        key: key of the entry
+    returns:
+        the cached value or None if its missing or expired
+    '''
+    def get(self, key: Hashable) -> Any | None:
+        with self.__lock:
+            entry: tuple[float, Any] | None = self.__entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self.__entries[key]
+                return None
+            self.__entries.move_to_end(key)
+            return value
+    '''
+    set
+
+    args:
+        key: key of the entry
+        value: value to cache
+        ttl: optional seconds for this entry to live, defaults to default_ttl
+    '''
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        ttl = self.default_ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        with self.__lock:
+            self.__entries[key] = (time.monotonic() + ttl, value)
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.max_size:
+                self.__entries.popitem(last=False)
+    '''
+    pop
+
+    removes an entry if it exists
+    '''
+    def pop(self, key: Hashable) -> None:
+        with self.__lock:
+            self.__entries.pop(key, None)
+    '''
+    pop_where
+
+    removes every entry whose value matches the predicate, used when we can only identify
+    entries by what they hold (ex: a user id when the key is a token)
+
+    args:
+        predicate: function of value -> bool
+    '''
+    def pop_where(self, predicate: Callable[[Any], bool]) -> None:
+        with self.__lock:
+            stale_keys: list[Hashable] = [key for key, (_, value) in self.__entries.items() if predicate(value)]
+            for key in stale_keys:
+                del self.__entries[key]
+    '''
+    clear
+
+    drops every entry
+    '''
+    def clear(self) -> None:
+        with self.__lock:
+            self.__entries.clear()
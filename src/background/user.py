@@ -1,6 +1,6 @@
 #(c) 2024 Daniel DeMoney. All rights reserved.
 from mysql.connector.types import RowType, RowItemType
-from typing import Dict
+from typing import Dict, Callable
 from location import Location
 from uuid import UUID
 from typing import Optional
@@ -30,6 +30,7 @@ class User:
     
     returns User Object
     '''
+    __slots__ = ("user_id", "email", "password", "google_id", "first_name", "last_name", "location", "salt", "preferences")
     def __init__(self, user_id: UUID, email: str, password: Optional[str], google_id: Optional[str], first_name: str, last_name: str, 
                  location: Location, salt: Optional[str], user_preferences: Optional[UserPreferences]) -> None:
         self.user_id : UUID = user_id
@@ -186,13 +187,67 @@ class User:
             "location": self.location.to_json() if self.location else None,
             "preferences": self.preferences.to_json() if self.preferences else None
         }
-    
-    
-        
-        
-            
 
 
-    
+class AuthUser:
+    '''
+    AuthUser
+
+    Lean identity for the auth path, only what we need to check a token or a password. Loaded from
+    the User table alone (Email is unique so the lookup is indexed) instead of the four table join.
 
+    Anything else (first_name, location, preferences, to_json, ...) loads the full User on first use
+    and is memoized, so routes can keep treating this like a User.
 
+    args:
+        user_id: 36 char hex uuid separated by dashes
+        email: str email
+        password: str password hash, None for google users
+        google_id: str google id, None for non google users
+        salt: salt for users password in str format
+        profile_loader: function that loads the full User
+    '''
+    def __init__(self, user_id: UUID, email: str, password: Optional[str], google_id: Optional[str], salt: Optional[str],
+                 profile_loader: Callable[[], Optional[User]]) -> None:
+        self.user_id: UUID = user_id
+        self.email: str = email
+        self.password: Optional[str] = password
+        self.google_id: Optional[str] = google_id
+        self.salt: Optional[str] = salt
+        self.__profile_loader: Callable[[], Optional[User]] = profile_loader
+        self.__profile: Optional[User] = None
+    '''
+    create_with_sql_row
+
+    args:
+        sql_query_row: row with UserId, Email, Password, GoogleId and Salt
+        profile_loader: function that loads the full User
+    returns:
+        AuthUser object with values from query
+    '''
+    @classmethod
+    def create_with_sql_row(cls, sql_query_row: Dict[str, RowItemType], profile_loader: Callable[[], Optional[User]]) -> 'AuthUser':
+        try:
+            return cls(UUID(sql_query_row["UserId"]), sql_query_row["Email"], sql_query_row["Password"],
+                       sql_query_row["GoogleId"], sql_query_row["Salt"], profile_loader)
+        except KeyError:
+            raise UserInvalidData(json.dumps(sql_query_row))
+    '''
+    profile
+
+    returns:
+        the full User, loaded on first access
+    '''
+    @property
+    def profile(self) -> User:
+        if self.__profile is None:
+            logging.debug("LOADING FULL PROFILE FOR " + self.email)
+            self.__profile = self.__profile_loader()
+            if self.__profile is None:
+                raise UserInvalidData(self.email, "USER DELETED BEFORE PROFILE COULD BE LOADED")
+        return self.__profile
+    def __getattr__(self, name: str):
+        #only called for attributes we don't have, dunders and privates should never trigger a db read
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.profile, name)
@@ -0,0 +1,86 @@
+#(c) 2024 Daniel DeMoney. All rights reserved.
+from flask import g, has_request_context
+from timed_cache import TimedCache
+from typing import Any, Callable
+from uuid import UUID
+import os
+import logging
+
+class UserCache:
+    '''
+    UserCache
+
+    Caches users decoded from auth tokens so a request doesn't run the user join more than once.
+
+    Two layers:
+        request: memoized on flask.g, token_required, the payment decorators and the route body
+        all share the same user for a single request
+        worker: bounded TTL cache keyed by email + token expiry, shared across requests in a
+        single gunicorn worker
+
+    The worker layer is per process, so a write handled by another worker only shows up here once
+    the entry expires. Keep USER_CACHE_TTL short. Every table write that changes what a User holds
+    (user, preferences, keywords, location) must call invalidate so this worker never serves its own
+    stale writes.
+    '''
+    TTL_SECONDS: float = float(os.environ.get("USER_CACHE_TTL", 30))
+    MAX_SIZE: int = int(os.environ.get("USER_CACHE_MAX_SIZE", 1024))
+    __worker_cache: TimedCache = TimedCache(MAX_SIZE, TTL_SECONDS)
+    '''
+    get_or_load
+
+    returns the user for a decoded token, loading it only if neither cache has it
+
+    args:
+        token: raw jwt, key for the request cache
+        email: email from the token payload
+        exp: expiry from the token payload, part of the worker cache key so a new token always
+            gets its own entry
+        loader: function that loads the user from the db if we miss
+    returns:
+        user or None if the loader couldn't find them
+    '''
+    def get_or_load(token: str, email: str, exp: int | None, loader: Callable[[], Any]) -> Any | None:
+        request_users: dict | None = None
+        if has_request_context():
+            request_users = g.setdefault("decoded_users", {})
+            if token in request_users:
+                logging.debug("USER FOUND IN REQUEST CACHE")
+                return request_users[token]
+        worker_key: tuple = (email, exp)
+        user = UserCache.__worker_cache.get(worker_key)
+        if user is None:
+            user = loader()
+            #dont cache misses, a user registering would be locked out until the entry expires
+            if user is not None:
+                UserCache.__worker_cache.set(worker_key, user)
+        else:
+            logging.debug("USER FOUND IN WORKER CACHE")
+        if request_users is not None:
+            request_users[token] = user
+        return user
+    '''
+    invalidate
+
+    drops every cached entry for a user, call after any write to the user or the tables joined into it
+
+    args:
+        user_id: optional id of the user
+        email: optional email of the user
+    '''
+    def invalidate(user_id: UUID | str | None = None, email: str | None = None) -> None:
+        user_id = str(user_id) if user_id is not None else None
+        def matches(user) -> bool:
+            return (user_id is not None and str(user.user_id) == user_id) or (email is not None and user.email == email)
+        UserCache.__worker_cache.pop_where(matches)
+        if has_request_context() and "decoded_users" in g:
+            g.decoded_users = {token: user for token, user in g.decoded_users.items() if user is None or not matches(user)}
+    '''
+    clear
+
+    drops everything in this worker, mostly for tests
+    '''
+    def clear() -> None:
+        UserCache.__worker_cache.clear()
+        if has_request_context() and "decoded_users" in g:
+            g.decoded_users = {}
@@ -0,0 +1,74 @@
+#(c) 2024 Daniel DeMoney. All rights reserved.
+from database_functions import get_connection
+from mysql.connector.types import RowItemType
+from typing import Dict
+from uuid import UUID
+
+class UserDataVersionTable:
+    '''
+    UserDataVersionTable
+
+    A counter per user bumped by every write to something /databases/get_user_data returns (their jobs, the jobs and
+    companies behind them, resumes, scores and profile). get_user_data's ETag is built from it, so a client that
+    already has the latest data gets a 304 after one primary key read instead of the whole join.
+
+    Tables bump in the same transaction as their write. Writes to one user use get_bump_version_query, writes to
+    shared rows (a job, a company) bump everyone who has it with get_bump_versions_query. Users without a row are on
+    version 0.
+    '''
+    '''
+    get_bump_version_query
+
+    returns:
+        query bumping the version of the user passed as the only param
+    '''
+    def get_bump_version_query() -> str:
+        return """
+            INSERT INTO UserDataVersion (UserId) VALUES (%s)
+            ON DUPLICATE KEY UPDATE Version = Version + 1
+        """
+    '''
+    get_bump_versions_query
+
+    bumps the version of every user with a row in table matching where, run it with the same transaction and params
+    as the write
+
+    args:
+        table: table (or join) holding the users
+        user_column: column of table holding the users id
+        where: where clause picking the rows being written, with %s params
+    returns:
+        query str
+    '''
+    def get_bump_versions_query(table: str, user_column: str, where: str) -> str:
+        return f"""
+            INSERT INTO UserDataVersion (UserId)
+            SELECT {user_column} FROM {table} WHERE {where}
+            ON DUPLICATE KEY UPDATE UserDataVersion.Version = UserDataVersion.Version + 1
+        """
+    '''
+    get_bump_job_users_query
+
+    args:
+        job_where: where clause on Job picking the jobs being written, with %s params
+    returns:
+        query bumping the version of every user who saved one of the jobs
+    '''
+    def get_bump_job_users_query(job_where: str) -> str:
+        return UserDataVersionTable.get_bump_versions_query("UserJob JOIN Job ON Job.JobId = UserJob.JobId", "UserJob.UserId", job_where)
+    def __get_read_version_query() -> str:
+        return 'SELECT Version FROM UserDataVersion WHERE UserId = %s'
+    '''
+    read_version
+
+    args:
+        user_id: id of the user
+    returns:
+        the users version, 0 if nothing of theirs was written since versions were added
+    '''
+    def read_version(user_id: UUID | str) -> int:
+        with get_connection(request_scoped=True) as conn:
+            with conn.cursor(dictionary=True) as cursor:
+                cursor.execute(UserDataVersionTable.__get_read_version_query(), (str(user_id),))
+                result: Dict[str, RowItemType] | None = cursor.fetchone()
+        return result["Version"] if result else 0
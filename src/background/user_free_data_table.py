@@ -7,6 +7,7 @@ from user_table import UserTable
 import logging
 
 class UserFreeDataTable:
+    FREE_RATINGS_PER_DAY: int = 3
     def __get_add_free_data_query() -> str:
         return 'INSERT INTO UserFreeData (UserIdFk, Email) VALUES (%s, %s)'
     def __get_read_free_data_query() -> str:
@@ -20,14 +21,14 @@ class UserFreeDataTable:
     #IMPORTANT, this only returns the explicit data in the db, and does not reload, use get_free_resume data for any client facing info
     def read_free_data(userId: str) -> Dict:
         userId = str(userId) #Sanity check no uuids
-        with get_connection() as conn:
+        with get_connection(request_scoped=True) as conn:
             with conn.cursor(dictionary=True) as cursor:
                 query = UserFreeDataTable.__get_read_free_data_query()
                 cursor.execute(query, (userId,))
                 result = cursor.fetchone()
         return result
     def read_free_data_by_email(email: str) -> str:
-        with get_connection() as conn:
+        with get_connection(request_scoped=True) as conn:
             with conn.cursor(dictionary=True) as cursor:
                 query = UserFreeDataTable.__get_read_by_email_query()
                 cursor.execute(query, (email,))
@@ -35,7 +36,7 @@ class UserFreeDataTable:
         return result
     def update_free_data(userId: str, free_ratings_left: int, last_reload: datetime.datetime) -> int:
         userId = str(userId) #Sanity check no uuids
-        with get_connection() as conn:
+        with get_connection(request_scoped=True) as conn:
             with conn.cursor(dictionary=True) as cursor:
                 query = UserFreeDataTable.__get_update_free_data_query()
                 cursor.execute(query, (free_ratings_left, last_reload, userId,))
@@ -44,46 +45,117 @@ class UserFreeDataTable:
     def add_free_data(userId: str):
         userId = str(userId) #Sanity check no uuids
         user = UserTable.read_user_by_id(userId)
-        with get_connection() as conn:
+        with get_connection(request_scoped=True) as conn:
             with conn.cursor(dictionary=True) as cursor:
                 query = UserFreeDataTable.__get_add_free_data_query()
                 cursor.execute(query, (userId, user.email))
                 conn.commit()
     def reassign_free_data(userId: str, email: str):
-        with get_connection() as conn:
+        with get_connection(request_scoped=True) as conn:
             with conn.cursor(dictionary=True) as cursor:
                 query = UserFreeDataTable.__get_reassign_free_data_query()
                 cursor.execute(query, (userId, email))
                 conn.commit()
-    def use_free_resume_rating(userId: str):
+    '''
+    __get_use_free_ratings_query
+
+    consumes ratings in one statement so concurrent requests can't both spend the same rating
+
+    if there are enough left we decrement, otherwise if the daily reload is due we reload and spend from the fresh
+    batch. LastReload is assigned first because mysql evaluates SET left to right and it has to see the old count.
+    LAST_INSERT_ID(expr) hands the new count back in the OK packet (cursor.lastrowid) so we don't need a read
+
+    params: (n, n, FREE_RATINGS_PER_DAY, n, userId, n, n, FREE_RATINGS_PER_DAY)
+    '''
+    def __get_use_free_ratings_query() -> str:
+        return '''
+            UPDATE UserFreeData
+            SET LastReload = IF(FreeRatingsLeft >= %s, LastReload, NOW()),
+                FreeRatingsLeft = LAST_INSERT_ID(IF(FreeRatingsLeft >= %s, FreeRatingsLeft, %s) - %s)
+            WHERE UserIdFk = %s
+            AND CreatedAt > NOW() - INTERVAL 14 DAY
+            AND (FreeRatingsLeft >= %s OR (LastReload <= NOW() - INTERVAL 1 DAY AND %s <= %s))
+        '''
+    def __get_read_free_data_with_reload_query() -> str:
+        return 'SELECT *, NOW() AS DbNow, LastReload <= NOW() - INTERVAL 1 DAY AS ReloadDue FROM UserFreeData WHERE UserIdFk=%s'
+    def __get_reload_free_data_query() -> str:
+        return 'UPDATE UserFreeData SET FreeRatingsLeft=%s, LastReload=%s WHERE UserIdFk=%s AND LastReload <= NOW() - INTERVAL 1 DAY'
+    '''
+    use_free_resume_ratings
+
+    atomically uses num_ratings free ratings, all or nothing, one round trip
+
+    args:
+        userId: id of the user
+        num_ratings: how many ratings to use, ex: one per resume when comparing all of a users resumes
+    returns:
+        number of free ratings left after this
+    raises:
+        NoFreeRatingsLeft if the user doesn't have enough left (or their free period is over)
+    '''
+    def use_free_resume_ratings(userId: str, num_ratings: int) -> int:
         userId = str(userId) #Sanity check no uuids
-        free_data = UserFreeDataTable.read_free_data(userId)
-        #Add if for any reason its not in there
-        if not free_data:
-            logging.critical(f"COULD NOT FIND USER FREE DATA FOR USERID: {userId}")
-            raise NoFreeRatingsLeft()
-        if datetime.datetime.now() - free_data["CreatedAt"] > timedelta(days=14):
+        if num_ratings < 1:
+            raise ValueError(f"num_ratings must be at least 1, got {num_ratings}")
+        n: int = num_ratings
+        with get_connection(request_scoped=True) as conn:
+            with conn.cursor(dictionary=True) as cursor:
+                query = UserFreeDataTable.__get_use_free_ratings_query()
+                cursor.execute(query, (n, n, UserFreeDataTable.FREE_RATINGS_PER_DAY, n, userId,
+                                       n, n, UserFreeDataTable.FREE_RATINGS_PER_DAY))
+                used: bool = cursor.rowcount == 1
+                ratings_left: int = cursor.lastrowid or 0
+                conn.commit()
+        if not used:
+            logging.info(f"USER {userId} HAS LESS THAN {n} FREE RATINGS LEFT")
             raise NoFreeRatingsLeft()
-        #if we have a non zero number of ratings left
-        if free_data["FreeRatingsLeft"]:
-            #decrement
-            free_data["FreeRatingsLeft"] = free_data["FreeRatingsLeft"] - 1
-            UserFreeDataTable.update_free_data(userId, free_data["FreeRatingsLeft"], free_data["LastReload"])
-            return
-        if datetime.datetime.now() - free_data["LastReload"] > timedelta(days=1):
-            free_data["LastReload"] = datetime.datetime.now()
-            #2 because we're using one here
-            free_data["FreeRatingsLeft"] = 2
-            UserFreeDataTable.update_free_data(userId, free_data["FreeRatingsLeft"], free_data["LastReload"])
-            return
-        raise NoFreeRatingsLeft()
+        return ratings_left
+    '''
+    use_free_resume_rating
+
+    atomically uses one free rating
+
+    args:
+        userId: id of the user
+    returns:
+        number of free ratings left after this
+    raises:
+        NoFreeRatingsLeft if the user is out
+    '''
+    def use_free_resume_rating(userId: str) -> int:
+        return UserFreeDataTable.use_free_resume_ratings(userId, 1)
+    '''
+    get_free_resume_info
+
+    reads the users free data for the client, reloading it first if the daily reload is due
+
+    the reload only writes when it's due (checked against db time) and only if nobody else reloaded first
+
+    args:
+        userId: id of the user
+    returns:
+        dict of the UserFreeData row
+    '''
     def get_free_resume_info(userId: str) -> Dict:
-        free_data: Dict = UserFreeDataTable.read_free_data(userId)
-        if datetime.datetime.now() - free_data["LastReload"] > timedelta(days=1):
-            free_data["LastReload"] = datetime.datetime.now()
-            free_data["FreeRatingsLeft"] = 3
-            UserFreeDataTable.update_free_data(userId, free_data["FreeRatingsLeft"], free_data["LastReload"])
-            return UserFreeDataTable.read_free_data(userId)
+        userId = str(userId) #Sanity check no uuids
+        with get_connection(request_scoped=True) as conn:
+            with conn.cursor(dictionary=True) as cursor:
+                cursor.execute(UserFreeDataTable.__get_read_free_data_with_reload_query(), (userId,))
+                free_data: Dict = cursor.fetchone()
+                if not free_data:
+                    logging.critical(f"COULD NOT FIND USER FREE DATA FOR USERID: {userId}")
+                    return None
+                db_now: datetime.datetime = free_data.pop("DbNow")
+                if free_data.pop("ReloadDue"):
+                    cursor.execute(UserFreeDataTable.__get_reload_free_data_query(), (UserFreeDataTable.FREE_RATINGS_PER_DAY, db_now, userId))
+                    conn.commit()
+                    if cursor.rowcount == 1:
+                        free_data["FreeRatingsLeft"] = UserFreeDataTable.FREE_RATINGS_PER_DAY
+                        free_data["LastReload"] = db_now
+                    else:
+                        #someone reloaded or spent a rating between our read and write, take theirs
+                        cursor.execute(UserFreeDataTable.__get_read_free_data_query(), (userId,))
+                        free_data = cursor.fetchone()
         return free_data
     def is_discountable(user_id: str) -> bool:
         user_free_data: Dict = UserFreeDataTable.read_free_data(user_id)
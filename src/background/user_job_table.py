@@ -7,9 +7,14 @@ from uuid import UUID
 from mysql.connector.cursor import MySQLCursor
 from mysql.connector.connection_cext import CMySQLConnection
 from job import Job
+from job_description_table import JobDescriptionTable
+from sql_columns import SqlColumns
+from sync_tombstone_table import SyncTombstoneTable
+from user_data_version_table import UserDataVersionTable
+from datetime import datetime
 from user_specific_job_data import UserSpecificJobData
 from typing import Dict
-from mysql.connector.types import RowType, RowItemType
+from mysql.connector.types import RowType
 import hashlib
 import logging
 
@@ -82,20 +87,37 @@ class UserJobTable:
     gets the query to read a user_job from the db by user id
 
     args:
-        None
+        with_description: False reads every job column but the description blob, for listings
+        changed_since: True only reads jobs whose user job, job or company changed after a time passed as the
+            second, third and fourth params
     returns:
         string query
     '''
-    def __get_read_user_jobs_query() -> str:
+    def __get_read_user_jobs_query(with_description: bool = True, changed_since: bool = False) -> str:
+        job_columns: str = f"Job.*, {JobDescriptionTable.get_description_column()}" if with_description else UserJobTable.__get_job_summary_columns()
+        description_join: str = "LEFT JOIN JobDescription ON JobDescription.DescriptionHash = Job.DescriptionHash" if with_description else ""
+        changed_filter: str = "AND (UserJob.UpdatedAt > %s OR Job.UpdatedAt > %s OR Company.UpdatedAt > %s)" if changed_since else ""
+        #JobMatchScore repeats UserId and JobId, only take the score so a missing row can't null them out
         return f"""
-        SELECT *
+        SELECT UserJob.*, {job_columns}, Company.*, JobLocation.*, JobMatchScore.BestMatchScore
         FROM UserJob
         JOIN Job ON UserJob.JobId = Job.JobId
         JOIN Company ON Job.Company = Company.CompanyName
         LEFT JOIN JobLocation ON Job.JobId = JobLocation.JobIdFK
-        WHERE UserJob.UserId = %s
+        {description_join}
+        LEFT JOIN JobMatchScore ON UserJob.UserId = JobMatchScore.UserId AND UserJob.JobId = JobMatchScore.JobId
+        WHERE UserJob.UserId = %s {changed_filter}
         ORDER BY UserJob.TimeSelected DESC;
         """
+    '''
+    __get_job_summary_columns
+
+    every Job column but Description, in table order so the dictionary cursor overlaps columns the same way Job.* does
+    '''
+    def __get_job_summary_columns() -> str:
+        return ", ".join(f"Job.{column}" for column in ["JobId", "Applicants", "CareerStage", "Job", "Company", "PaymentBase",
+                                                         "PaymentFreq", "PaymentHigh", "LocationStr", "Mode", "JobPostedAt", "TimeAdded",
+                                                         "DescriptionHash"])
     def __get_read_specific_user_job_query() -> str:
         return f"""
         SELECT *
@@ -104,11 +126,12 @@ class UserJobTable:
         """
     def __get_read_specific_user_job_query_full_join() -> str:
         return f"""
-        SELECT *
+        SELECT *, {JobDescriptionTable.get_description_column()}
         FROM UserJob
         JOIN Job ON UserJob.JobId = Job.JobId
         JOIN Company ON Job.Company = Company.CompanyName
         LEFT JOIN JobLocation ON Job.JobId = JobLocation.JobIdFK
+        LEFT JOIN JobDescription ON JobDescription.DescriptionHash = Job.DescriptionHash
         WHERE UserJobId = %s
         """
     '''
@@ -125,7 +148,7 @@ class UserJobTable:
     def add_user_job(user_id_uuid : UUID | str, job_id : str) -> Job:
         user_id : str = str(user_id_uuid)
         logging.info("ADDING USER JOB WITH USER ID " + user_id + " AND JOB ID OF " + job_id)
-        with get_connection() as conn:
+        with get_connection(request_scoped=True) as conn:
             with conn.cursor(dictionary=True) as cursor:
                 query : str = UserJobTable.__get_add_user_job_query()
                 #Hashing!!! ahhhh Scary!
@@ -134,6 +157,7 @@ class UserJobTable:
                 user_job_id : str = UserJobTable.generate_user_job_id(user_id, job_id)
                 try:
                     cursor.execute(query, (user_job_id, user_id, job_id))
+                    cursor.execute(UserDataVersionTable.get_bump_version_query(), (user_id,))
                 except IntegrityError as e:
                     logging.error("USER JOB ALREADY IN DB")
                 logging.info("USER JOB SUCCESSFULLY ADDED")
@@ -154,14 +178,16 @@ class UserJobTable:
         0 if no error occured
     '''
     def delete_user_job(user_id_uuid : UUID | str, job_id : str) -> int:
-        with get_connection() as conn:
+        with get_connection(request_scoped=True) as conn:
             with conn.cursor(dictionary=True) as cursor:
                 user_id : str = str(user_id_uuid)
                 query : str = UserJobTable.__get_delete_user_job_query()
                 user_job_id : str = UserJobTable.generate_user_job_id(user_id, job_id)
+                cursor.execute(SyncTombstoneTable.get_add_tombstones_query(SyncTombstoneTable.JOB, "UserJob", "UserId", "JobId", "UserJobId = %s"), (user_job_id,))
                 cursor.execute(query, (user_job_id,))
 
                 affected_rows = cursor.rowcount
+                cursor.execute(UserDataVersionTable.get_bump_version_query(), (user_id,))
 
                 if affected_rows == 0:
                     logging.info("No user job found with the specified ID.")
@@ -184,10 +210,11 @@ class UserJobTable:
     '''
     def update_user_job(job_id: str, user_id_uuid: UUID, update_dict: Dict) -> UserSpecificJobData:
         user_job_id = UserJobTable.generate_user_job_id(str(user_id_uuid), job_id)
-        with get_connection() as conn:
+        with get_connection(request_scoped=True) as conn:
             with conn.cursor(dictionary=True) as cursor:
                 query = UserJobTable.__get_update_user_job_by_id(update_dict)
                 cursor.execute(query, (*update_dict.values(), user_job_id))
+                cursor.execute(UserDataVersionTable.get_bump_version_query(), (str(user_id_uuid),))
                 conn.commit()
                 read_query = UserJobTable.__get_read_specific_user_job_query()
                 cursor.execute(read_query, (user_job_id,))
@@ -200,16 +227,38 @@ class UserJobTable:
 
     args:
         user_id the UUID user id
+        with_description: False skips reading the description of every job, job.description is None for these
     returns
         list of all jobs as job object
     '''
-    def get_user_jobs(user_id_uuid: UUID | str) -> list[Job]:
-        with get_connection() as conn:
-            with conn.cursor(dictionary=True) as cursor:
+    def get_user_jobs(user_id_uuid: UUID | str, with_description: bool = True) -> list[Job]:
+        jobs, _ = UserJobTable.get_user_jobs_with_best_scores(user_id_uuid, with_description=with_description)
+        return jobs
+    '''
+    get_user_jobs_with_best_scores
+
+    gets all user jobs and the best resume match score for each in one query
+
+    args:
+        user_id the UUID user id
+        with_description: False skips reading the description of every job, job.description is None for these
+        changed_since: only read jobs whose user job, job or company changed after this db time
+    returns
+        list of all jobs as job object, dict of job id to best match score or None if no resume was compared
+    '''
+    def get_user_jobs_with_best_scores(user_id_uuid: UUID | str, with_description: bool = True,
+                                       changed_since: datetime | None = None) -> tuple[list[Job], Dict[str, int | None]]:
+        with get_connection(request_scoped=True) as conn:
+            #tuples hydrated by position, a dict per row of 40 odd columns is most of what reading a big list costs
+            with conn.cursor() as cursor:
                 user_id : str = str(user_id_uuid)
-                query : str = UserJobTable.__get_read_user_jobs_query()
-                cursor.execute(query, (user_id,))
-                results: list[Dict[str, RowItemType]] = cursor.fetchall()
-                results_list : list[Job] = [Job.create_with_sql_row(row) for row in results]
-        return results_list
+                query : str = UserJobTable.__get_read_user_jobs_query(with_description, changed_since is not None)
+                params : tuple = (user_id,) if changed_since is None else (user_id, changed_since, changed_since, changed_since)
+                cursor.execute(query, params)
+                results: list[tuple] = cursor.fetchall()
+                columns: Dict[str, int] = SqlColumns.for_query(query, cursor)
+        results_list : list[Job] = Job.create_many_with_sql_rows(results, columns)
+        job_id, best_match_score = columns["JobId"], columns["BestMatchScore"]
+        best_scores: Dict[str, int | None] = {row[job_id]: row[best_match_score] for row in results}
+        return results_list, best_scores
     
\ No newline at end of file
@@ -7,6 +7,8 @@ from mysql.connector.cursor import MySQLCursor
 from mysql.connector.connection_cext import CMySQLConnection
 from mysql.connector.errors import IntegrityError
 from mysql.connector.types import RowType, RowItemType
+from user_cache import UserCache
+from user_data_version_table import UserDataVersionTable
 import logging
 
 class UserLocationTable:
@@ -73,7 +75,7 @@ class UserLocationTable:
         0
     '''
     def add_user_location(location: Location, user_id: UUID | str) -> int:
-        with get_connection() as conn:
+        with get_connection(request_scoped=True) as conn:
             with conn.cursor(dictionary=True) as cursor:
                 logging.info("ADDING USER LOCATION")
                 location_json : Dict = location.to_json()
@@ -82,9 +84,11 @@ class UserLocationTable:
                 params = [str(user_id), *list(location_json.values())]
                 try:
                     cursor.execute(query, params)
+                    cursor.execute(UserDataVersionTable.get_bump_version_query(), (str(user_id),))
                     conn.commit()
                 except IntegrityError:
                     logging.info("User location already in db")
+        UserCache.invalidate(user_id=user_id)
         logging.info(f"ADDED USER LOCATION")
         return 0
     '''
@@ -98,7 +102,7 @@ class UserLocationTable:
         location object or none
     '''
     def try_read_location(user_id : UUID | str) -> Location | None:
-        with get_connection() as conn:
+        with get_connection(request_scoped=True) as conn:
             with conn.cursor(dictionary=True) as cursor:
                 logging.info("READING USER LOCATION OBJECT")
                 query : str = UserLocationTable.__get_read_location_query()
@@ -119,7 +123,7 @@ class UserLocationTable:
         new location
     '''
     def update_location(user_id : UUID | str, location_json: Dict) -> Location | None:
-        with get_connection() as conn:
+        with get_connection(request_scoped=True) as conn:
             with conn.cursor(dictionary=True) as cursor:
                 logging.info("UPDATING USER LOCATION OBJECT")
                 update_str : str = UserLocationTable.__get_update_user_location_query(location_json)
@@ -135,7 +139,9 @@ class UserLocationTable:
                 logging.debug(update_str)
                 logging.debug(params)
                 cursor.execute(update_str, params)
+                cursor.execute(UserDataVersionTable.get_bump_version_query(), (str(user_id),))
                 conn.commit()
+        UserCache.invalidate(user_id=user_id)
         return UserLocationTable.try_read_location(user_id)
          
 
@@ -150,9 +156,12 @@ class UserLocationTable:
         0
     '''
     def delete_location(user_id : UUID | str) -> int:
-        with get_connection() as conn:
+        with get_connection(request_scoped=True) as conn:
             with conn.cursor(dictionary=True) as cursor:
                 logging.info("DELETING USER LOCATION OBJECT")
                 query : str = UserLocationTable.__get_delete_location_query()
                 cursor.execute(query, (str(user_id),))
+                cursor.execute(UserDataVersionTable.get_bump_version_query(), (str(user_id),))
+                conn.commit()
+        UserCache.invalidate(user_id=user_id)
         return 0
\ No newline at end of file
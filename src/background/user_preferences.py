@@ -30,6 +30,9 @@ class UserPreferences:
         auto_compare_resume_on_new_job_loaded bool should the script compare your resume on every new job loaded
         save_every_job_by_default bool should the script save every job you look at to localStorage
     '''
+    __slots__ = ("user_id", "desired_pay", "desired_payment_freq", "desired_commute", "desires_remote", "desires_hybrid", "desires_onsite",
+                 "desired_career_stage", "auto_activate_on_new_job_loaded", "auto_compare_resume_on_new_job_loaded", "save_every_job_by_default",
+                 "positive_keywords", "negative_keywords")
     def __init__(self, user_id: UUID, desired_pay: Decimal, desired_payment_freq: PaymentFrequency,
                  desired_commute: int, desires_remote: bool, desires_hybrid: bool, desires_onsite: bool, desired_career_stage: str,
                  auto_activate_on_new_job_loaded: bool, auto_compare_resume_on_new_job_loaded: bool, save_every_job_by_default: bool, 
@@ -7,7 +7,9 @@ from mysql.connector.connection_cext import CMySQLConnection
 from mysql.connector.errors import IntegrityError
 from user_preferences import UserPreferences
 from keyword_table import KeywordTable
+from user_cache import UserCache
 from job import Job
+from user_data_version_table import UserDataVersionTable
 import logging
 
 class UserPreferencesTable:
@@ -76,7 +78,7 @@ class UserPreferencesTable:
     def add_user_preferences(preferences: UserPreferences) -> int:
         logging.info("ADDING USER PREFERENCES WITH USER ID " + str(preferences.user_id))
         KeywordTable.add_keywords(str(preferences.user_id), preferences.positive_keywords, preferences.negative_keywords)
-        with get_connection() as conn:
+        with get_connection(request_scoped=True) as conn:
             with conn.cursor(dictionary=True) as cursor:
                 query : str = UserPreferencesTable.__get_add_user_preferences_query()
                 try:
@@ -94,11 +96,13 @@ class UserPreferencesTable:
                 except IntegrityError as e:
                     logging.error("USER PREFERENCES ALREADY IN DB")
                     raise e
+                cursor.execute(UserDataVersionTable.get_bump_version_query(), (str(preferences.user_id),))
                 logging.info("USER PREFERENCES SUCCESSFULLY ADDED")
                 conn.commit()
+        UserCache.invalidate(user_id=preferences.user_id)
         return 0
     def read_user_preferences(user_id: UUID | str):
-        with get_connection() as conn:
+        with get_connection(request_scoped=True) as conn:
             with conn.cursor(dictionary=True) as cursor:
                 query: str = UserPreferencesTable.__get_read_user_preferences_query()
                 cursor.execute(query, (str(user_id),))
@@ -115,7 +119,7 @@ class UserPreferencesTable:
         0 if no errors occured
     '''
     def update_user_preferences(preferences_json: Dict, user_id: UUID | str) -> int:
-        with get_connection() as conn:
+        with get_connection(request_scoped=True) as conn:
             with conn.cursor(dictionary=True) as cursor:
                 update_str : str = UserPreferencesTable.__get_update_user_preferences_query(preferences_json)
                 #convert the values of our json to a list
@@ -130,7 +134,9 @@ class UserPreferencesTable:
                 logging.debug(update_str)
                 logging.debug(params)
                 cursor.execute(update_str, params)
+                cursor.execute(UserDataVersionTable.get_bump_version_query(), (str(user_id),))
                 conn.commit()
+        UserCache.invalidate(user_id=user_id)
         #return success
         return UserPreferencesTable.read_user_preferences(user_id)
     
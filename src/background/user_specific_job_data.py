@@ -2,6 +2,7 @@
 from datetime import datetime
 from typing import Dict
 from mysql.connector.types import RowType, RowItemType
+from json_writer import JsonWriter
 
 class UserSpecificJobData:
     '''
@@ -17,6 +18,7 @@ class UserSpecificJobData:
         hasApplied: Bool
         timeSelected: datetime
     '''
+    __slots__ = ("is_favorite", "has_applied", "time_selected")
     def __init__(self, isFavorite: bool, hasApplied: bool, timeSelected: datetime):
         self.is_favorite = isFavorite
         self.has_applied = hasApplied
@@ -27,11 +29,35 @@ class UserSpecificJobData:
             "hasApplied": self.has_applied,
             "timeSelected": int(self.time_selected.timestamp()) if self.time_selected is not None else None,
         }
+    '''
+    write_json
+
+    appends the same JSON as JsonWriter.dumps(user_specific_job_data.to_json()), written straight from the fields
+
+    args:
+        out: pieces of JSON, see JsonWriter.write
+    '''
+    def write_json(self, out: list[str]) -> None:
+        out.append(f'{{"isFavorite": {JsonWriter.value(self.is_favorite)}, "hasApplied": {JsonWriter.value(self.has_applied)}, '
+                   f'"timeSelected": {int(self.time_selected.timestamp()) if self.time_selected is not None else "null"}}}')
     @classmethod
     def create_with_json(cls, json_object: Dict) -> 'UserSpecificJobData':
         return cls(json_object["isFavorite"], json_object["hasApplied"], json_object["timeSelected"])
     @classmethod
     def create_with_sql_row(cls, sql_query_row: (Dict[str, RowItemType])) -> 'UserSpecificJobData':
         return cls(sql_query_row["IsFavorite"] == 1, sql_query_row["HasApplied"] == 1, sql_query_row["TimeSelected"])
+    '''
+    create_many_with_sql_rows
+
+    args:
+        sql_query_rows: rows joined with UserJob from fetchall of a plain cursor, see SqlColumns
+        columns: column name to position in the rows
+    returns:
+        list of UserSpecificJobData objects
+    '''
+    @classmethod
+    def create_many_with_sql_rows(cls, sql_query_rows: list[tuple], columns: Dict[str, int]) -> list['UserSpecificJobData']:
+        is_favorite, has_applied, time_selected = columns["IsFavorite"], columns["HasApplied"], columns["TimeSelected"]
+        return [cls(row[is_favorite] == 1, row[has_applied] == 1, row[time_selected]) for row in sql_query_rows]
     
     
\ No newline at end of file
@@ -9,6 +9,8 @@ from mysql.connector.types import RowType, RowItemType
 from typing import Dict
 
 class UserSubscription:
+    __slots__ = ("subscription_id", "user_id", "subscription_object", "stripe_customer_id", "stripe_subscription_id", "created_at",
+                 "current_period_end", "canceled_at", "is_active")
     def __init__(self, subscription_id: int, user_id: str, subscription_type: str, price: int,
                  stripe_customer_id: str, stripe_subscription_id: str, created_at: datetime.datetime, 
                  current_period_end: datetime.datetime | None, canceled_at: datetime.datetime | None=None, is_active: bool=True):
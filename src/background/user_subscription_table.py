@@ -5,6 +5,7 @@ import datetime
 from database_functions import DatabaseFunctions, get_connection
 from typing import Dict
 from user_subscription import UserSubscription
+from entitlement_cache import EntitlementCache
 from auth_logic import decode_user_from_token
 from dateutil.relativedelta import relativedelta
 from mysql.connector.errors import IntegrityError
@@ -41,7 +42,7 @@ class UserSubscriptionTable:
         '''
     def __add_subscription(user_subscription: UserSubscription) -> UserSubscription:
         logging.info("Adding subscription")
-        with get_connection() as conn:
+        with get_connection(request_scoped=True) as conn:
             with conn.cursor(dictionary=True) as cursor:
                 query = UserSubscriptionTable.__get_add_subscription_query()
                 values = (str(user_subscription.user_id), user_subscription.subscription_object.price, user_subscription.subscription_object.subscription_type,
@@ -51,11 +52,12 @@ class UserSubscriptionTable:
                 logging.info("Added subscription")
                 logging.debug(json.dumps(user_subscription.to_json(), indent=2))
                 conn.commit()
+                EntitlementCache.invalidate(user_subscription.user_id)
                 return user_subscription
     def read_subscription(userId: str) -> UserSubscription | None:
         userId = str(userId) #when I forget to convert it to uuid
         logging.info("Reading subscription")
-        with get_connection() as conn:
+        with get_connection(request_scoped=True) as conn:
             with conn.cursor(dictionary=True) as cursor:
                 query = UserSubscriptionTable.__get_read_subscription_query()
                 cursor.execute(query, (userId,))
@@ -65,7 +67,7 @@ class UserSubscriptionTable:
                 return UserSubscription.generate_from_sql_row(query_result)
     def read_subscription_by_stripe_sub_id(stripe_subscription_id: str) -> UserSubscription | None:
         logging.info("Reading subscription")
-        with get_connection() as conn:
+        with get_connection(request_scoped=True) as conn:
             with conn.cursor(dictionary=True) as cursor:
                 query = UserSubscriptionTable.__get_read_subscription_query_by_sub_stripe_id()
                 cursor.execute(query, (stripe_subscription_id,))
@@ -75,7 +77,7 @@ class UserSubscriptionTable:
                 return UserSubscription.generate_from_sql_row(query_result)
     def __update_subscription(user_subscription: UserSubscription) -> UserSubscription:
         logging.info("Updating subscription")
-        with get_connection() as conn:
+        with get_connection(request_scoped=True) as conn:
             with conn.cursor(dictionary=True) as cursor:
                 query = UserSubscriptionTable.__get_update_subscription_query()
                 values = (user_subscription.subscription_object.price, user_subscription.subscription_object.subscription_type,
@@ -85,6 +87,7 @@ class UserSubscriptionTable:
                 cursor.execute(query, values)
                 logging.info("Updated subscription")
                 conn.commit()
+                EntitlementCache.invalidate(user_subscription.user_id)
                 return user_subscription
     def add_or_update_subscription(user_subscription: UserSubscription) -> UserSubscription:
         logging.info("Adding or updating subscription")
@@ -0,0 +1,114 @@
+#(c) 2024 Daniel DeMoney. All rights reserved.
+from user import User
+from resume import Resume
+from user_job_table import UserJobTable
+from resume_table import ResumeTable
+from job_match_score_table import JobMatchScoreTable
+from sync_tombstone_table import SyncTombstoneTable
+from json_writer import JsonView
+from typing import Dict
+import base64
+import binascii
+import datetime
+import hashlib
+import json
+import os
+import logging
+
+class UserSync:
+    '''
+    UserSync
+
+    Builds the response of /databases/sync_user_data, everything about a user that changed since the clients last
+    sync instead of all of it.
+
+    The client gets back an opaque cursor and sends it on the next sync. It holds the db time the sync was read at
+    and a hash of the profile (user columns aren't timestamped, they're tiny, comparing a hash is enough). Times come
+    from the db clock so they compare with the UpdatedAt and DeletedAt columns. The cursor is moved back by
+    OVERLAP_SECONDS so a write committed just after we read but stamped just before isn't missed, the client gets a
+    few rows twice instead.
+
+    Without a cursor, with one we can't read, or one older than the tombstones we keep, the client gets a full sync
+    ("full": True) and should replace what it has.
+    '''
+    OVERLAP_SECONDS: float = float(os.environ.get("SYNC_OVERLAP_SECONDS", 5))
+    '''
+    hash_profile
+
+    args:
+        user: the user
+    returns:
+        sha256 of the users json, changes whenever the profile the client has would
+    '''
+    def hash_profile(user: User) -> str:
+        return hashlib.sha256(json.dumps(user.to_json(), sort_keys=True, default=str).encode("utf-8")).hexdigest()
+    def encode_cursor(synced_at: datetime.datetime, profile_hash: str) -> str:
+        return base64.urlsafe_b64encode(f"{synced_at.isoformat()}|{profile_hash}".encode("utf-8")).decode("ascii")
+    '''
+    decode_cursor
+
+    args:
+        cursor: cursor from a previous sync
+    returns:
+        (db time of the sync, profile hash), None if the cursor isn't one of ours
+    '''
+    def decode_cursor(cursor: str) -> tuple[datetime.datetime, str] | None:
+        try:
+            synced_at, profile_hash = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split("|")
+            synced_at_time: datetime.datetime = datetime.datetime.fromisoformat(synced_at)
+        except (ValueError, UnicodeError, binascii.Error):
+            logging.info("COULDN'T DECODE SYNC CURSOR")
+            return None
+        #ours are naive db times, one with a timezone was edited and can't be compared to them
+        if synced_at_time.tzinfo is not None:
+            logging.info("SYNC CURSOR HAS A TIMEZONE, NOT ONE OF OURS")
+            return None
+        return synced_at_time, profile_hash
+    '''
+    get_user_sync
+
+    args:
+        user: the user syncing
+        cursor: cursor from the clients last sync, None for a full sync
+        include_descriptions: False sends jobs without their descriptions
+    returns:
+        body with the new cursor, if this is a full sync, the user if their profile changed, changed jobs, resumes
+        and best scores, and the ids of deleted ones, jobs and the user as models for JsonWriter
+    '''
+    def get_user_sync(user: User, cursor: str | None, include_descriptions: bool) -> Dict:
+        now: datetime.datetime = SyncTombstoneTable.read_now()
+        profile_hash: str = UserSync.hash_profile(user)
+        decoded: tuple[datetime.datetime, str] | None = UserSync.decode_cursor(cursor) if cursor else None
+        since: datetime.datetime | None = decoded[0] if decoded else None
+        if since is not None and since < now - datetime.timedelta(days=SyncTombstoneTable.RETENTION_DAYS):
+            logging.info("SYNC CURSOR IS OLDER THAN OUR TOMBSTONES, SENDING EVERYTHING")
+            since = None
+        jobs, best_resume_scores = UserJobTable.get_user_jobs_with_best_scores(user.user_id, with_description=include_descriptions, changed_since=since)
+        resumes: list[Resume] = ResumeTable.read_user_resumes_metadata(user.user_id, changed_since=since)
+        deleted: Dict[str, list[str]] = {SyncTombstoneTable.JOB: [], SyncTombstoneTable.RESUME: [], SyncTombstoneTable.SCORE: []}
+        if since is not None:
+            #scores change without their job changing
+            best_resume_scores.update(JobMatchScoreTable.read_user_match_scores(user.user_id, changed_since=since))
+            deleted = SyncTombstoneTable.read_tombstones(user.user_id, since)
+            #deleted then added again since the last sync, the row we're sending wins
+            job_ids: set[str] = {job.job_id for job in jobs}
+            resume_ids: set[str] = {str(resume.id) for resume in resumes}
+            deleted[SyncTombstoneTable.JOB] = [job_id for job_id in deleted[SyncTombstoneTable.JOB] if job_id not in job_ids]
+            deleted[SyncTombstoneTable.RESUME] = [resume_id for resume_id in deleted[SyncTombstoneTable.RESUME] if resume_id not in resume_ids]
+            deleted[SyncTombstoneTable.SCORE] = [job_id for job_id in deleted[SyncTombstoneTable.SCORE] if best_resume_scores.get(job_id) is None]
+        sync_json: Dict = {
+            "cursor": UserSync.encode_cursor(now - datetime.timedelta(seconds=UserSync.OVERLAP_SECONDS), profile_hash),
+            "full": since is None,
+            "jobs": [JsonView(job, include_description=include_descriptions) for job in jobs],
+            "resumes": [resume.to_metadata_json() for resume in resumes],
+            "bestResumeScores": best_resume_scores,
+            "deleted": {
+                "jobs": deleted[SyncTombstoneTable.JOB],
+                "resumes": deleted[SyncTombstoneTable.RESUME],
+                "bestResumeScores": deleted[SyncTombstoneTable.SCORE]
+            }
+        }
+        if since is None or decoded[1] != profile_hash:
+            sync_json["user"] = user
+        logging.info(f"SYNCING {len(jobs)} JOBS, {len(resumes)} RESUMES, {sum(len(ids) for ids in deleted.values())} DELETES")
+        return sync_json
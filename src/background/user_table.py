@@ -2,11 +2,13 @@
 from collections import OrderedDict
 from database_functions import DatabaseFunctions, get_connection
 import json
-from user import User
+from user import User, AuthUser
+from user_cache import UserCache
 from mysql.connector.cursor import MySQLCursor
 from mysql.connector.connection_cext import CMySQLConnection
 from mysql.connector.types import RowType, RowItemType
 from typing import Dict
+from user_data_version_table import UserDataVersionTable
 import logging
 
 class UserTable:
@@ -31,6 +33,20 @@ class UserTable:
             WHERE Email = %s;
         """
     '''
+    get_read_auth_user_by_email_query
+
+    args:
+        None
+    returns:
+        sql query to read only what auth needs, Email is unique so this is a single index lookup
+    '''
+    def __get_read_auth_user_by_email_query() -> str:
+        return """
+            SELECT UserId, Email, Password, GoogleId, Salt
+            FROM User
+            WHERE Email = %s;
+        """
+    '''
     get_read_user_by_id_query
 
     args:
@@ -116,7 +132,7 @@ class UserTable:
         User with data from sql query
     '''
     def read_user_by_email(email: str) -> User | None:
-        with get_connection() as conn:
+        with get_connection(request_scoped=True) as conn:
             with conn.cursor(dictionary=True) as cursor:
                 query: str = UserTable.__get_read_user_by_email_query()
                 cursor.execute(query, (email,))
@@ -127,6 +143,27 @@ class UserTable:
         logging.debug("READ USER WITH EMAIL " + email + " GOT "+ str(result))
         return User.create_with_sql_row(result)
     '''
+    read_auth_user_by_email
+
+    reads the lean auth projection of a user, the full profile is only loaded if something asks for it
+
+    args:
+        email: string email of a user
+
+    returns:
+        AuthUser with data from sql query
+    '''
+    def read_auth_user_by_email(email: str) -> AuthUser | None:
+        with get_connection(request_scoped=True) as conn:
+            with conn.cursor(dictionary=True) as cursor:
+                query: str = UserTable.__get_read_auth_user_by_email_query()
+                cursor.execute(query, (email,))
+                result: (Dict[str, RowItemType]) = cursor.fetchone()
+        if not result:
+            logging.info("COULD NOT FIND USER IN DB WITH EMAIL " + email)
+            return None
+        return AuthUser.create_with_sql_row(result, lambda: UserTable.read_user_by_email(email))
+    '''
     read_user_by_id
 
     args:
@@ -136,7 +173,7 @@ class UserTable:
         User with data from sql query
     '''
     def read_user_by_id(user_id: str) -> User | None:
-        with get_connection() as conn:
+        with get_connection(request_scoped=True) as conn:
             with conn.cursor(dictionary=True) as cursor:
                 query: str = UserTable.__get_read_user_by_id_query()
                 cursor.execute(query, (user_id,))
@@ -155,7 +192,7 @@ class UserTable:
         User object with data from looking up google id in our db
     '''
     def read_user_by_googleId(googleId: str) -> User:
-        with get_connection() as conn:
+        with get_connection(request_scoped=True) as conn:
             with conn.cursor(dictionary=True) as cursor:
                 query : str = UserTable.__get_read_user_by_googleId_query()
                 cursor.execute(query, (googleId,))
@@ -170,7 +207,7 @@ class UserTable:
         int, 0 if all went well
     '''
     def add_user(user: User) -> int:
-        with get_connection() as conn:
+        with get_connection(request_scoped=True) as conn:
             with conn.cursor(dictionary=True) as cursor:
                 user_json : Dict = user.to_json()
                 query : str = UserTable.__get_add_user_query()
@@ -205,12 +242,13 @@ class UserTable:
         int, 0 if all went well
     '''
     def delete_user_by_email(email: str) -> int:
-        with get_connection() as conn:
+        with get_connection(request_scoped=True) as conn:
             with conn.cursor(dictionary=True) as cursor:
                 query : str = UserTable.__get_delete_user_by_email_query()
                 cursor.execute(query, (email,))
                 logging.info("USER SUCCESSFULLY DELETED")
                 conn.commit()
+        UserCache.invalidate(email=email)
         return 0
     '''
     reset_user_password
@@ -222,10 +260,12 @@ class UserTable:
             The users new password
     '''
     def reset_user_password(user_id, new_password):
-        with get_connection() as conn:
+        with get_connection(request_scoped=True) as conn:
             with conn.cursor(dictionary=True) as cursor:
                 query : str = UserTable.__get_reset_password_query()
                 cursor.execute(query, (new_password, str(user_id)))
+                cursor.execute(UserDataVersionTable.get_bump_version_query(), (str(user_id),))
                 logging.info(f"USER {user_id} PASSWORD SUCCESSFULLY CHANGED")
                 conn.commit()
+        UserCache.invalidate(user_id=user_id)
         return 0
\ No newline at end of file
@@ -0,0 +1,49 @@
+#(c) 2024 Daniel DeMoney. All rights reserved.
+import sys
+import os
+import time
+import zlib
+import zstandard
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'background')))
+from compression_codec import CompressionCodec
+
+#COMPARES ZLIB, PLAIN ZSTD AND DICTIONARY ZSTD ON A SAMPLE OF JOB DESCRIPTIONS (OR RESUME TEXTS)
+#trains on half the sample and measures on the other half so the dictionary never sees what it compresses
+#run from the repo root, needs the db: python src/tests/compression_benchmark.py [job_description|resume_text] [samples]
+#or on a folder of .txt files: python src/tests/compression_benchmark.py --dir <folder>
+def read_corpus():
+    if len(sys.argv) > 2 and sys.argv[1] == "--dir":
+        texts = []
+        for file_name in sorted(os.listdir(sys.argv[2])):
+            if file_name.endswith(".txt"):
+                with open(os.path.join(sys.argv[2], file_name), encoding="utf-8") as f:
+                    texts.append(f.read())
+        return texts
+    from compression_dictionary_trainer import read_samples
+    dictionary = sys.argv[1] if len(sys.argv) > 1 else CompressionCodec.JOB_DESCRIPTION
+    return read_samples(dictionary, int(sys.argv[2]) if len(sys.argv) > 2 else 4000)
+def measure(name, compress, decompress, texts, runs=5):
+    raw = [text.encode("utf-8") for text in texts]
+    compressed = [compress(data) for data in raw]
+    raw_size = sum(len(data) for data in raw)
+    compressed_size = sum(len(data) for data in compressed)
+    st = time.perf_counter()
+    for _ in range(runs):
+        for data in compressed:
+            decompress(data)
+    decode_seconds = (time.perf_counter() - st) / runs
+    print(f"    {name:<10} ratio {raw_size / compressed_size:6.2f}x  avg row {compressed_size / len(raw):8.1f} bytes  decode {raw_size / decode_seconds / 1e6:8.1f} MB/s")
+def compression_benchmark():
+    texts = read_corpus()
+    assert(len(texts) >= 20)
+    train, test = texts[::2], texts[1::2]
+    print(f"BENCHMARKING COMPRESSION, TRAINED ON {len(train)} TEXTS, MEASURED ON {len(test)}")
+    compression_dict = zstandard.train_dictionary(112640, [text.encode("utf-8") for text in train])
+    plain = zstandard.ZstdCompressor(level=CompressionCodec.LEVEL)
+    with_dict = zstandard.ZstdCompressor(level=CompressionCodec.LEVEL, dict_data=compression_dict)
+    measure("zlib", zlib.compress, zlib.decompress, test)
+    measure("zstd", plain.compress, zstandard.ZstdDecompressor().decompress, test)
+    measure("zstd+dict", with_dict.compress, zstandard.ZstdDecompressor(dict_data=compression_dict).decompress, test)
+
+if __name__ == "__main__":
+    compression_benchmark()
@@ -0,0 +1,54 @@
+#(c) 2024 Daniel DeMoney. All rights reserved.
+import sys
+import os
+import time
+import json
+import tracemalloc
+import datetime
+from decimal import Decimal
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'background')))
+from json_writer import JsonWriter, JsonView
+from job import Job, PaymentFrequency, Mode
+from company import Company
+from location import Location
+from user_specific_job_data import UserSpecificJobData
+
+#COMPARES JSON.DUMPS OF TO_JSON DICTS (HOW BODIES WERE BUILT) WITH JSONWRITER'S WRITE_JSON ON A USERS WORTH OF JOBS
+#checks the two give the same bytes first. Needs the packages in requirements.txt but no database or .env: python src/tests/json_benchmark.py [jobs] [runs]
+def make_jobs(count):
+    jobs = []
+    posted_at = datetime.datetime(2024, 8, 23, 17, 16, 57)
+    for i in range(count):
+        company = Company(f"Company {i % 50}", Decimal("3.5"), Decimal("3.9"), Decimal("4.1"), Decimal("3.2"), Decimal("4.0"),
+                          Decimal("3.8"), Decimal("3.3"), Decimal("3.7"), Decimal("3.9"), f"https://www.glassdoor.com/Overview/{i % 50}.htm")
+        location = Location(f"{i} Infinite Loop, Cupertino, CA 95014", "Cupertino", "95014", "CA", 37.3318 + i / 1e4, -122.0312)
+        user_data = UserSpecificJobData(i % 3 == 0, i % 5 == 0, posted_at + datetime.timedelta(minutes=i))
+        description = f"Job {i}: we're hiring a \"specification sales\" rep. Café hours, 401k & more.\n" * 40
+        jobs.append(Job(f"job{i:06d}", 100 + i, "Mid-Senior level", f"Specification Sales {i}", company, description,
+                        Decimal("85000.00"), PaymentFrequency.YEARLY, Decimal("120000.50"), "Cupertino, CA",
+                        Mode(i % 3 + 1), posted_at, posted_at + datetime.timedelta(hours=i), location, user_data))
+    return jobs
+def measure(name, dumps, runs):
+    tracemalloc.start()
+    body = dumps()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    times = []
+    for _ in range(runs):
+        st = time.perf_counter()
+        dumps()
+        times.append(time.perf_counter() - st)
+    seconds = min(times)
+    print(f"    {name:<24} best {seconds * 1000:8.2f} ms  mean {sum(times) / runs * 1000:8.2f} ms  {len(body) / seconds / 1e6:8.1f} MB/s  peak {(peak - len(body)) / 1e6:6.2f} MB besides the body")
+def json_benchmark():
+    jobs = make_jobs(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    for include_description in (True, False):
+        expected = json.dumps({"jobs": [job.to_json(include_description=include_description) for job in jobs]})
+        assert(JsonWriter.dumps({"jobs": [JsonView(job, include_description=include_description) for job in jobs]}) == expected)
+        print(f"BENCHMARKING {len(jobs)} JOBS {'WITH' if include_description else 'WITHOUT'} DESCRIPTIONS, {len(expected)} BYTES")
+        measure("json.dumps(to_json)", lambda: json.dumps({"jobs": [job.to_json(include_description=include_description) for job in jobs]}), runs)
+        measure("JsonWriter", lambda: JsonWriter.dumps({"jobs": [JsonView(job, include_description=include_description) for job in jobs]}), runs)
+
+if __name__ == "__main__":
+    json_benchmark()
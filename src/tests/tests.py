@@ -4,9 +4,11 @@ import re
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'background')))
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), 'mocks')))
 import json
+import zlib
 import asyncio
 from auth_logic import decode_user_from_token, get_token
 from datetime import timedelta
+import datetime
 from uuid import uuid1
 from user_table import UserTable
 from user import User
@@ -14,8 +16,13 @@ from company import Company
 from company_table import CompanyTable
 from job import Job
 from job_table import JobTable
+from job_description_table import JobDescriptionTable
 from user_job_table import UserJobTable
+from user_sync import UserSync
+from user_data_version_table import UserDataVersionTable
 from resume_table import Resume, ResumeTable
+from blob_store import BlobStore
+from compression_codec import CompressionCodec
 from user_free_data_table import UserFreeDataTable
 from objects import MockObjects
 from user_preferences import UserPreferences
@@ -25,9 +32,14 @@ from location import Location
 from user_preferences_table import UserPreferencesTable
 from user_subscription_table import UserSubscriptionTable
 from resume_comparison_collection import ResumeComparisonCollection
+from job_match_score_table import JobMatchScoreTable
 from resume_nlp.resume_comparison import ResumeComparison
 from relocation_data_grabber import RelocationDataGrabber
+from response_encoding import ResponseEncoding
+from json_writer import JsonWriter, JsonView
+from request_timing import RequestTiming
 from errors import DuplicateUserJob, NoFreeRatingsLeft
+from user_cache import UserCache
 
 
 #TESTS JUST DB CODE, NO SERVERS
@@ -167,6 +179,14 @@ def user_tests():
     assert(str(user.user_id) == str(read_user.user_id))
     print("SUCEEDED READING USER BACK \n \n")
 
+    print("TESTING READING AUTH USER")
+    auth_user = UserTable.read_auth_user_by_email(user.email)
+    assert(str(user.user_id) == str(auth_user.user_id))
+    assert(user.password == auth_user.password)
+    assert(user.salt == auth_user.salt)
+    assert(auth_user.to_json() == read_user.to_json())
+    print("SUCEEDED READING AUTH USER AND LAZY PROFILE \n \n")
+
     print("TESTING DUMPING USER OBJECT TO JSON")
     read_user_json = read_user.to_json()
     print("Read user " + json.dumps(read_user_json))
@@ -231,6 +251,35 @@ def job_tests(user_id):
     assert(JobTable.read_job_by_id(job_data["jobId"]) is not None)
     print("SUCCESSFULLY ADDED JOB WITH A NEW COMPANY \n\n")
 
+    print("TESTING JOB DESCRIPTION COMPRESSION")
+    assert(JobTable.read_job_by_id(job_data["jobId"]).description == job_data["description"])
+    #descriptions written before CompressionCodec are plain zlib
+    assert(CompressionCodec.decompress_text(zlib.compress(job_data["description"].encode("utf-8"))) == job_data["description"])
+    print("JOB DESCRIPTION COMPRESSION PASSED \n\n")
+
+    print("TESTING JSON WRITER MATCHES JSON.DUMPS")
+    job = JobTable.read_job_by_id(job_data["jobId"])
+    assert(JsonWriter.dumps(job) == json.dumps(job.to_json()))
+    assert(JsonWriter.dumps({"jobs": [JsonView(job, include_description=False)]}) == json.dumps({"jobs": [job.to_json(include_description=False)]}))
+    print("JSON WRITER MATCHED \n\n")
+
+    print("TESTING REPOSTED JOB SHARES ITS DESCRIPTION")
+    repost_data = dict(job_data)
+    repost_data["jobId"] = job_data["jobId"] + "1"
+    repost_data["description"] = "  " + job_data["description"].upper() + "!"
+    JobTable.add_job_with_foreign_keys(Job.create_with_json(repost_data), user_id)
+    repost = JobTable.read_job_by_id(repost_data["jobId"])
+    assert(repost.description_hash == JobTable.read_job_by_id(job_data["jobId"]).description_hash)
+    assert(set(JobDescriptionTable.read_job_ids_with_description(repost.description_hash)) == {job_data["jobId"], repost_data["jobId"]})
+    JobTable.delete_job_by_id(repost_data["jobId"])
+    print("REPOSTED JOB SHARED ITS DESCRIPTION \n\n")
+
+    print("TESTING RE-ADDING A JOB")
+    _, job_new, user_job_new = JobTable.upsert_job_with_foreign_keys(Job.create_with_json(job_data), user_id)
+    assert(not job_new)
+    assert(not user_job_new)
+    print("SUCCESSFULLY RE-ADDED JOB WITHOUT DUPLICATING IT \n\n")
+
     print("TESTING DELETING JOBS")
     JobTable.delete_job_by_id(job_data["jobId"])
     assert(CompanyTable.read_company_by_id("Apple") is not None)
@@ -283,13 +332,34 @@ def user_job_tests(user_id):
             print(f"{result.job_name} not found in job_strs")
             assert(False)
     print("USER JOBS SUCCESSFULLY READ")
+    print("TESTING READING USER JOB SUMMARIES")
+    summaries = UserJobTable.get_user_jobs(user_id, with_description=False)
+    assert([summary.job_id for summary in summaries] == [result.job_id for result in results])
+    for summary in summaries:
+        assert(not summary.has_description() and summary.description is None)
+        assert("description" not in summary.to_json(include_description=False))
+    assert(results[0].description == job_data["description"])
+    print("USER JOB SUMMARIES SUCCESSFULLY READ")
     #test that deleting the job deletes the user job
     print("TESTING DELETING JOB AND READING USER JOB")
+    user = UserTable.read_user_by_id(user_id)
+    first_sync = UserSync.get_user_sync(user, None, False)
+    assert(first_sync["full"] and len(first_sync["jobs"]) == len(job_strs) and "user" in first_sync)
+    version = UserDataVersionTable.read_version(user_id)
+    assert(version > 0)
     JobTable.delete_job_by_id(job_id[2])
+    assert(UserDataVersionTable.read_version(user_id) > version)
     results = UserJobTable.get_user_jobs(user_id)
     for result in results:
         assert(result.job_id != job_id[2])
     print("USER JOB SUCCESSFULLY DELETED \n\n")
+    print("TESTING SYNCING THE DELETE")
+    sync = UserSync.get_user_sync(user, first_sync["cursor"], False)
+    assert(not sync["full"] and "user" not in sync)
+    assert(job_id[2] in sync["deleted"]["jobs"])
+    print("DELETE SUCCESSFULLY SYNCED")
+    edited_cursor = UserSync.encode_cursor(datetime.datetime.now(datetime.timezone.utc), "edited")
+    assert(UserSync.decode_cursor(edited_cursor) is None and UserSync.get_user_sync(user, edited_cursor, False)["full"])
     #double adds
     print("ATTEMPTING TO DOUBLE ADD A USER JOB")
     job_data_copy = job_data
@@ -316,7 +386,7 @@ def resume_tests(user_id):
     print("RUNNING RESUME TESTS")
     print("TESTING THAT WE CAN PROPERLY READ DOCX TEST")
     with open(os.getcwd() + "/src/tests/mocks/resume.docx", "rb") as doc:
-        resume = Resume(None, None, "resume.docx", "docx", doc, None)
+        resume = Resume(None, None, "resume.docx", "docx", doc.read(), None)
         if normalize_string(resume.file_text) != normalize_string(MockObjects.docx_resume_text):
             print("DOCX TEXT OF " + MockObjects.docx_resume_text)
             print("IS NOT EQUAL TO " + resume.file_text)
@@ -339,10 +409,24 @@ def resume_tests(user_id):
     assert(resume.file_content == reread_resume.file_content)
     assert(resume.file_text == reread_resume.file_text)
     assert(resume.file_name == reread_resume.file_name)
+    assert(reread_resume.content_hash == resume.get_content_hash())
+    assert(reread_resume.file_hash == BlobStore.hash_bytes(resume.file_content))
+    assert(BlobStore.exists(reread_resume.file_hash))
+    print("TEST PASSED")
+    print("TESTING READING RESUME METADATA")
+    resume_metadata = ResumeTable.read_user_resumes_metadata(dummy_user_id)[0]
+    assert(not resume_metadata.has_file_text())
+    assert(resume_metadata.file_hash == reread_resume.file_hash)
+    assert(resume_metadata.to_metadata_json()["contentHash"] == reread_resume.content_hash)
+    assert("fileContent" not in resume_metadata.to_metadata_json())
+    print("TEST PASSED")
+    print("TESTING COUNTING RESUMES")
+    assert(ResumeTable.count_user_resumes(dummy_user_id) == 1)
     print("TEST PASSED")
     print("TESTING DELETING A RESUME")
-    ResumeTable.delete_resume(reread_resume.id)
+    ResumeTable.delete_resume(reread_resume.id, dummy_user_id)
     assert(len(ResumeTable.read_user_resumes(dummy_user_id)) == 0)
+    assert(ResumeTable.count_user_resumes(dummy_user_id) == 0)
     print("TEST PASSED")
 def user_preferences_tests(user_id):
     print("RUNNING USER PREFERENCE TESTS")
@@ -382,10 +466,25 @@ def user_preferences_tests(user_id):
     assert(user.preferences.auto_compare_resume_on_new_job_loaded == False)
     assert(user.preferences.save_every_job_by_default == False)
     print("SUCCESSFULLY READ BACK USER PREFERENCES AFTER UPDATE")
+def user_cache_tests(user_id):
+    print("RUNNING USER CACHE TESTS")
+    UserCache.clear()
+    user: User = UserTable.read_user_by_email("dandemoney@gmail.com")
+    token = get_token(user)
+    decoded_user: User = decode_user_from_token(token)
+    assert(str(decoded_user.user_id) == str(user_id))
+    assert(decode_user_from_token(token) is decoded_user)
+    print("SUCCESSFULLY READ USER FROM CACHE")
+    UserPreferencesTable.update_user_preferences({"desiredCommute": 60}, user_id)
+    decoded_user = decode_user_from_token(token)
+    assert(decoded_user.preferences.desired_commute == 60)
+    print("SUCCESSFULLY INVALIDATED USER AFTER UPDATE")
+    UserPreferencesTable.update_user_preferences({"desiredCommute": 45}, user_id)
 def resume_comparison_tests(user_id):
     mockJobId = "15421588"
     mockResumeId = 124591
     print("RUNNING RESUME COMPARISON TESTS")
+    ResumeComparisonCollection.ensure_indexes()
     with open(os.getcwd() + "/src/tests/mocks/resume.pdf", "rb") as doc:
         pdf_bytes = doc.read()
         #Example id
@@ -405,12 +504,42 @@ def resume_comparison_tests(user_id):
     print(len(resume_comparisons))
     assert(len(resume_comparisons) == 1)
     reread_resume_comparison = resume_comparisons[0]
+    del reread_resume_comparison["_id"]
     assert(reread_resume_comparison == resume_comparison)
     print("SUCCESSFULLY READ A RESUME COMPARISON")
+    print("TESTING BEST MATCH SCORE WAS RECORDED")
+    match_scores = JobMatchScoreTable.read_user_match_scores(user_id)
+    assert(match_scores[mockJobId] == resume_comparison["matchScore"])
+    print("TESTING RERUNNING A RESUME COMPARISON REPLACES IT")
+    lower_comparison = dict(resume_comparison, matchScore=resume_comparison["matchScore"] - 1)
+    ResumeComparisonCollection.add_resume_comparison(lower_comparison)
+    assert(len(ResumeComparisonCollection.read_job_resume_comparisons(mockJobId, user_id)) == 1)
+    assert(ResumeComparisonCollection.read_specific_resume_comparison(mockJobId, mockResumeId)["matchScore"] == lower_comparison["matchScore"])
+    assert(JobMatchScoreTable.read_user_match_scores(user_id)[mockJobId] == lower_comparison["matchScore"])
+    print("SUCCESSFULLY REPLACED RESUME COMPARISON")
+    ResumeComparisonCollection.delete_job_resume_comparisons(mockJobId, user_id)
+    assert(mockJobId not in JobMatchScoreTable.read_user_match_scores(user_id))
+    print("SUCCESSFULLY RECORDED BEST MATCH SCORE")
 def relocation_grabber_tests():
     #172 N Main St, Wallingford, VT 05773
     location = Location("210 E 46th St", "New York", "10017", "NY", 40.75281, -73.97210)
-    asyncio.run(RelocationDataGrabber.get_data(location)) 
+    relocation_data = asyncio.run(RelocationDataGrabber.get_data(location)) 
+    print("TESTING MAP IMAGES STAY LATIN1 STRINGS IN JSON")
+    assert(isinstance(relocation_data["mapImage"], bytes))
+    assert(json.loads(ResponseEncoding.dumps(relocation_data))["mapImage"].encode("latin1") == relocation_data["mapImage"])
+    print("MAP IMAGE SUCCESSFULLY ENCODED")
+def request_timing_tests():
+    print("TESTING REQUEST TIMING PERCENTILES ACROSS WORKERS")
+    for ms in range(1, 101):
+        RequestTiming.record("GET /tests/request_timing", ms / 1000, {RequestTiming.MYSQL: ms / 2000})
+    histograms = RequestTiming.snapshot()
+    route = RequestTiming.summarize(RequestTiming.merge([histograms, histograms]))["GET /tests/request_timing"]
+    assert(route[RequestTiming.TOTAL]["count"] == 200)
+    #buckets are BUCKET_GROWTH apart, so a percentile is at most that far over
+    assert(50 <= route[RequestTiming.TOTAL]["p50Ms"] <= 50 * RequestTiming.BUCKET_GROWTH)
+    assert(99 <= route[RequestTiming.TOTAL]["p99Ms"] <= 100)
+    assert(route[RequestTiming.MYSQL]["maxMs"] == 50)
+    print("REQUEST TIMING PERCENTILES PASSED")
 def subscription_tests():
     print("Testing subscription logic")
     subscription: Subscription = Subscription("pro")
@@ -482,16 +611,29 @@ def user_free_data_tests(user_id):
     except NoFreeRatingsLeft:
         pass
     print("Test Suceeded")
+    print("Testing using a batch of resume ratings")
+    UserFreeDataTable.update_free_data(user_id, 3, time_last_updated)
+    try:
+        UserFreeDataTable.use_free_resume_ratings(user_id, 4)
+        assert(False)
+    except NoFreeRatingsLeft:
+        pass
+    assert(UserFreeDataTable.use_free_resume_ratings(user_id, 2) == 1)
+    assert(UserFreeDataTable.read_free_data(user_id)["FreeRatingsLeft"] == 1)
+    assert(UserFreeDataTable.use_free_resume_rating(user_id) == 0)
+    print("Test Suceeded")
 
 
 if __name__ == "__main__":
     relocation_grabber_tests()
+    request_timing_tests()
     user_id = user_tests()
     company_tests()
     job_tests(user_id)
     user_job_tests(user_id)
     resume_tests(user_id)
     user_preferences_tests(user_id)
+    user_cache_tests(user_id)
     resume_comparison_tests(user_id)
     subscription_tests()
     user_subscription_tests(user_id)
@@ -0,0 +1,49 @@
+#(c) 2024 Daniel DeMoney. All rights reserved.
+import sys
+import os
+import re
+import time
+import statistics
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'background')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), 'mocks')))
+from difflib import SequenceMatcher
+from objects import MockObjects
+from text_extraction import TextExtraction
+
+#BENCHMARKS THE PYPDF FAST PATH AGAINST TIKA ON THE MOCK RESUMES, NEEDS A TIKA SERVER
+#run from the repo root: python src/tests/text_extraction_benchmark.py [runs]
+MOCK_PDFS = ["resume.pdf", "redumpedResume.pdf"]
+
+def normalize_string(s):
+    return re.sub(r'[^a-z0-9]', '', s.lower())
+def similarity(text):
+    #how close the extracted text is to the text we know is in the mock resume
+    return SequenceMatcher(None, normalize_string(text or ""), normalize_string(MockObjects.pdf_resume_text)).ratio()
+def time_path(extract, pdf_bytes, runs):
+    timings = []
+    text = None
+    for _ in range(runs):
+        st = time.perf_counter()
+        text = extract(pdf_bytes)
+        timings.append((time.perf_counter() - st) * 1000)
+    return timings, text
+def print_result(name, timings, text):
+    print(f"    {name:<6} mean {statistics.mean(timings):8.2f}ms  median {statistics.median(timings):8.2f}ms  max {max(timings):8.2f}ms  similarity {similarity(text):.3f}")
+def text_extraction_benchmark(runs):
+    print(f"BENCHMARKING TEXT EXTRACTION OVER {runs} RUNS")
+    #first tika call can include server start up, don't count it
+    TextExtraction.extract_text_with_tika(b"warm up")
+    for file_name in MOCK_PDFS:
+        with open(os.getcwd() + "/src/tests/mocks/" + file_name, "rb") as doc:
+            pdf_bytes = doc.read()
+        print(file_name)
+        fast_timings, fast_text = time_path(TextExtraction.extract_pdf_text_fast, pdf_bytes, runs)
+        assert(fast_text is not None)
+        print_result("pypdf", fast_timings, fast_text)
+        tika_timings, tika_text = time_path(TextExtraction.extract_text_with_tika, pdf_bytes, runs)
+        print_result("tika", tika_timings, tika_text)
+        print(f"    pypdf is {statistics.median(tika_timings) / statistics.median(fast_timings):.1f}x faster (median)")
+    print(TextExtraction.stats())
+
+if __name__ == "__main__":
+    text_extraction_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,73 @@
+#(c) 2024 Daniel DeMoney. All rights reserved.
+import sys
+import os
+import time
+import gc
+import tracemalloc
+import datetime
+from decimal import Decimal
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'background')))
+from job import Job
+from sql_columns import SqlColumns
+
+#COMPARES HYDRATING A USERS SAVED JOBS FROM DICTIONARY CURSOR ROWS (ONE CREATE_WITH_SQL_ROW PER ROW, HOW IT WAS DONE)
+#WITH TUPLE ROWS AND CREATE_MANY_WITH_SQL_ROWS, TIME AND MEMORY
+#rows are laid out like UserJobTable's summary query. Needs the packages in requirements.txt but no database or .env: python src/tests/user_jobs_benchmark.py [jobs] [runs]
+#or against the db for a real user: python src/tests/user_jobs_benchmark.py --user <user id> [runs]
+COLUMNS = ["UserJobId", "JobId", "UserId", "IsFavorite", "HasApplied", "TimeSelected", "UpdatedAt",
+           "JobId", "Applicants", "CareerStage", "Job", "Company", "PaymentBase", "PaymentFreq", "PaymentHigh", "LocationStr", "Mode",
+           "JobPostedAt", "TimeAdded", "DescriptionHash",
+           "CompanyName", "BusinessOutlookRating", "CareerOpportunitiesRating", "CeoRating", "CompensationAndBenefitsRating",
+           "CultureAndValuesRating", "DiversityAndInclusionRating", "SeniorManagementRating", "WorkLifeBalanceRating", "OverallRating",
+           "TimeAdded", "GlassdoorUrl", "UpdatedAt",
+           "QueryStr", "JobIdFK", "AddressStr", "City", "ZipCode", "StateCode", "Latitude", "Longitude",
+           "BestMatchScore"]
+def make_rows(count):
+    rows = []
+    now = datetime.datetime(2024, 8, 23, 17, 16, 57)
+    for i in range(count):
+        job_id = f"{4000000000 + i}"
+        company = f"Company {i % 200}"
+        rows.append((f"{i:08d}-0000-0000-0000-000000000000", job_id, "00000000-0000-0000-0000-000000000001", i % 3 == 0, i % 5 == 0, now, now,
+                     job_id, 100, "Mid-Senior level", f"Specification Sales {i}", company, Decimal("85000.00"), "yr", Decimal("120000.00"),
+                     "Cupertino, CA", "Hybrid", now, now, f"{i:064x}",
+                     company, Decimal("3.50"), Decimal("3.9"), Decimal("4.10"), Decimal("3.2"), Decimal("4.0"), Decimal("3.8"), Decimal("3.3"),
+                     Decimal("3.7"), Decimal("3.9"), now, f"https://www.glassdoor.com/Overview/{i % 200}.htm", now,
+                     f"query {i}", job_id, f"{i} Infinite Loop", "Cupertino", "95014", "CA", Decimal("37.3318000"), Decimal("-122.0312000"),
+                     70 + i % 30))
+    return rows
+def measure(name, hydrate, runs):
+    gc.collect()
+    tracemalloc.start()
+    jobs = hydrate()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    st = time.perf_counter()
+    for _ in range(runs):
+        hydrate()
+    seconds = (time.perf_counter() - st) / runs
+    print(f"    {name:<24} {seconds * 1000:8.2f} ms  peak {peak / 1e6:6.2f} MB  held {retained / 1e6:6.2f} MB  for {len(jobs)} jobs")
+    return jobs
+def user_jobs_benchmark():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    rows = make_rows(count)
+    columns = SqlColumns.index(COLUMNS)
+    print(f"BENCHMARKING HYDRATING {count} SAVED JOBS")
+    #the dictionary cursor builds its dicts with dict(zip(column_names, row)), so that's counted
+    by_dict = measure("dict rows", lambda: [Job.create_with_sql_row(row) for row in [dict(zip(COLUMNS, row)) for row in rows]], runs)
+    by_position = measure("tuple rows", lambda: Job.create_many_with_sql_rows(list(rows), columns), runs)
+    assert([job.to_json() for job in by_dict] == [job.to_json() for job in by_position])
+def db_benchmark():
+    from user_job_table import UserJobTable
+    user_id = sys.argv[2]
+    runs = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+    print(f"BENCHMARKING UserJobTable.get_user_jobs FOR {user_id}")
+    measure("get_user_jobs", lambda: UserJobTable.get_user_jobs(user_id, with_description=False), runs)
+    measure("with descriptions", lambda: UserJobTable.get_user_jobs(user_id), runs)
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "--user":
+        db_benchmark()
+    else:
+        user_jobs_benchmark()